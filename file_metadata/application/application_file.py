@@ -10,4 +10,9 @@ class ApplicationFile(GenericFile):
 
     @classmethod
     def create(cls, *args, **kwargs):
-        return cls(*args, **kwargs)
+        cls_file = cls(*args, **kwargs)
+        if cls_file.fetch('head').startswith((b'%PDF-', b'AT&TFORM')):
+            from file_metadata.application.document_file import (
+                DocumentFile)
+            return DocumentFile.create(*args, **kwargs)
+        return cls_file
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import io
+import logging
+import math
+import re
+import subprocess
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+import numpy
+from PIL import Image
+
+from file_metadata._compat import which
+from file_metadata.application.application_file import ApplicationFile
+from file_metadata.image.array_file import (ArrayImageFile,
+                                            aggregate_image_data)
+from file_metadata.utilities import memoized
+
+
+class DocumentFile(ApplicationFile):
+    """
+    A paged document (PDF or DjVu). A few pages are rasterized and analyzed
+    with the image analyzers, hence the cost does not depend on the number
+    of pages.
+    """
+
+    def config(self, key, new_defaults=()):
+        defaults = {
+            # The number of pages (spread evenly between the first and the
+            # last page) which are analyzed along with the first and the
+            # last page.
+            "document_sample_pages": 3,
+            # The resolution the pages are rasterized at.
+            "document_dpi": 72,
+            # The maximum number of pixels in a rasterized page. Larger pages
+            # (Like posters or maps) are rasterized at a lower resolution.
+            "document_max_pixels": 4096 * 4096,
+            # The number of pages rasterized at the same time.
+            "document_render_processes": 4,
+            # The ImageFile analyzers run on every sampled page.
+            "document_page_analyzers": ('analyze_color_info',
+                                        'analyze_face_haarcascades',
+                                        'analyze_barcode_zbar'),
+        }
+        defaults.update(dict(new_defaults))  # Update the defaults from child
+        return super(DocumentFile, self).config(key, new_defaults=defaults)
+
+    @classmethod
+    def create(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+    @memoized
+    def fetch(self, key=''):
+        if key == 'document_type':
+            head = self.fetch('head')
+            if head.startswith(b'%PDF-'):
+                return 'pdf'
+            elif head.startswith(b'AT&TFORM'):
+                return 'djvu'
+            return None
+        elif key == 'num_pages':
+            return self._num_pages()
+        return super(DocumentFile, self).fetch(key)
+
+    @staticmethod
+    def _check_output(command):
+        executable = which(command[0])
+        if executable is None:
+            raise OSError('{0} was not found.'.format(command[0]))
+        try:
+            output = subprocess.check_output([executable] + command[1:])
+        except subprocess.CalledProcessError:
+            return None
+        return output.decode('utf-8', 'replace')
+
+    def _num_pages(self):
+        # The number of pages from poppler's pdfinfo or djvulibre's djvused.
+        doc_type = self.fetch('document_type')
+        if doc_type == 'pdf':
+            command = ['pdfinfo', self.fetch('filename')]
+        elif doc_type == 'djvu':
+            command = ['djvused', '-e', 'n', self.fetch('filename')]
+        else:
+            return None
+        output = self._check_output(command)
+        if output is None:
+            return None
+        if doc_type == 'pdf':
+            match = re.search(r'^Pages:\s+(\d+)', output, re.MULTILINE)
+            return None if match is None else int(match.group(1))
+        return int(output.strip() or 0) or None
+
+    @staticmethod
+    def sample_pages(num_pages, num_samples):
+        """
+        Choose the pages to analyze: The first and the last page, and
+        ``num_samples`` pages spread evenly between them.
+
+        :param num_pages:   The number of pages in the document.
+        :param num_samples: The number of pages between the first and last.
+        :return:            A sorted list of the (1 based) page numbers.
+        """
+        positions = numpy.linspace(1, num_pages, num_samples + 2)
+        return sorted(set(int(round(page)) for page in positions))
+
+    def page_size(self, page):
+        """
+        Find the size of a page from ``pdfinfo`` or ``djvused``.
+
+        :param page: The (1 based) page number.
+        :return:     A tuple with the width and height of the page in
+                     inches, or None if it is not known.
+        """
+        if self.fetch('document_type') == 'pdf':
+            output = self._check_output(['pdfinfo', '-f', str(page), '-l',
+                                         str(page), self.fetch('filename')])
+            match = re.search(r'^Page\s+\d+\s+size:\s+([\d.]+) x ([\d.]+) pts',
+                              output or '', re.MULTILINE)
+            if match is None:
+                return None
+            return float(match.group(1)) / 72, float(match.group(2)) / 72
+        output = self._check_output(['djvused', '-e',
+                                     'select {0}; dump'.format(page),
+                                     self.fetch('filename')])
+        match = re.search(r'DjVu (\d+)x(\d+),.*?(\d+) dpi', output or '')
+        if match is None or int(match.group(3)) == 0:
+            return None
+        dpi = int(match.group(3))
+        return int(match.group(1)) / dpi, int(match.group(2)) / dpi
+
+    def render_page(self, page):
+        """
+        Rasterize a page of the document at the ``document_dpi`` config with
+        ``pdftoppm`` or ``ddjvu``. Pages which would have more pixels than
+        the ``document_max_pixels`` config are scaled down to fit in it.
+        The page is written as a PPM image to the standard output and is
+        decoded in memory.
+
+        :param page: The (1 based) page number.
+        :return:     The uint8 RGB array of the page, or None if the page
+                     could not be rasterized.
+        """
+        dpi = self.config('document_dpi')
+        size = self.page_size(page)
+        fit = None
+        if size is not None:
+            width, height = size[0] * dpi, size[1] * dpi
+            scale = math.sqrt(self.config('document_max_pixels') /
+                              max(1, width * height))
+            if scale < 1:
+                fit = (max(1, int(width * scale)),
+                       max(1, int(height * scale)))
+
+        if self.fetch('document_type') == 'pdf':
+            command = ['pdftoppm', '-f', str(page), '-l', str(page)]
+            if fit is None:
+                command += ['-r', str(dpi)]
+            else:
+                # The long side is scaled to fit, keeping the aspect ratio.
+                command += ['-scale-to', str(max(fit))]
+            command.append(self.fetch('filename'))
+        else:
+            command = ['ddjvu', '-format=ppm', '-page={0}'.format(page)]
+            if fit is None:
+                command.append('-scale={0}'.format(dpi))
+            else:
+                command.append('-size={0}x{1}'.format(*fit))
+            command.append(self.fetch('filename'))
+        executable = which(command[0])
+        if executable is None:
+            raise OSError('{0} was not found.'.format(command[0]))
+        proc = subprocess.Popen([executable] + command[1:],
+                                stdout=subprocess.PIPE)
+        data, _ = proc.communicate()
+        if proc.returncode != 0 or not data:
+            return None
+        return numpy.asarray(Image.open(io.BytesIO(data)).convert('RGB'))
+
+    def iter_pages(self, pages):
+        """
+        Rasterize pages of the document in parallel (The
+        ``document_render_processes`` config). A page is rasterized only
+        when a process is free and the earlier pages have been taken, hence
+        only the pages being rasterized or analyzed are kept in memory.
+
+        :param pages: The page numbers to rasterize.
+        :return:      A generator of tuples with the page number and the
+                      array of every page that could be rasterized.
+        """
+        processes = self.config('document_render_processes')
+        pool = ThreadPool(processes)
+        pages = iter(pages)
+        rendering = deque()
+        try:
+            while True:
+                for page in pages:
+                    rendering.append(
+                        (page, pool.apply_async(self.render_page, (page,))))
+                    if len(rendering) == processes:
+                        break
+                if not rendering:
+                    break
+                page, result = rendering.popleft()
+                array = result.get()
+                if array is not None:
+                    yield page, array
+        finally:
+            pool.terminate()
+
+    def analyze_pages(self):
+        """
+        Run the image analyzers (the ``document_page_analyzers`` config) on
+        sampled pages of the document. The pages are analyzed as
+        ``ArrayImageFile`` objects, without writing them to files.
+
+        :return: dict with the keys:
+
+                 - Document:NumPages - The number of pages in the document.
+                 - Document:SampledPages - The number of pages analyzed.
+                 - Document:Pages - A list with the page number and the
+                   data of the analyzers for every page.
+                 - Document:ClosestLabeledColor - The closest labeled color
+                   of most of the pages.
+                 - Document:AverageRGB - The average color of the pages.
+                 - Document:MaxFaces - The largest number of faces found in
+                   a page.
+                 - Document:Barcodes - The unique barcodes in the pages.
+        """
+        analyzers = self.config('document_page_analyzers')
+        pages = []
+        try:
+            num_pages = self.fetch('num_pages')
+            if not num_pages:
+                return {}
+            for page, array in self.iter_pages(self.sample_pages(
+                    num_pages, self.config('document_sample_pages'))):
+                with ArrayImageFile(self.fetch('filename'),
+                                    array=array) as page_file:
+                    data = page_file.analyze(methods=analyzers)
+                data['Page'] = page
+                pages.append(data)
+        except OSError as error:
+            logging.warn('Pages of the document cannot be analyzed: {0}'
+                         .format(error))
+            return {}
+
+        data = {'Document:NumPages': num_pages}
+        if pages:
+            data.update(aggregate_image_data(pages, 'Document:'))
+            data['Document:SampledPages'] = len(pages)
+            data['Document:Pages'] = pages
+        return data
@@ -3,13 +3,49 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
+import logging
+import subprocess
+import wave
+
+import numpy
+
+from file_metadata._compat import which
+from file_metadata.audio.features import AudioFeatures
+from file_metadata.audio.fingerprint import (FingerprintIndex,
+                                             LandmarkExtractor)
 from file_metadata.generic_file import GenericFile
 from file_metadata.mixins import FFProbeMixin
+from file_metadata.utilities import memoized
 
 
 class AudioFile(FFProbeMixin, GenericFile):
     mimetypes = ()
 
+    def config(self, key, new_defaults=()):
+        defaults = {
+            # The number of seconds from the start of the file which are
+            # decoded to find audio features. None to decode the whole file.
+            "audio_max_duration": 600,
+            # The RMS level (in dBFS) of the frames considered to be silent.
+            "audio_silence_threshold": -50,
+            # The number of seconds from the start of the file which are
+            # decoded to find the landmarks of the audio fingerprint.
+            "fingerprint_max_duration": 120,
+            # The path of the ``FingerprintIndex`` used to reuse the data of
+            # near duplicate recordings (Like conversions to other formats).
+            # None to analyze every file fully.
+            "duplicate_index": None,
+            # The minimum number of aligned landmarks of near duplicates.
+            "duplicate_min_matches": 20,
+            # The minimum fraction of the landmarks of this file which have
+            # to be aligned with a near duplicate.
+            "duplicate_min_ratio": 0.1,
+            # The (expensive) analyzers whose data is reused.
+            "duplicate_reuse": ('analyze_audio_features',),
+        }
+        defaults.update(dict(new_defaults))  # Update the defaults from child
+        return super(AudioFile, self).config(key, new_defaults=defaults)
+
     @classmethod
     def create(cls, *args, **kwargs):
         cls_file = cls(*args, **kwargs)
@@ -17,3 +53,210 @@ class AudioFile(FFProbeMixin, GenericFile):
             from file_metadata.audio.ogg_file import OGGFile
             return OGGFile.create(*args, **kwargs)
         return cls(*args, **kwargs)
+
+    @memoized
+    def fetch(self, key=''):
+        if key == 'audio_stream':
+            # The first audio stream found by ffprobe.
+            for stream in self.ffprobe().get('streams', []):
+                if stream.get('codec_type') == 'audio':
+                    return stream
+            return None
+        elif key == 'fingerprint':
+            return self._fingerprint()
+        return super(AudioFile, self).fetch(key)
+
+    def _fingerprint(self):
+        # The landmarks of the start of the audio.
+        stream = self.fetch('audio_stream')
+        if stream is None:
+            return None
+        sample_rate = int(float(stream['sample_rate']))
+        extractor = LandmarkExtractor(sample_rate)
+        for samples in self.iter_pcm(
+                sample_rate, int(stream.get('channels', 1)),
+                max_duration=self.config('fingerprint_max_duration')):
+            extractor.update(samples)
+        return extractor.landmarks()
+
+    def analyze_each(self, prefix='analyze_', suffix='', methods=None,
+                     precomputed=None):
+        """
+        Run the analysis methods like ``GenericFile.analyze_each()``.
+
+        If the ``duplicate_index`` config is set, the data of the expensive
+        analyzers of a near duplicate recording found in the index is reused
+        and the data of this file is added to the index (See
+        ``analyze_with_duplicates()``).
+        """
+        if self.config('duplicate_index') is not None:
+            return self.analyze_with_duplicates(prefix, suffix, methods,
+                                                precomputed)
+        return super(AudioFile, self).analyze_each(prefix, suffix, methods,
+                                                   precomputed)
+
+    def analyze_with_duplicates(self, prefix='analyze_', suffix='',
+                                methods=None, precomputed=None):
+        """
+        Analyze the file reusing the data of near duplicate recordings (Like
+        re-uploads or conversions to other formats and bitrates) from the
+        ``FingerprintIndex`` at the path in the ``duplicate_index`` config.
+
+        The data of the methods in the ``duplicate_reuse`` config is reused
+        from the recording with the most landmarks aligned with the
+        fingerprint of this file, if there are at least
+        ``duplicate_min_matches`` of them (and ``duplicate_min_ratio`` of the
+        landmarks of this file).
+        """
+        precomputed = dict(precomputed or {})
+        try:
+            landmarks = self.fetch('fingerprint')
+        except OSError as error:
+            logging.warn('The audio cannot be fingerprinted: {0}'
+                         .format(error))
+            landmarks = None
+        if landmarks is None or len(landmarks) == 0:
+            return super(AudioFile, self).analyze_each(
+                prefix, suffix, methods, precomputed)
+
+        reuse = self.config('duplicate_reuse')
+        index = FingerprintIndex(self.config('duplicate_index'))
+        try:
+            for match in index.find(landmarks,
+                                    self.config('duplicate_min_matches'),
+                                    self.config('duplicate_min_ratio')):
+                for method, result in match['data'].items():
+                    if method in reuse:
+                        precomputed.setdefault(method, result)
+
+            results = super(AudioFile, self).analyze_each(
+                prefix, suffix, methods, precomputed)
+            analyzed = dict((method, results[method]) for method in reuse
+                            if method in results)
+            if any(method not in precomputed for method in analyzed):
+                index.add(landmarks, self.fetch('filename'), analyzed)
+        finally:
+            index.close()
+        return results
+
+    def iter_pcm(self, sample_rate, channels, max_duration=None,
+                 chunk_frames=65536):
+        """
+        Decode the audio as 16 bit PCM in chunks of a fixed size. The
+        samples are piped from ``ffmpeg`` (or ``avconv``), except for 16 bit
+        PCM WAV files in the same format which are read directly.
+
+        :param sample_rate:  The sample rate to decode to.
+        :param channels:     The number of channels to decode to.
+        :param max_duration: The number of seconds to decode, or None for
+                             the whole file.
+        :param chunk_frames: The number of frames in every chunk.
+        :return:             A generator of int16 arrays with the shape
+                             (frames, channels).
+        """
+        max_frames = (None if max_duration is None else
+                      int(max_duration * sample_rate))
+        head = self.fetch('head')
+        if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+            try:
+                wav = wave.open(self.fetch('filename'), 'rb')
+            except (wave.Error, EOFError):
+                wav = None
+            if wav is not None and (wav.getsampwidth(), wav.getframerate(),
+                                    wav.getnchannels()) == (
+                                        2, sample_rate, channels):
+                return self._iter_wave(wav, channels, max_frames,
+                                       chunk_frames)
+            elif wav is not None:
+                wav.close()
+        return self._iter_ffmpeg(sample_rate, channels, max_duration,
+                                 max_frames, chunk_frames)
+
+    @staticmethod
+    def _iter_wave(wav, channels, max_frames, chunk_frames):
+        try:
+            num_frames = 0
+            while max_frames is None or num_frames < max_frames:
+                count = chunk_frames if max_frames is None else min(
+                    chunk_frames, max_frames - num_frames)
+                samples = numpy.frombuffer(wav.readframes(count), '<i2')
+                if samples.size == 0:
+                    break
+                num_frames += samples.size // channels
+                yield samples.reshape(-1, channels)
+        finally:
+            wav.close()
+
+    def _iter_ffmpeg(self, sample_rate, channels, max_duration, max_frames,
+                     chunk_frames):
+        executable = which('ffmpeg') or which('avconv')
+        if executable is None:
+            raise OSError('Neither avconv nor ffmpeg were found.')
+
+        proc = subprocess.Popen(
+            [executable, '-nostdin', '-v', '0', '-i', self.fetch('filename')] +
+            ([] if max_duration is None else ['-t', str(max_duration)]) +
+            ['-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(sample_rate),
+             '-ac', str(channels), '-'],
+            stdout=subprocess.PIPE)
+        frame_bytes = 2 * channels
+        try:
+            num_frames = 0
+            while max_frames is None or num_frames < max_frames:
+                data = proc.stdout.read(chunk_frames * frame_bytes)
+                data = data[:len(data) - len(data) % frame_bytes]
+                if not data:
+                    break
+                samples = numpy.frombuffer(data, '<i2').reshape(-1, channels)
+                if max_frames is not None:
+                    samples = samples[:max_frames - num_frames]
+                num_frames += len(samples)
+                yield samples
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+    def analyze_audio_features(self):
+        """
+        Find the loudness, silence, clipping and spectral centroid of the
+        audio. The audio is decoded in chunks, so the memory used does not
+        depend on the length of the file. Only the first
+        ``audio_max_duration`` seconds are used.
+
+        :return: dict with the keys:
+
+                 - Audio:Loudness - The RMS level in dBFS.
+                 - Audio:PeakLevel - The peak level in dBFS.
+                 - Audio:SilenceRatio - The fraction of the audio which is
+                   silent.
+                 - Audio:ClippingRatio - The fraction of samples which are
+                   clipped.
+                 - Audio:SpectralCentroidMean - The mean spectral centroid
+                   in Hz.
+                 - Audio:SpectralCentroidStd - The standard deviation of
+                   the spectral centroid in Hz.
+        """
+        try:
+            stream = self.fetch('audio_stream')
+        except OSError as error:
+            logging.warn('Audio features cannot be found: {0}'.format(error))
+            return {}
+        if stream is None:
+            return {}
+
+        sample_rate = int(float(stream['sample_rate']))
+        channels = int(stream.get('channels', 1))
+        features = AudioFeatures(
+            sample_rate,
+            silence_threshold=self.config('audio_silence_threshold'))
+        try:
+            for samples in self.iter_pcm(
+                    sample_rate, channels,
+                    max_duration=self.config('audio_max_duration')):
+                features.update(samples)
+        except OSError as error:
+            logging.warn('Audio features cannot be found: {0}'.format(error))
+            return {}
+        return features.result()
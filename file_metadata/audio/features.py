@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Features of audio found incrementally from chunks of 16 bit PCM samples.
+
+Long recordings are decoded in chunks of a fixed size, so the features are
+accumulated with sums over the chunks instead of being computed from all the
+samples at once. The memory used is the same for every length of audio.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import math
+
+import numpy
+
+# The largest magnitude of a 16 bit sample.
+FULL_SCALE = 32768.0
+
+
+def dbfs(level):
+    """
+    Convert a sample magnitude to decibels relative to full scale.
+    """
+    return 20 * math.log10(level / FULL_SCALE) if level > 0 else None
+
+
+class AudioFeatures(object):
+    """
+    Accumulate the loudness, silence, clipping and spectral centroid of
+    audio. The samples are given with ``update()`` and the features are
+    found with ``result()``.
+
+    :ivar sample_rate:       The sample rate of the audio in Hz.
+    :ivar frame_size:        The number of samples in the frames used for
+                             the silence and spectral centroid.
+    :ivar silence_threshold: The RMS level (in dBFS) below which a frame is
+                             considered to be silent.
+    """
+
+    def __init__(self, sample_rate, frame_size=2048, silence_threshold=-50):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.silence_level = FULL_SCALE * 10 ** (silence_threshold / 20)
+        self.window = numpy.hanning(frame_size)
+        self.freqs = numpy.fft.rfftfreq(frame_size, 1.0 / sample_rate)
+        self.remainder = numpy.zeros(0)
+        self.num_samples = self.num_clipped = 0
+        self.sum_squares = self.peak = 0.0
+        self.num_frames = self.num_silent = 0
+        self.centroid_sum = self.centroid_squares = 0.0
+        self.num_centroids = 0
+
+    def update(self, samples):
+        """
+        Add a chunk of samples.
+
+        :param samples: An int16 array with the shape (frames, channels).
+        """
+        if samples.size == 0:
+            return
+        wide = samples.astype(numpy.int32)
+        self.num_samples += samples.size
+        self.sum_squares += float((wide * wide).sum())
+        self.peak = max(self.peak, float(numpy.abs(wide).max()))
+        self.num_clipped += int(((samples >= 32767) |
+                                 (samples <= -32768)).sum())
+
+        # The frames are made from the mono mix, with the samples which do
+        # not fill a frame kept for the next chunk.
+        mono = numpy.concatenate((self.remainder, wide.mean(axis=1)))
+        num_frames = len(mono) // self.frame_size
+        self.remainder = mono[num_frames * self.frame_size:]
+        if num_frames == 0:
+            return
+        frames = mono[:num_frames * self.frame_size].reshape(
+            num_frames, self.frame_size)
+        rms = numpy.sqrt((frames ** 2).mean(axis=1))
+        silent = rms < self.silence_level
+        self.num_frames += num_frames
+        self.num_silent += int(silent.sum())
+
+        spectrum = numpy.abs(numpy.fft.rfft(frames[~silent] * self.window))
+        energy = spectrum.sum(axis=1)
+        centroids = spectrum[energy > 0].dot(self.freqs) / energy[energy > 0]
+        self.centroid_sum += float(centroids.sum())
+        self.centroid_squares += float((centroids ** 2).sum())
+        self.num_centroids += len(centroids)
+
+    def result(self):
+        """
+        Find the features of the samples given so far.
+
+        :return: dict with the keys:
+
+                 - Audio:Loudness - The RMS level in dBFS.
+                 - Audio:PeakLevel - The peak level in dBFS.
+                 - Audio:SilenceRatio - The fraction of frames which are
+                   silent.
+                 - Audio:ClippingRatio - The fraction of samples at full
+                   scale.
+                 - Audio:SpectralCentroidMean - The mean spectral centroid
+                   of the frames which are not silent in Hz.
+                 - Audio:SpectralCentroidStd - The standard deviation of
+                   the spectral centroid in Hz.
+        """
+        if self.num_samples == 0:
+            return {}
+        data = {'Audio:ClippingRatio': self.num_clipped / self.num_samples}
+        loudness = dbfs(math.sqrt(self.sum_squares / self.num_samples))
+        if loudness is not None:
+            data['Audio:Loudness'] = loudness
+            data['Audio:PeakLevel'] = dbfs(self.peak)
+        if self.num_frames:
+            data['Audio:SilenceRatio'] = self.num_silent / self.num_frames
+        if self.num_centroids:
+            mean = self.centroid_sum / self.num_centroids
+            variance = self.centroid_squares / self.num_centroids - mean ** 2
+            data['Audio:SpectralCentroidMean'] = mean
+            data['Audio:SpectralCentroidStd'] = math.sqrt(max(0, variance))
+        return data
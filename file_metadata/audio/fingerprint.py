@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Landmark fingerprints of audio and an index to find near duplicates.
+
+The fingerprint is made from the peaks of the spectrogram: The strongest
+frequency in a few bands of every frame is a peak, and every peak is paired
+with the peaks in the next frames. A landmark is the pair of frequencies and
+the number of frames between them, packed into an integer, with the time
+of the first peak. Peaks survive re-encoding, resampling and changes in
+volume, hence conversions of a recording to other formats and bitrates have
+many landmarks in common.
+
+The frames are always ``FRAME_SECONDS`` long and the frequencies are
+quantized to ``1 / FRAME_SECONDS`` Hz, whatever the sample rate of the
+audio is. So, the audio does not need to be resampled.
+
+The ``FingerprintIndex`` is an inverted index in an sqlite database from the
+landmark to the recordings and times it occurs at. Recordings which have
+many landmarks at the same time offset from the query are near duplicates.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import sqlite3
+from collections import Counter, defaultdict
+
+import numpy
+from six.moves import cPickle as pickle
+
+# The length of a frame is that of 1024 samples at 11025Hz, and frames
+# overlap by half.
+FRAME_SECONDS = 1024 / 11025
+# The bands (in units of 1 / FRAME_SECONDS Hz) the peaks are found in. The
+# highest frequency is about 5.5kHz.
+BANDS = (10, 20, 40, 80, 160, 320, 512)
+# Peaks weaker than this fraction of the strongest peak of the frame are
+# dropped.
+PEAK_RATIO = 0.1
+# Frames whose strongest peak (of the 16 bit samples) is weaker than this
+# are silent.
+SILENCE_MAGNITUDE = 1000.0
+# A peak is paired with the peaks at most these many places after it (which
+# are in the next 63 frames).
+FAN_OUT = 10
+MAX_FRAMES_APART = 63
+
+
+class LandmarkExtractor(object):
+    """
+    Find the landmarks of audio given in chunks of 16 bit PCM samples. Only
+    the peaks are kept between the chunks, hence the audio is not kept in
+    memory.
+
+    :ivar sample_rate: The sample rate of the audio in Hz.
+    """
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frame_size = int(round(FRAME_SECONDS * sample_rate))
+        self.hop = self.frame_size // 2
+        self.window = numpy.hanning(self.frame_size)
+        self.remainder = numpy.zeros(0)
+        self.num_frames = 0
+        self.peaks = []
+
+    def update(self, samples):
+        """
+        Add a chunk of samples.
+
+        :param samples: An int16 array with the shape (frames, channels).
+        """
+        mono = numpy.concatenate((self.remainder, samples.mean(axis=1)))
+        num_frames = max(0, (len(mono) - self.frame_size) // self.hop + 1)
+        self.remainder = mono[num_frames * self.hop:]
+        if num_frames == 0:
+            return
+        starts = numpy.arange(num_frames) * self.hop
+        frames = mono[starts[:, None] + numpy.arange(self.frame_size)]
+        spectrum = numpy.abs(numpy.fft.rfft(frames * self.window))
+        # The bins are 1 / FRAME_SECONDS Hz apart for every sample rate.
+        spectrum = spectrum[:, :BANDS[-1]]
+        # Low sample rates do not have the bins of the highest bands.
+        edges = [(low, min(high, spectrum.shape[1]))
+                 for low, high in zip(BANDS[:-1], BANDS[1:])
+                 if low < spectrum.shape[1]]
+        if not edges:
+            self.num_frames += num_frames
+            return
+
+        bands = numpy.stack([
+            spectrum[:, low:high].argmax(axis=1) + low
+            for low, high in edges], axis=1)
+        magnitudes = numpy.take_along_axis(spectrum, bands, axis=1)
+        strongest = magnitudes.max(axis=1, keepdims=True)
+        keep = ((magnitudes >= strongest * PEAK_RATIO) &
+                (strongest >= SILENCE_MAGNITUDE * self.frame_size / 1024))
+        times, columns = numpy.nonzero(keep)
+        self.peaks.append(numpy.stack(
+            (times + self.num_frames, bands[times, columns]), axis=1))
+        self.num_frames += num_frames
+
+    def landmarks(self):
+        """
+        Pair the peaks found so far into landmarks.
+
+        :return: An int64 array with the shape (N, 2) having the hash and
+                 the time (in frames) of every landmark.
+        """
+        if not self.peaks:
+            return numpy.zeros((0, 2), numpy.int64)
+        peaks = numpy.concatenate(self.peaks).astype(numpy.int64)
+        found = []
+        for offset in range(1, FAN_OUT + 1):
+            anchor, target = peaks[:-offset], peaks[offset:]
+            frames_apart = target[:, 0] - anchor[:, 0]
+            valid = (frames_apart >= 1) & (frames_apart <= MAX_FRAMES_APART)
+            hashes = ((anchor[valid, 1] << 15) | (target[valid, 1] << 6) |
+                      frames_apart[valid])
+            found.append(numpy.stack((hashes, anchor[valid, 0]), axis=1))
+        return numpy.concatenate(found)
+
+
+class FingerprintIndex(object):
+    """
+    A persistent inverted index of the landmarks of recordings, which can
+    find the recordings sharing many aligned landmarks with a fingerprint.
+    Every recording is stored with a key (Example: the filename) and
+    arbitrary picklable data (Example: the analysis results of the file).
+
+    :param path: The path of the sqlite database. ``:memory:`` for an index
+                 which is not persisted.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS recordings (id INTEGER PRIMARY '
+                'KEY, key TEXT, landmarks INTEGER, data BLOB)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS landmarks (hash INTEGER, '
+                'recording INTEGER, time INTEGER)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS landmarks_hash ON landmarks '
+                '(hash, recording, time)')
+
+    def add(self, landmarks, key, data=None):
+        """
+        Add the landmarks of a recording to the index.
+
+        :param landmarks: The array of landmarks given by
+                          ``LandmarkExtractor.landmarks()``.
+        :param key:       A string to identify the recording with.
+        :param data:      Picklable data to store with the recording.
+        """
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO recordings (key, landmarks, data) '
+                'VALUES (?, ?, ?)',
+                (key, len(landmarks),
+                 sqlite3.Binary(pickle.dumps(data, protocol=2))))
+            recording = cursor.lastrowid
+            self.connection.executemany(
+                'INSERT INTO landmarks (hash, recording, time) '
+                'VALUES (?, ?, ?)',
+                ((int(_hash), recording, int(time))
+                 for _hash, time in landmarks))
+
+    def find(self, landmarks, min_matches=20, min_ratio=0.1):
+        """
+        Find the recordings which have many landmarks in common with the
+        given ones, at the same time offset.
+
+        :param landmarks:   The array of landmarks to search for.
+        :param min_matches: The minimum number of aligned landmarks.
+        :param min_ratio:   The minimum fraction of the given landmarks
+                            which have to be aligned. Unrelated recordings
+                            share a few landmarks by chance.
+        :return:            A list of dicts with the keys matches (The
+                            number of aligned landmarks), offset (The time
+                            of the query in the recording in seconds), key
+                            and data sorted by the matches.
+        """
+        times = defaultdict(list)
+        for _hash, time in landmarks:
+            times[int(_hash)].append(int(time))
+
+        offsets = Counter()
+        hashes = list(times)
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            cursor = self.connection.execute(
+                'SELECT hash, recording, time FROM landmarks WHERE hash IN '
+                '({0})'.format(', '.join('?' * len(batch))), batch)
+            for _hash, recording, time in cursor:
+                for query_time in times[_hash]:
+                    offsets[recording, time - query_time] += 1
+
+        min_matches = max(min_matches, min_ratio * len(landmarks))
+        best = {}
+        for (recording, offset), matches in offsets.items():
+            if matches >= min_matches and matches > best.get(
+                    recording, (0, 0))[0]:
+                best[recording] = (matches, offset)
+
+        found = []
+        for recording, (matches, offset) in best.items():
+            key, data = self.connection.execute(
+                'SELECT key, data FROM recordings WHERE id = ?',
+                (recording,)).fetchone()
+            found.append({'matches': matches,
+                          'offset': offset * FRAME_SECONDS / 2,
+                          'key': key, 'data': pickle.loads(bytes(data))})
+        return sorted(found, key=lambda item: -item['matches'])
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM recordings').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+Pure python parsers for the headers of common audio and video containers.
+
+``ffprobe`` needs a new process for every file, which is the slowest part of
+analyzing small audio files. For the basic information (format, duration,
+codecs, channels, sample rate and dimensions) of WAV, FLAC, Ogg and
+Matroska/WebM files, reading the headers at the start of the file and a few
+pages at the end is enough. The parsers here give the same data as
+``ffprobe -show_format -show_streams -of json`` for these keys, so that they
+can be used in its place. Files which cannot be handled give None and
+``ffprobe`` should be used for them.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import os
+import struct
+from fractions import Fraction
+
+# The number of bytes read at the start and the end of a file.
+HEAD_SIZE = 64 * 1024
+TAIL_SIZE = 64 * 1024
+
+# The codec names of ffmpeg for the WAV format tags and bits per sample.
+WAV_CODECS = {
+    (1, 8): 'pcm_u8', (1, 16): 'pcm_s16le', (1, 24): 'pcm_s24le',
+    (1, 32): 'pcm_s32le', (3, 32): 'pcm_f32le', (3, 64): 'pcm_f64le',
+    (6, 8): 'pcm_alaw', (7, 8): 'pcm_mulaw',
+}
+
+# The sample formats ffmpeg decodes the codecs to.
+SAMPLE_FORMATS = {
+    'pcm_u8': 'u8', 'pcm_s16le': 's16', 'pcm_s24le': 's32',
+    'pcm_s32le': 's32', 'pcm_f32le': 'flt', 'pcm_f64le': 'dbl',
+    'pcm_alaw': 's16', 'pcm_mulaw': 's16', 'vorbis': 'fltp',
+    'opus': 'fltp', 'aac': 'fltp', 'mp3': 'fltp', 'ac3': 'fltp',
+}
+
+# The codec names of ffmpeg for the Matroska codec IDs.
+MATROSKA_CODECS = {
+    'V_VP8': 'vp8', 'V_VP9': 'vp9', 'V_AV1': 'av1', 'V_THEORA': 'theora',
+    'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc',
+    'A_VORBIS': 'vorbis', 'A_OPUS': 'opus', 'A_AAC': 'aac',
+    'A_FLAC': 'flac', 'A_MPEG/L3': 'mp3', 'A_AC3': 'ac3',
+    'S_TEXT/UTF8': 'subrip', 'S_TEXT/WEBVTT': 'webvtt',
+}
+MATROSKA_TRACK_TYPES = {1: 'video', 2: 'audio', 17: 'subtitle'}
+
+
+def _duration(seconds):
+    return 'N/A' if seconds is None else '{0:.6f}'.format(float(seconds))
+
+
+def _audio_stream(codec, channels, sample_rate, duration,
+                  sample_fmt=None):
+    return {'codec_type': 'audio', 'codec_name': codec,
+            'channels': channels,
+            'sample_fmt': sample_fmt or SAMPLE_FORMATS.get(codec, 'fltp'),
+            'sample_rate': str(int(sample_rate)),
+            'duration': _duration(duration)}
+
+
+def _video_stream(codec, width, height, frame_rate, duration):
+    return {'codec_type': 'video', 'codec_name': codec,
+            'width': width, 'height': height,
+            'avg_frame_rate': ('0/0' if frame_rate is None else
+                               '{0}/{1}'.format(frame_rate.numerator,
+                                                frame_rate.denominator)),
+            'duration': _duration(duration)}
+
+
+def _result(format_name, streams, duration):
+    if duration is None:
+        return None  # ffprobe estimates the duration in other ways.
+    return {'format': {'format_name': format_name,
+                       'duration': _duration(duration),
+                       'nb_streams': str(len(streams))},
+            'streams': streams}
+
+
+def probe(filename):
+    """
+    Find the format and streams of a WAV, FLAC, Ogg or Matroska/WebM file
+    from its headers.
+
+    :param filename: The path of the file.
+    :return:         A dict like the json output of ``ffprobe`` with the
+                     keys "format" and "streams", or None if the file is
+                     not one of these containers or cannot be parsed.
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as fileobj:
+        head = fileobj.read(HEAD_SIZE)
+        try:
+            if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+                return probe_wav(fileobj, size)
+            elif head[:4] == b'fLaC' or head[:3] == b'ID3':
+                return probe_flac(head)
+            elif head[:4] == b'OggS':
+                fileobj.seek(max(0, size - TAIL_SIZE))
+                return probe_ogg(head, fileobj.read(TAIL_SIZE))
+            elif head[:4] == b'\x1a\x45\xdf\xa3':
+                return probe_matroska(fileobj)
+        except (struct.error, ValueError, IndexError, KeyError,
+                ZeroDivisionError):
+            return None
+    return None
+
+
+def probe_wav(fileobj, size):
+    """
+    Parse the chunks of a RIFF WAVE file. Only the headers of the chunks
+    are read and the chunks themselves are skipped.
+    """
+    fileobj.seek(12)
+    fmt = data_size = None
+    while data_size is None:
+        header = fileobj.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            fmt = fileobj.read(chunk_size)
+            fileobj.seek(chunk_size % 2, os.SEEK_CUR)
+        elif chunk_id == b'data':
+            # Streamed files do not know the size of the data.
+            data_size = min(chunk_size, size - fileobj.tell())
+        else:
+            fileobj.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    if fmt is None:
+        return None
+
+    tag, channels, sample_rate, byte_rate, _, bits = struct.unpack(
+        '<HHIIHH', fmt[:16])
+    if tag == 0xfffe:  # WAVE_FORMAT_EXTENSIBLE has the tag in the GUID
+        tag = struct.unpack('<H', fmt[24:26])[0]
+    codec = WAV_CODECS.get((tag, bits))
+    if codec is None or byte_rate == 0:
+        return None
+    duration = data_size / byte_rate
+    return _result('wav', [_audio_stream(codec, channels, sample_rate,
+                                         duration)], duration)
+
+
+def probe_flac(head):
+    """
+    Parse the STREAMINFO block of a FLAC file (after an ID3v2 tag if there
+    is one).
+    """
+    offset = 0
+    if head[:3] == b'ID3':
+        tag_size = 0
+        for byte in bytearray(head[6:10]):  # A synchsafe integer
+            tag_size = (tag_size << 7) | (byte & 0x7f)
+        offset = 10 + tag_size
+    block_type = bytearray(head[offset + 4:offset + 5])
+    if head[offset:offset + 4] != b'fLaC' or block_type[0] & 0x7f != 0:
+        return None  # STREAMINFO is always the first metadata block.
+    info = head[offset + 8:offset + 8 + 34]
+    value = int(''.join('{0:08b}'.format(byte)
+                        for byte in bytearray(info[10:18])), 2)
+    sample_rate = value >> 44
+    channels = ((value >> 41) & 0x7) + 1
+    bits = ((value >> 36) & 0x1f) + 1
+    total_samples = value & 0xfffffffff
+    if sample_rate == 0 or total_samples == 0:
+        return None
+    duration = total_samples / sample_rate
+    stream = _audio_stream('flac', channels, sample_rate, duration,
+                           's16' if bits <= 16 else 's32')
+    return _result('flac', [stream], duration)
+
+
+def ogg_pages(data):
+    """
+    Iterate over the Ogg pages in some data. The data does not need to
+    start at a page, the pages are found with the capture pattern.
+
+    :return: A generator of tuples with the header type, granule position,
+             serial number and the data of the page.
+    """
+    start = data.find(b'OggS')
+    while start != -1 and start + 27 <= len(data):
+        header_type, granule, serial, num_segments = struct.unpack(
+            '<xBqIxxxxxxxxB', data[start + 4:start + 27])
+        lacing = bytearray(data[start + 27:start + 27 + num_segments])
+        body_start = start + 27 + num_segments
+        body_end = body_start + sum(lacing)
+        if body_end <= len(data):
+            yield header_type, granule, serial, data[body_start:body_end]
+        start = data.find(b'OggS', start + 4)
+
+
+def ogg_bos_packets(head):
+    """
+    Find the first packet of every logical stream of an Ogg file. The
+    beginning of stream (BOS) pages of all streams come first in a file and
+    have only the identification header of the codec.
+
+    :param head: The data at the start of the file.
+    :return:     A list of tuples with the serial number and the packet.
+    """
+    packets = []
+    for header_type, _, serial, body in ogg_pages(head):
+        if not header_type & 0x02:
+            break
+        packets.append((serial, body))
+    return packets
+
+
+# The start of the first packet of the codecs which can be in Ogg files.
+OGG_VIDEO_SIGNATURES = (b'\x80theora', b'\x80daala', b'BBCD\x00',
+                        b'\x01video\x00\x00\x00')
+OGG_AUDIO_SIGNATURES = (b'\x01vorbis', b'OpusHead', b'\x7fFLAC', b'Speex   ',
+                        b'\x01audio\x00\x00\x00')
+# The streams which only have metadata about the other streams (Skeleton).
+OGG_DATA_SIGNATURES = (b'fishead\x00',)
+
+
+def ogg_media_type(head):
+    """
+    Find whether an Ogg file has video or only audio from the codec
+    identification packets of its streams.
+
+    :param head: The data at the start of the file.
+    :return:     "video" if a stream has a video codec, "audio" if all the
+                 streams (other than the metadata streams) have audio
+                 codecs, "unknown" otherwise (Example: a stream has an
+                 unknown codec, which can be a video) and None if the data
+                 isn't from an Ogg file.
+    """
+    if head[:4] != b'OggS':
+        return None
+    packets = [packet for _, packet in ogg_bos_packets(head)
+               if not packet.startswith(OGG_DATA_SIGNATURES)]
+    if any(packet.startswith(OGG_VIDEO_SIGNATURES) for packet in packets):
+        return 'video'
+    elif packets and all(packet.startswith(OGG_AUDIO_SIGNATURES)
+                         for packet in packets):
+        return 'audio'
+    return 'unknown'
+
+
+def ogg_codec(packet):
+    """
+    Identify the codec of an Ogg stream from its first packet.
+
+    :return: A dict with the codec information, or None if the codec is not
+             known.
+    """
+    if packet[:7] == b'\x01vorbis':
+        channels, sample_rate = struct.unpack('<BI', packet[11:16])
+        return {'type': 'audio', 'codec': 'vorbis', 'channels': channels,
+                'sample_rate': sample_rate, 'granule_rate': sample_rate,
+                'pre_skip': 0}
+    elif packet[:8] == b'OpusHead':
+        channels, pre_skip = struct.unpack('<BH', packet[9:12])
+        # Opus is always decoded at 48kHz.
+        return {'type': 'audio', 'codec': 'opus', 'channels': channels,
+                'sample_rate': 48000, 'granule_rate': 48000,
+                'pre_skip': pre_skip}
+    elif packet[:7] == b'\x80theora':
+        version = tuple(bytearray(packet[7:10]))
+        # The size of the picture, the frame is a multiple of 16 pixels.
+        width, height = (struct.unpack('>I', b'\x00' + packet[pos:pos + 3])[0]
+                         for pos in (14, 17))
+        numerator, denominator = struct.unpack('>II', packet[22:30])
+        shift = (struct.unpack('>H', packet[40:42])[0] >> 5) & 0x1f
+        return {'type': 'video', 'codec': 'theora', 'width': width,
+                'height': height,
+                'frame_rate': Fraction(numerator, denominator),
+                'granule_shift': shift, 'version': version}
+    elif packet[:8] == b'fishead\x00':
+        return {'type': 'data', 'codec': 'unknown'}
+    return None
+
+
+def _ogg_duration(codec, granule):
+    if granule is None or granule < 0:
+        return None
+    if codec['type'] == 'audio':
+        return max(0, granule - codec['pre_skip']) / codec['granule_rate']
+    elif codec['type'] == 'video':
+        shift = codec['granule_shift']
+        frames = (granule >> shift) + (granule & ((1 << shift) - 1))
+        if codec['version'] >= (3, 2, 1):
+            frames += 1  # The granule is the index of the frame.
+        return frames / codec['frame_rate']
+    return None
+
+
+def probe_ogg(head, tail):
+    """
+    Parse the identification headers of the streams of an Ogg file. The
+    duration of every stream is found from the last granule position of
+    the stream in the pages at the end of the file.
+    """
+    codecs = []
+    for serial, packet in ogg_bos_packets(head):
+        codec = ogg_codec(packet)
+        if codec is None:
+            return None
+        codecs.append((serial, codec))
+    if not codecs:
+        return None
+
+    granules = {}
+    for _, granule, serial, _ in ogg_pages(tail):
+        if granule >= 0:
+            granules[serial] = granule
+
+    streams, durations = [], []
+    for serial, codec in codecs:
+        duration = _ogg_duration(codec, granules.get(serial))
+        if codec['type'] == 'audio':
+            streams.append(_audio_stream(codec['codec'], codec['channels'],
+                                         codec['sample_rate'], duration))
+        elif codec['type'] == 'video':
+            streams.append(_video_stream(codec['codec'], codec['width'],
+                                         codec['height'],
+                                         codec['frame_rate'], duration))
+        else:
+            streams.append({'codec_type': codec['type'],
+                            'codec_name': codec['codec'],
+                            'duration': _duration(duration)})
+        if duration is not None:
+            durations.append(duration)
+    return _result('ogg', streams, max(durations) if durations else None)
+
+
+def _read_vint(fileobj, keep_marker):
+    first = fileobj.read(1)
+    if not first:
+        raise ValueError('Unexpected end of the file.')
+    first = bytearray(first)[0]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ValueError('Invalid EBML variable size integer.')
+    value = first if keep_marker else first & ((0x80 >> (length - 1)) - 1)
+    for byte in bytearray(fileobj.read(length - 1)):
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, None if unknown else value
+
+
+def _ebml_elements(fileobj, end):
+    """
+    Iterate over the EBML elements until the position ``end`` (None for the
+    end of the file). The payload of an element is at the position of the
+    file when it is given and is skipped if it isn't read.
+
+    :return: A generator of tuples with the ID and size of the elements.
+    """
+    while end is None or fileobj.tell() < end:
+        try:
+            element_id, _ = _read_vint(fileobj, keep_marker=True)
+        except ValueError:
+            return
+        _, size = _read_vint(fileobj, keep_marker=False)
+        start = fileobj.tell()
+        yield element_id, size
+        if size is None:
+            continue  # Unknown sizes are only used for master elements.
+        fileobj.seek(start + size)
+
+
+def _ebml_end(fileobj, size):
+    # The end of an element whose payload starts at the current position.
+    # Only the Segment and the Clusters are expected to have unknown sizes.
+    if size is None:
+        raise ValueError('The size of the element is unknown.')
+    return fileobj.tell() + size
+
+
+def _ebml_bytes(fileobj, size):
+    return fileobj.read(_ebml_end(fileobj, size) - fileobj.tell())
+
+
+def _ebml_uint(fileobj, size):
+    value = 0
+    for byte in bytearray(_ebml_bytes(fileobj, size)):
+        value = (value << 8) | byte
+    return value
+
+
+def _ebml_float(fileobj, size):
+    return struct.unpack('>f' if size == 4 else '>d',
+                         _ebml_bytes(fileobj, size))[0]
+
+
+def probe_matroska(fileobj):
+    """
+    Parse the Info and Tracks of a Matroska (or WebM) file. Only the element
+    headers and the small elements needed are read, and the parsing stops
+    at the first Cluster. Files with video tracks without a size are left
+    to ffprobe.
+    """
+    fileobj.seek(0)
+    scale, duration, tracks = 1000000, None, []
+    for element_id, size in _ebml_elements(fileobj, None):
+        if element_id == 0x18538067:  # Segment
+            end = None if size is None else fileobj.tell() + size
+            for child_id, child_size in _ebml_elements(fileobj, end):
+                if child_id == 0x1549a966:  # Info
+                    info_end = _ebml_end(fileobj, child_size)
+                    for info_id, info_size in _ebml_elements(fileobj,
+                                                             info_end):
+                        if info_id == 0x2ad7b1:  # TimestampScale
+                            scale = _ebml_uint(fileobj, info_size)
+                        elif info_id == 0x4489:  # Duration
+                            duration = _ebml_float(fileobj, info_size)
+                elif child_id == 0x1654ae6b:  # Tracks
+                    tracks_end = _ebml_end(fileobj, child_size)
+                    for track_id, track_size in _ebml_elements(fileobj,
+                                                               tracks_end):
+                        if track_id == 0xae:  # TrackEntry
+                            tracks.append(_matroska_track(
+                                fileobj, _ebml_end(fileobj, track_size)))
+                elif child_id == 0x1f43b675:  # Cluster
+                    break
+            break
+
+    if duration is None or not tracks or None in tracks:
+        return None
+    duration = duration * scale / 1e9
+    streams = []
+    for track in tracks:
+        if track['type'] == 'video':
+            if track.get('width') is None or track.get('height') is None:
+                return None  # ffprobe finds the size from the frames.
+            streams.append(_video_stream(
+                track['codec'], track.get('width'), track.get('height'),
+                track.get('frame_rate'), None))
+        elif track['type'] == 'audio':
+            bits = track.get('bits')
+            streams.append(_audio_stream(
+                track['codec'], track.get('channels', 1),
+                track.get('sample_rate', 8000), None,
+                None if bits is None or track['codec'] != 'flac' else
+                ('s16' if bits <= 16 else 's32')))
+        else:
+            streams.append({'codec_type': track['type'],
+                            'codec_name': track['codec'],
+                            'duration': 'N/A'})
+    return _result('matroska,webm', streams, duration)
+
+
+def _matroska_track(fileobj, end):
+    """
+    Parse a TrackEntry of a Matroska file.
+
+    :return: A dict with the information of the track or None if the codec
+             or type of the track is not known.
+    """
+    track = {}
+    for element_id, size in _ebml_elements(fileobj, end):
+        if element_id == 0x83:  # TrackType
+            track['type'] = MATROSKA_TRACK_TYPES.get(
+                _ebml_uint(fileobj, size))
+        elif element_id == 0x86:  # CodecID
+            track['codec'] = MATROSKA_CODECS.get(
+                _ebml_bytes(fileobj, size).rstrip(b'\x00').decode(
+                    'ascii', 'replace'))
+        elif element_id == 0x23e383:  # DefaultDuration
+            frame_duration = _ebml_uint(fileobj, size)
+            if frame_duration:
+                track['frame_rate'] = Fraction(
+                    10 ** 9, frame_duration).limit_denominator(1001)
+        elif element_id in (0xe0, 0xe1):  # Video, Audio
+            child_end = _ebml_end(fileobj, size)
+            for child_id, child_size in _ebml_elements(fileobj, child_end):
+                if child_id == 0xb0:  # PixelWidth
+                    track['width'] = _ebml_uint(fileobj, child_size)
+                elif child_id == 0xba:  # PixelHeight
+                    track['height'] = _ebml_uint(fileobj, child_size)
+                elif child_id == 0xb5:  # SamplingFrequency
+                    track['sample_rate'] = _ebml_float(fileobj, child_size)
+                elif child_id == 0x9f:  # Channels
+                    track['channels'] = _ebml_uint(fileobj, child_size)
+                elif child_id == 0x6264:  # BitDepth
+                    track['bits'] = _ebml_uint(fileobj, child_size)
+    if track.get('type') is None or track.get('codec') is None:
+        return None
+    return track
@@ -4,16 +4,45 @@ from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
 import json
+import logging
 import os
+import re
 import subprocess
+from collections import OrderedDict
 
 import magic
 
+from file_metadata import containers, signatures
 from file_metadata._compat import which
 from file_metadata.mixins import is_svg
 from file_metadata.utilities import memoized
 
 
+def exiftool_tag_pattern(tags):
+    """
+    Make a regex matching the keys (like ``EXIF:Model``) given by ``exiftool
+    -G`` for the given tag names. A tag name is like the ones given to
+    ``exiftool``: ``TAG``, ``GROUP:TAG``, ``GROUP:all`` or ``all``, where the
+    group is a family 0 group (The prefix of the keys) and the tag can have
+    the wildcards ``*`` and ``?``. The names are case insensitive.
+
+    :param tags: An iterable of tag names.
+    :return:     A compiled regex.
+    """
+    patterns = []
+    for tag in tags:
+        group, _, name = tag.rpartition(':')
+        parts = []
+        for part in ((group or 'all'), name):
+            if part.lower() == 'all':
+                parts.append('[^:]*')
+            else:
+                parts.append(re.escape(part).replace('\\*', '[^:]*')
+                             .replace('\\?', '[^:]'))
+        patterns.append(':'.join(parts))
+    return re.compile('(?:{0})$'.format('|'.join(patterns)), re.IGNORECASE)
+
+
 class GenericFile(object):
     """
     Object corresponding to a single file. An abstract class that can be
@@ -28,8 +57,14 @@ class GenericFile(object):
 
     :ivar mimetypes: Set of mimetypes (strings) applicable to this class
         based on the official standard by IANA.
+    :ivar exiftool_used_tags: The exiftool tags read by the methods of this
+        class, which are fetched along with the ``exiftool_tags`` config.
     """
     mimetypes = ()
+    exiftool_used_tags = ('File:MIMEType', 'File:FileType')
+    # The methods with the prefix of analyzers which run other analyzers.
+    analysis_helpers = ('analyze_batch', 'analyze_each', 'analyze_files',
+                        'analyze_with_duplicates')
     NO_CONFIG = object()
 
     def __init__(self, fname, **kwargs):
@@ -37,6 +72,9 @@ class GenericFile(object):
         self.options = kwargs
         self.temp_filenames = set()  # Temporary files created for analysis
         self.closables = []  # List of items that need .close() at end
+        # The data from exiftool with the tags (None for all the tags) and
+        # the level of -fast used to get it.
+        self.exiftool_cache = {}
 
     def close(self):
         while self.temp_filenames:
@@ -54,7 +92,15 @@ class GenericFile(object):
         self.close()
 
     def config(self, key, new_defaults=()):
-        defaults = {}
+        defaults = {
+            # The tags which exiftool() fetches when no tags are given (like
+            # for analyze_exifdata). None fetches all the tags.
+            "exiftool_tags": None,
+            # The -fast level of exiftool: 0 reads the whole file, 1 does not
+            # scan to the end for trailers (and stops at the media data of
+            # videos) and 2 also skips the maker notes.
+            "exiftool_fast": 0,
+        }
         defaults.update(dict(new_defaults))  # Update the defaults from child
         try:
             return self.options[key]
@@ -72,20 +118,31 @@ class GenericFile(object):
         """
         if key == '' or key == 'filename':
             return os.path.abspath(self.filename)
+        elif key == 'head':
+            # The start of the file, used to identify the format.
+            with open(self.fetch('filename'), 'rb') as _file:
+                return _file.read(containers.HEAD_SIZE)
+        elif key == 'ogg_media_type':
+            return containers.ogg_media_type(self.fetch('head'))
         return None
 
     @classmethod
     def create(cls, *args, **kwargs):
         """
         Create an object which best suits the given file. It first opens the
-        file as a GenericFile and then uses the mimetype analysis to suggest
-        the best class to use.
+        file as a GenericFile and finds the class from the magic numbers at
+        the start of the file. If the format is not known, the mimetype
+        analysis is used to suggest the best class to use.
 
         :param args:   The args to pass to the file class.
         :parak kwargs: The kwargs to pass to the file class.
         :return:       A class inheriting from GenericFile.
         """
         cls_file = cls(*args, **kwargs)
+        file_class = signatures.file_class(cls_file.fetch('head'))
+        if file_class is not None:
+            return file_class(*args, **kwargs)
+
         mime = cls_file.mime()
         _type, subtype = mime.split('/', 1)
 
@@ -100,35 +157,172 @@ class GenericFile(object):
         elif _type == 'video' or cls_file.is_type('ogv'):
             from file_metadata.video.video_file import VideoFile
             return VideoFile.create(*args, **kwargs)
-        elif _type == 'application':
+        elif _type == 'application' or subtype in ('vnd-djvu', 'vnd.djvu'):
             from file_metadata.application.application_file import (
                 ApplicationFile)
             return ApplicationFile.create(*args, **kwargs)
 
         return cls_file
 
-    def analyze(self, prefix='analyze_', suffix='', methods=None):
+    def analyze(self, prefix='analyze_', suffix='', methods=None,
+                precomputed=None):
         """
         Analyze the given file and create metadata information appropriately.
         Search and use all methods that have a name starting with
         ``analyze_*`` and merge the doctionaries using ``.update()``
         to get the cumulative set of metadata.
 
-        :param prefix:  Use only methods that have this prefix.
-        :param suffix:  Use only methods that have this suffix.
-        :param methods: A list of method names to choose from. If not given,
-                        a sorted list of all methods from the class is used.
+        :param prefix:      Use only methods that have this prefix.
+        :param suffix:      Use only methods that have this suffix.
+        :param methods:     A list of method names to choose from. If not
+                            given, a sorted list of all methods from the
+                            class is used.
+        :param precomputed: A dict with the name of methods and the data
+                            they gave in an earlier analysis. These methods
+                            are not run again and the given data is used.
         :return: A dict containing the cumulative metadata.
         """
         data = {}
-        methods = methods or sorted(dir(self))
-        for method in methods:
-            if method.startswith(prefix) and method.endswith(suffix):
-                data.update(getattr(self, method)())
+        for result in self.analyze_each(prefix, suffix, methods,
+                                        precomputed).values():
+            data.update(result)
         return data
 
-    @memoized
-    def exiftool(self):
+    def analyze_each(self, prefix='analyze_', suffix='', methods=None,
+                     precomputed=None):
+        """
+        Run the analysis methods like ``analyze()`` but keep the data given
+        by every method separate.
+
+        :return: An OrderedDict with the name of every method that was used
+                 and the dict it gave.
+        """
+        precomputed = precomputed or {}
+        results = OrderedDict()
+        for method in self.analyzers(prefix, suffix, methods):
+            if method in precomputed:
+                results[method] = precomputed[method]
+            else:
+                results[method] = getattr(self, method)()
+        return results
+
+    def analyzers(self, prefix='analyze_', suffix='', methods=None):
+        """
+        Find the analysis methods to run, like ``analyze()`` does.
+
+        :return: A list with the names of the methods.
+        """
+        methods = methods or sorted(dir(self))
+        return [method for method in methods
+                if method.startswith(prefix) and method.endswith(suffix) and
+                method not in self.analysis_helpers]
+
+    @classmethod
+    def analyze_batch(cls, files, skip_errors=False):
+        """
+        Analyze a list of files of this class and close them. Classes can
+        override this to analyze similar files together.
+
+        :param files:       A list of objects of this class.
+        :param skip_errors: Log the errors of a file and give None as its
+                            metadata instead of raising them.
+        :return:            A list with the metadata of every file.
+        """
+        return [cls._analyze_and_close(_file, skip_errors) for _file in files]
+
+    @staticmethod
+    def _analyze_and_close(_file, skip_errors, precomputed=None):
+        try:
+            return _file.analyze(precomputed=precomputed)
+        except Exception as err:
+            if not skip_errors:
+                raise
+            logging.exception(err)
+            return None
+        finally:
+            _file.close()
+
+    @classmethod
+    def analyze_files(cls, filenames, batch_size=64, fetch_keys=(),
+                      skip_errors=False, **kwargs):
+        """
+        Analyze many files. The files are created with ``create()`` in
+        batches of ``batch_size`` files, and the files of a batch are given to
+        the ``analyze_batch()`` of their class.
+
+        :param filenames:   An iterable giving the filenames.
+        :param batch_size:  The maximum number of files in a batch.
+        :param fetch_keys:  The keys to ``fetch()`` from every file along
+                            with the analysis (Example: 'image_header'). As
+                            they are fetched before the analysis, the
+                            analyzers use the same cached data.
+        :param skip_errors: Log the errors of a file and give None as its
+                            metadata instead of raising them, so that the
+                            other files of the batch are still analyzed.
+        :param kwargs:      The kwargs to create the files with.
+        :return:            A generator giving a tuple of the filename and
+                            the metadata for every file, in the same order
+                            as the filenames. If ``fetch_keys`` is given,
+                            the tuple also has a dict with the fetched data.
+        """
+        batch = []
+        for filename in filenames:
+            batch.append(filename)
+            if len(batch) == batch_size:
+                for item in cls._analyze_file_batch(batch, fetch_keys,
+                                                    skip_errors, **kwargs):
+                    yield item
+                batch = []
+        for item in cls._analyze_file_batch(batch, fetch_keys, skip_errors,
+                                            **kwargs):
+            yield item
+
+    @classmethod
+    def _analyze_file_batch(cls, filenames, fetch_keys=(), skip_errors=False,
+                            **kwargs):
+        files, fetched = [], []
+        try:
+            for filename in filenames:
+                _file = None
+                try:
+                    _file = cls.create(filename, **kwargs)
+                    values = dict((key, _file.fetch(key))
+                                  for key in fetch_keys)
+                except Exception as err:
+                    if _file is not None:
+                        _file.close()
+                    if not skip_errors:
+                        raise
+                    logging.exception(err)
+                    _file, values = None, dict.fromkeys(fetch_keys)
+                files.append(_file)
+                fetched.append(values)
+
+            # Subclasses which inherit ``analyze_batch()`` (Like JPEGFile
+            # from ImageFile) are analyzed together.
+            groups = OrderedDict()
+            for index, _file in enumerate(files):
+                if _file is None:
+                    continue
+                analyze_batch = getattr(type(_file).analyze_batch, '__func__',
+                                        type(_file).analyze_batch)
+                groups.setdefault(analyze_batch, []).append(index)
+
+            results = [None] * len(files)
+            for analyze_batch, indices in groups.items():
+                batch = [files[index] for index in indices]
+                for index, data in zip(indices, type(batch[0]).analyze_batch(
+                        batch, skip_errors=skip_errors)):
+                    results[index] = data
+        finally:
+            for _file in files:
+                if _file is not None:
+                    _file.close()
+        if fetch_keys:
+            return list(zip(filenames, results, fetched))
+        return list(zip(filenames, results))
+
+    def exiftool(self, tags=None):
         """
         The exif data from the given file using ``exiftool``. The data it
         fetches includes:
@@ -146,15 +340,66 @@ class GenericFile(object):
         and many more types of information. For more information see
         <http://www.sno.phy.queensu.ca/~phil/exiftool/>.
 
+        As the ICC profiles, maker notes and XMP data can be large, the
+        ``exiftool_tags`` config can restrict the tags exiftool extracts.
+        exiftool is then run once with those tags, the
+        ``exiftool_used_tags`` of the class and the given tags, and the
+        data is cached for the later calls. Without the config, exiftool is
+        run once with all the tags. The data of a few tags is never used
+        for a request of all the tags.
+
+        :param tags:  The tag names to return (See ``exiftool_tag_pattern``).
+                      By default, the ``exiftool_tags`` config is used.
         :return:      A dictionary containing the exif information.
         """
+        profile = self.config('exiftool_tags')
+        if tags is None:
+            tags = profile
+        if tags is not None:
+            tags = frozenset(tags)
+        fast = int(self.config('exiftool_fast'))
+
+        for (cached_tags, cached_fast), data in self.exiftool_cache.items():
+            # Less -fast reads more of the file, and the data of more tags
+            # has the data of the requested ones.
+            if cached_fast <= fast and (cached_tags is None or (
+                    tags is not None and tags <= cached_tags)):
+                if tags == cached_tags:
+                    return data
+                pattern = exiftool_tag_pattern(tags)
+                return dict((key, val) for key, val in data.items()
+                            if pattern.match(key))
+
+        # Fetch all the tags needed by this object in a single run.
+        run_tags = None
+        if profile is not None:
+            run_tags = frozenset(profile).union(self.exiftool_used_tags,
+                                                tags or ())
+        data = self._run_exiftool(run_tags, fast)
+        if run_tags is not None:
+            # Drop the keys like SourceFile which exiftool always gives.
+            pattern = exiftool_tag_pattern(run_tags)
+            data = dict((key, val) for key, val in data.items()
+                        if pattern.match(key))
+        self.exiftool_cache[run_tags, fast] = data
+        if tags is not None and tags != run_tags:
+            pattern = exiftool_tag_pattern(tags)
+            data = dict((key, val) for key, val in data.items()
+                        if pattern.match(key))
+        return data
+
+    def _run_exiftool(self, tags, fast):
         executable = which('exiftool')
         if executable is None:
             raise OSError('Neither perl nor exiftool were found.')
 
+        command = [executable, '-G', '-j']
+        if fast:
+            command.append('-fast' if fast == 1 else '-fast2')
+        command.extend('-' + tag for tag in sorted(tags or ()))
         try:
-            output = subprocess.check_output([
-                executable, '-G', '-j', self.fetch('filename')])
+            output = subprocess.check_output(
+                command + [self.fetch('filename')])
         except subprocess.CalledProcessError as proc_error:
             output = proc_error.output
 
@@ -192,13 +437,19 @@ class GenericFile(object):
         """
         if key == "svg":
             return bool(is_svg(self))
+        elif key in ("ogg", "ogv") and self.fetch('ogg_media_type') in (
+                None, 'audio', 'video'):
+            # The codecs of the streams tell audio and video apart, so
+            # exiftool is only needed for Ogg files with unknown codecs.
+            return self.fetch('ogg_media_type') == (
+                'audio' if key == 'ogg' else 'video')
         elif key == "ogg":
-            exif = self.exiftool()
+            exif = self.exiftool(tags=('File:MIMEType', 'File:FileType'))
             return (exif.get('File:MIMEType') == 'audio/x-ogg' or
                     (exif.get('File:MIMEType') == 'application/ogg' and
                      exif.get('File:FileType').lower() == 'ogg'))
         elif key == "ogv":
-            exif = self.exiftool()
+            exif = self.exiftool(tags=('File:MIMEType', 'File:FileType'))
             return (exif.get('File:MIMEType') == 'video/x-ogg' or
                     (exif.get('File:MIMEType') == 'application/ogg' and
                      exif.get('File:FileType').lower() == 'ogv'))
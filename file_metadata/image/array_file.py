@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+from collections import Counter
+
+import numpy
+from PIL import Image
+
+from file_metadata.image.image_file import ImageFile
+from file_metadata.utilities import memoized
+
+
+def aggregate_image_data(results, prefix):
+    """
+    Summarize the data of the image analyzers on many images of a file
+    (Like the frames of a video or the pages of a document).
+
+    :param results: A list with a dict of the data of every image.
+    :param prefix:  The prefix of the keys. Example: "Video:".
+    :return:        dict with the keys (after the prefix):
+
+                    - ClosestLabeledColor - The closest labeled color of
+                      most of the images.
+                    - AverageRGB - The average color of the images.
+                    - MaxFaces - The largest number of faces in an image.
+                    - Barcodes - The unique barcodes in the images.
+    """
+    data = {}
+    labels = [result['Color:ClosestLabeledColor'] for result in results
+              if 'Color:ClosestLabeledColor' in result]
+    if labels:
+        data[prefix + 'ClosestLabeledColor'] = \
+            Counter(labels).most_common(1)[0][0]
+    colors = [result['Color:AverageRGB'] for result in results
+              if 'Color:AverageRGB' in result]
+    if colors:
+        data[prefix + 'AverageRGB'] = tuple(
+            round(val, 3) for val in numpy.mean(colors, axis=0))
+
+    faces = [max(len(result.get('OpenCV:Faces', [])),
+                 len(result.get('dlib:Faces', []))) for result in results]
+    data[prefix + 'MaxFaces'] = max(faces)
+
+    barcodes = []
+    for result in results:
+        for barcode in (result.get('zbar:Barcodes', []) +
+                        result.get('zxing:Barcodes', [])):
+            found = (barcode.get('format'), barcode.get('data'))
+            if found not in barcodes:
+                barcodes.append(found)
+    if barcodes:
+        data[prefix + 'Barcodes'] = [{'format': fmt, 'data': value}
+                                     for fmt, value in barcodes]
+    return data
+
+
+class ArrayImageFile(ImageFile):
+    """
+    An image which is already decoded into a numpy array, like a frame of a
+    video. The image analyzers use the array given with the ``array`` config
+    instead of decoding a file. The filename is the file the image came
+    from, and is used only to name temporary files.
+    """
+
+    def config(self, key, new_defaults=()):
+        defaults = {
+            # The uint8 array of the image with the shape (height, width) or
+            # (height, width, channels).
+            "array": None,
+        }
+        defaults.update(dict(new_defaults))  # Update the defaults from child
+        return super(ArrayImageFile, self).config(key, new_defaults=defaults)
+
+    @classmethod
+    def create(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+    @memoized
+    def fetch(self, key=''):
+        if key == 'ndarray' and self.attached_array(key) is None:
+            return self.config('array')
+        elif key == 'pillow':
+            return Image.fromarray(self.fetch('ndarray'))
+        elif key == 'filename_raster':
+            # Tools which need a file get a PNG of the array.
+            return self.fetch('filename_png')
+        elif key == 'exif_thumbnail':
+            return None
+        return super(ArrayImageFile, self).fetch(key)
@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+"""
+Backends which decode the pixels of a raster image into a numpy array.
+
+The image is always opened once with Pillow - which only reads the header
+of the file when opening it. A backend then gets the Pillow image and
+decides whether it can decode the pixels. If it can, the pixels are decoded
+by it. Otherwise, the next backend is tried and Pillow itself is used as the
+final fallback. The given Pillow image is not decoded, so that only the
+numpy array keeps the pixels in memory.
+
+To add a new backend, inherit from ``ImageBackend`` and register an
+instance of it with ``register_backend()``.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import logging
+from collections import OrderedDict
+
+import numpy
+from PIL import Image
+
+
+class ImageBackend(object):
+    """
+    A decoder which converts an image file to a numpy array. The arrays
+    given by a backend should be the same as the one given by the
+    ``PillowBackend`` (Same shape, dtype and channel order).
+
+    :ivar name:    The name used to refer to the backend in the
+                   ``decode_backends`` config.
+    :ivar formats: The Pillow formats (``Image.format``) which the backend
+                   can decode. If empty, all formats are assumed to be
+                   supported.
+    :ivar modes:   The Pillow modes (``Image.mode``) which the backend
+                   can decode. If empty, all modes are assumed to be
+                   supported.
+    """
+    name = None
+    formats = ()
+    modes = ()
+
+    def is_available(self):
+        """
+        Check whether the dependencies of the backend are installed.
+        """
+        return True
+
+    def can_decode(self, pillow_img):
+        """
+        Check whether the backend can decode the given image. Only the
+        header information of the Pillow image should be used here.
+
+        :param pillow_img: The Pillow image which was opened for the file.
+        :return:           Boolean corresponding to whether the image can be
+                           decoded by this backend.
+        """
+        if self.formats and pillow_img.format not in self.formats:
+            return False
+        if self.modes and pillow_img.mode not in self.modes:
+            return False
+        return getattr(pillow_img, 'n_frames', 1) == 1
+
+    def decode(self, filename, pillow_img):
+        """
+        Decode the image into a numpy array.
+
+        :param filename:   The path of the file to decode.
+        :param pillow_img: The Pillow image which was opened for the file.
+        :return:           A numpy array or None if the backend was unable
+                           to decode the image and the next one should be
+                           used.
+        """
+        raise NotImplementedError
+
+
+def _palette_is_grayscale(pillow_img):
+    """
+    Check whether the colors used in the palette of a "P" mode image are all
+    shades of grey.
+    """
+    palette = numpy.asarray(pillow_img.getpalette()).reshape((-1, 3))
+    # Not all palette colors are used; unused colors have junk values.
+    start, stop = pillow_img.getextrema()
+    return numpy.allclose(numpy.diff(palette[start:stop + 1]), 0)
+
+
+def palette_mode(pillow_img, grayscale=None):
+    """
+    Find the mode a "P" mode image is converted to by
+    ``pil_frame_to_ndarray()``.
+
+    :param pillow_img: The Pillow image with the mode "P".
+    :param grayscale:  Whether the palette is greyscale (Found automatically
+                       if not given).
+    :return:           One of 'L', 'RGB' or 'RGBA'.
+    """
+    if grayscale is None:
+        grayscale = _palette_is_grayscale(pillow_img)
+    if grayscale:
+        return 'L'
+    elif pillow_img.format == 'PNG' and 'transparency' in pillow_img.info:
+        return 'RGBA'
+    return 'RGB'
+
+
+def palette_to_ndarray(pillow_img, grayscale=None):
+    """
+    Convert the palette of a "P" mode image into a numpy array in the same
+    way ``pil_frame_to_ndarray()`` converts the pixels. Indexing the array
+    with the palette indices of the image gives the converted image.
+
+    :param pillow_img: The Pillow image with the mode "P".
+    :param grayscale:  Whether the palette is greyscale (Found automatically
+                       if not given).
+    :return:           A uint8 numpy array with the shape (256,) or
+                       (256, channels).
+    """
+    mode = palette_mode(pillow_img, grayscale)
+    lut_img = Image.frombytes('P', (256, 1),
+                              numpy.arange(256, dtype=numpy.uint8).tobytes())
+    lut_img.putpalette(pillow_img.getpalette())
+    if 'transparency' in pillow_img.info:
+        lut_img.info['transparency'] = pillow_img.info['transparency']
+    return numpy.asarray(lut_img.convert(mode))[0]
+
+
+def pil_frame_to_ndarray(frame, grayscale=None):
+    """
+    Convert the current frame of a Pillow image into a numpy array. The
+    conversions done are the same as the ones done by the pil plugin of
+    ``skimage.io.imread``:
+
+     - Palette images are converted to greyscale, RGB or RGBA images.
+     - Bilevel images are converted to greyscale.
+     - Images with an alpha channel are converted to RGBA.
+     - CMYK images are converted to RGB.
+
+    The data is exposed to numpy with the array interface of Pillow, hence
+    no copy other than the one done by Pillow itself is made.
+
+    :param frame:     The Pillow image to convert.
+    :param grayscale: Whether the palette is greyscale (Found automatically
+                      if not given).
+    :return:          The numpy array of the frame.
+    """
+    mode = frame.mode
+    if mode == 'P':
+        frame = frame.convert(palette_mode(frame, grayscale))
+    elif mode == '1':
+        frame = frame.convert('L')
+    elif 'A' in mode:
+        frame = frame.convert('RGBA')
+    elif mode == 'CMYK':
+        frame = frame.convert('RGB')
+
+    if mode.startswith('I;16'):
+        dtype = '>u2' if mode.endswith('B') else '<u2'
+        if 'S' in mode:
+            dtype = dtype.replace('u', 'i')
+        return numpy.frombuffer(frame.tobytes(), dtype).reshape(
+            frame.size[::-1])
+    elif mode == 'I' and frame.format == 'PNG':
+        return numpy.asarray(frame).astype(numpy.uint16)
+    return numpy.asarray(frame)
+
+
+class PillowBackend(ImageBackend):
+    """
+    Decode the image with Pillow. This can decode every image which can be
+    opened by Pillow and is used as the fallback for all other backends.
+    Animated images are given as a 4 dimensional array containing all the
+    frames.
+    """
+    name = 'pillow'
+
+    def can_decode(self, pillow_img):
+        return True
+
+    def decode(self, filename, pillow_img):
+        # The pixels are decoded in a separate Pillow image which is closed
+        # after the conversion, so that Pillow's copy of the pixels is not
+        # kept in memory (by the given image) along with the array.
+        frames = []
+        grayscale = None
+        index = 0
+        decoded_img = Image.open(filename)
+        try:
+            while True:
+                try:
+                    decoded_img.seek(index)
+                except EOFError:
+                    break
+                if decoded_img.mode == 'P' and grayscale is None:
+                    grayscale = _palette_is_grayscale(decoded_img)
+                frames.append(pil_frame_to_ndarray(decoded_img, grayscale))
+                index += 1
+        finally:
+            decoded_img.close()
+
+        if len(frames) > 1:
+            return numpy.array(frames)
+        return frames[0]
+
+
+class TurboJPEGBackend(ImageBackend):
+    """
+    Decode JPEG images with libjpeg-turbo using the PyTurboJPEG bindings.
+    """
+    name = 'turbojpeg'
+    formats = ('JPEG',)
+    modes = ('L', 'RGB')
+    _decoder = None
+
+    def is_available(self):
+        if TurboJPEGBackend._decoder is None:
+            try:
+                from turbojpeg import TurboJPEG
+                TurboJPEGBackend._decoder = TurboJPEG()
+            except (ImportError, OSError, RuntimeError):
+                TurboJPEGBackend._decoder = False
+        return bool(TurboJPEGBackend._decoder)
+
+    def decode(self, filename, pillow_img):
+        from turbojpeg import TJPF_GRAY, TJPF_RGB
+        with open(filename, 'rb') as jpeg_file:
+            data = jpeg_file.read()
+        if pillow_img.mode == 'L':
+            return self._decoder.decode(data, pixel_format=TJPF_GRAY)[..., 0]
+        return self._decoder.decode(data, pixel_format=TJPF_RGB)
+
+
+class PyVipsBackend(ImageBackend):
+    """
+    Decode 8 bit images with libvips using the pyvips bindings.
+    """
+    name = 'pyvips'
+    formats = ('JPEG', 'PNG', 'TIFF', 'WEBP')
+    modes = ('L', 'RGB', 'RGBA')
+
+    def is_available(self):
+        try:
+            import pyvips  # noqa (unused import)
+        except (ImportError, OSError):
+            return False
+        return True
+
+    def can_decode(self, pillow_img):
+        # Pillow ignores the tRNS chunk of non palette images, vips doesn't.
+        return (super(PyVipsBackend, self).can_decode(pillow_img) and
+                'transparency' not in pillow_img.info)
+
+    def decode(self, filename, pillow_img):
+        import pyvips
+        image = pyvips.Image.new_from_file(filename, access='sequential')
+        bands = len(pillow_img.getbands())
+        if image.format != 'uchar' or image.bands != bands:
+            return None
+        array = numpy.frombuffer(image.write_to_memory(), dtype=numpy.uint8)
+        array = array.reshape((image.height, image.width, bands))
+        return array[..., 0] if bands == 1 else array
+
+
+class MemmapBackend(ImageBackend):
+    """
+    Map the pixels of uncompressed images (BMP, binary PPM/PGM and
+    uncompressed TIFF) into memory with ``numpy.memmap``. The offset and
+    layout of the pixels are taken from the header parsed by Pillow. The
+    array is a read-only view of the file, hence it opens in constant time
+    and the pixels are read from the page cache only when they are used.
+    """
+    name = 'mmap'
+    formats = ('BMP', 'PPM', 'TIFF')
+    # The raw modes which can be viewed as the array Pillow gives for the
+    # image mode: (image mode, bytes per pixel, dtype, channel index).
+    # A channel index of None keeps all channels.
+    rawmodes = {
+        'L': ('L', 1, numpy.uint8, None),
+        'RGB': ('RGB', 3, numpy.uint8, None),
+        'RGBA': ('RGBA', 4, numpy.uint8, None),
+        'RGBX': ('RGB', 4, numpy.uint8, slice(None, 3)),
+        'BGR': ('RGB', 3, numpy.uint8, slice(None, None, -1)),
+        'BGRX': ('RGB', 4, numpy.uint8, slice(2, None, -1)),
+        'I;16': ('I;16', 1, numpy.dtype('<u2'), None),
+        'I;16B': ('I;16B', 1, numpy.dtype('>u2'), None),
+    }
+
+    def layout(self, pillow_img):
+        """
+        Find the layout of the pixels from the tiles of the Pillow image.
+        The tiles need to be raw full width strips stored one after the
+        other in the file.
+
+        :return: A tuple with the offset of the first row, the number of
+                 bytes in a row, whether the rows are stored bottom up and
+                 the raw mode. None if the pixels cannot be mapped.
+        """
+        width, height = pillow_img.size
+        layout = None
+        next_row, next_offset = 0, None
+        for tile in pillow_img.tile:
+            codec, extents, offset, args = tile[:4]
+            if not isinstance(args, tuple):
+                args = (args, 0, 1)
+            rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+            if (codec != 'raw' or rawmode not in self.rawmodes or
+                    self.rawmodes[rawmode][0] != pillow_img.mode or
+                    tuple(extents) != (0, next_row, width, extents[3])):
+                return None
+            stride = stride or width * (
+                self.rawmodes[rawmode][1] *
+                numpy.dtype(self.rawmodes[rawmode][2]).itemsize)
+            if layout is None:
+                layout = (offset, stride, orientation < 0, rawmode)
+            elif (layout[1:] != (stride, orientation < 0, rawmode) or
+                    offset != next_offset):
+                return None
+            next_row = extents[3]
+            next_offset = offset + (extents[3] - extents[1]) * stride
+        if layout is None or next_row != height:
+            return None
+        return layout
+
+    def can_decode(self, pillow_img):
+        return (super(MemmapBackend, self).can_decode(pillow_img) and
+                self.layout(pillow_img) is not None)
+
+    def decode(self, filename, pillow_img):
+        width, height = pillow_img.size
+        offset, stride, bottom_up, rawmode = self.layout(pillow_img)
+        _, channels, dtype, index = self.rawmodes[rawmode]
+        dtype = numpy.dtype(dtype)
+        try:
+            mapped = numpy.memmap(filename, dtype=numpy.uint8, mode='r',
+                                  offset=offset, shape=(height * stride,))
+        except (ValueError, IOError, OSError):
+            return None  # The file is truncated
+        if channels == 1:
+            array = numpy.ndarray((height, width), dtype=dtype,
+                                  buffer=mapped,
+                                  strides=(stride, dtype.itemsize))
+        else:
+            array = numpy.ndarray((height, width, channels), dtype=dtype,
+                                  buffer=mapped, strides=(stride, channels, 1))
+            if index is not None:
+                array = array[..., index]
+        if bottom_up:
+            array = array[::-1]
+        array.flags.writeable = False
+        return array
+
+
+BACKENDS = OrderedDict()
+
+
+def register_backend(backend):
+    """
+    Register an instance of ``ImageBackend`` so that it can be used in the
+    ``decode_backends`` config of an ``ImageFile``.
+    """
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+for _backend in (MemmapBackend(), TurboJPEGBackend(), PyVipsBackend(),
+                 PillowBackend()):
+    register_backend(_backend)
+
+
+def decode_image(filename, pillow_img, backends=('pillow',)):
+    """
+    Decode the given image with the first backend that is available and
+    can decode it. Pillow is used if none of the backends can be used.
+
+    :param filename:   The path of the file to decode.
+    :param pillow_img: The Pillow image which was opened for the file.
+    :param backends:   The names of the backends to try in order.
+    :return:           The decoded numpy array.
+    """
+    for name in backends:
+        backend = BACKENDS.get(name)
+        if backend is None:
+            logging.warn('Unknown image backend "{0}" was ignored.'
+                         .format(name))
+            continue
+        if backend.is_available() and backend.can_decode(pillow_img):
+            array = backend.decode(filename, pillow_img)
+            if array is not None:
+                return array
+    return BACKENDS['pillow'].decode(filename, pillow_img)
+
+
+def reduce_channels(array):
+    """
+    Reduce the channels of an RGBA array which was created in memory. The
+    alpha channel is removed if the image is opaque and the color channels
+    are merged if the image only has shades of grey.
+
+    :param array: A numpy array with the shape (height, width, 4).
+    :return:      A numpy array with the shape (height, width, 4) if the
+                  image has transparent pixels, else (height, width) for
+                  shades of grey and (height, width, 3) for colors.
+    """
+    if (array[..., 3] == 255).all():
+        array = array[..., :3]
+    if ((array[..., 0] == array[..., 1]).all() and
+            (array[..., 1] == array[..., 2]).all()):
+        return array[..., 0] if array.shape[2] == 3 else array
+    return array
+
+
+def wand_to_ndarray(wand_img):
+    """
+    Convert a ``wand.image.Image`` to a numpy array directly from its pixels
+    in memory without encoding it into an intermediate file format.
+
+    :param wand_img: The wand image to convert.
+    :return:         A uint8 numpy array (See ``reduce_channels()``).
+    """
+    wand_img.depth = 8
+    blob = wand_img.make_blob(format='RGBA')
+    array = numpy.frombuffer(blob, dtype=numpy.uint8)
+    return reduce_channels(
+        array.reshape((wand_img.height, wand_img.width, 4)))
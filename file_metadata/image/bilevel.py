@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Bilevel (1 bit) images kept in their bit packed form.
+
+Scanned documents are often bilevel images (Like TIFF G4 or 1 bit PNG).
+Decoding them into uint8 arrays takes 8 times the memory of the packed
+pixels, and more when converted to float. A ``PackedImage`` keeps every
+row packed into bytes (In the layout of ``numpy.packbits``) so that pixel
+counts are found with a popcount lookup table, and only the parts of the
+image which are needed as uint8 arrays are expanded.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import numpy
+
+# The number of set bits in every byte.
+POPCOUNT = numpy.array([bin(value).count('1') for value in range(256)],
+                       dtype=numpy.uint8)
+
+
+def popcount(packed):
+    """
+    Find the number of set bits in an array of packed bits.
+    """
+    return int(numpy.bincount(numpy.asarray(packed).ravel(),
+                              minlength=256).dot(POPCOUNT))
+
+
+def _unpack(packed, width):
+    # Expand packed bits to a uint8 array with the values 0 and 255.
+    pixels = numpy.unpackbits(packed, axis=1)[:, :width]
+    pixels *= 255
+    return pixels
+
+
+class PackedImage(object):
+    """
+    A bilevel image with its rows packed into bytes. The most significant
+    bit of every byte is the leftmost pixel and the bits after the last
+    pixel of a row are 0. It acts like a read-only 2 dimensional uint8
+    array with the values 0 and 255 for slicing with ``[rows, cols]`` and
+    ``numpy.asarray()``, which expand only the pixels asked for.
+
+    :ivar bits:  The uint8 array of packed bits with the shape
+                 (height, ceil(width / 8)).
+    :ivar width: The width of the image in pixels.
+    """
+    ndim = 2
+    dtype = numpy.dtype(numpy.uint8)
+
+    def __init__(self, bits, width):
+        self.bits = bits
+        self.width = width
+
+    @classmethod
+    def from_pillow(cls, pillow_img):
+        """
+        Create a ``PackedImage`` from the current frame of a Pillow image
+        with the mode "1". The raw data of such images is already packed.
+        """
+        width, height = pillow_img.size
+        bits = numpy.frombuffer(pillow_img.tobytes(), dtype=numpy.uint8)
+        return cls(bits.reshape((height, (width + 7) // 8)), width)
+
+    @property
+    def shape(self):
+        return self.bits.shape[0], self.width
+
+    @property
+    def size(self):
+        return self.bits.shape[0] * self.width
+
+    def count(self):
+        """
+        Find the number of white pixels in the image.
+        """
+        return popcount(self.bits)
+
+    def columns(self, start, stop, rows=slice(None)):
+        """
+        Get the packed bits of a range of columns, shifted so that the column
+        ``start`` is the first bit of every row.
+
+        :param start: The first column.
+        :param stop:  The column after the last column.
+        :param rows:  A slice of the rows to use.
+        :return:      A uint8 array of packed bits.
+        """
+        bits = self.bits[rows]
+        first, shift = divmod(start, 8)
+        num_bytes = (stop - start + 7) // 8
+        if shift == 0:
+            packed = bits[:, first:first + num_bytes].copy()
+        else:
+            # Every byte gets the end of a byte and the start of the next.
+            part = bits[:, first:first + num_bytes + 1]
+            wide = numpy.zeros((bits.shape[0], num_bytes + 1), numpy.uint16)
+            wide[:, :part.shape[1]] = part
+            packed = ((wide[:, :-1] << shift) |
+                      (wide[:, 1:] >> (8 - shift))).astype(numpy.uint8)
+        extra = num_bytes * 8 - (stop - start)
+        if extra:
+            packed[:, -1] &= (0xff << extra) & 0xff
+        return packed
+
+    def __getitem__(self, key):
+        rows, cols = key if isinstance(key, tuple) else (key, slice(None))
+        if (not isinstance(rows, slice) or not isinstance(cols, slice) or
+                rows.step not in (None, 1) or cols.step not in (None, 1)):
+            return numpy.asarray(self)[key]
+        start, stop, _ = cols.indices(self.width)
+        stop = max(start, stop)
+        return _unpack(self.columns(start, stop, rows), stop - start)
+
+    def __array__(self, dtype=None, copy=None):
+        pixels = _unpack(self.bits, self.width)
+        return pixels if dtype is None else pixels.astype(dtype)
+
+    def reduce(self, factor):
+        """
+        Downscale the image by averaging blocks of pixels. Only ``factor``
+        rows are expanded at a time.
+
+        :param factor: The (integer) size of the blocks.
+        :return:       A float array with values from 0 to 255.
+        """
+        height, width = self.shape
+        out_width = width // factor
+        reduced = numpy.zeros((height // factor, out_width))
+        for index in range(reduced.shape[0]):
+            strip = numpy.unpackbits(
+                self.bits[index * factor:(index + 1) * factor],
+                axis=1)[:, :out_width * factor]
+            reduced[index] = strip.reshape(
+                factor, out_width, factor).sum(axis=(0, 2))
+        return reduced * (255.0 / factor ** 2)
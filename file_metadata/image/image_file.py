@@ -3,12 +3,19 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
+import io
 import json
 import logging
+import math
+import multiprocessing
 import os
 import re
+import struct
 import subprocess
+import tempfile
+import threading
 import warnings
+from collections import OrderedDict
 
 import dlib
 import numpy
@@ -18,15 +25,23 @@ import skimage
 import skimage.color
 import skimage.exposure
 import skimage.feature
-import skimage.io
 import skimage.transform
 import zbar
+from colormath.color_conversions import convert_color
+from colormath.color_objects import LabColor, sRGBColor
 from PIL import Image
 from pycolorname.pantone.pantonepaint import PantonePaint
 from six.moves.urllib.request import urlopen
 from six.moves.urllib.error import URLError
 
 from file_metadata.generic_file import GenericFile
+from file_metadata.image.backends import (decode_image, palette_mode,
+                                          palette_to_ndarray,
+                                          pil_frame_to_ndarray)
+from file_metadata.image.bilevel import PackedImage, popcount
+from file_metadata.image.perceptual_hash import HashIndex, dhash, phash
+from file_metadata.image.shared_arrays import SharedArray, is_available
+from file_metadata.image.tiling import box_overlap, boxes_touch, detect_tiled
 from file_metadata.utilities import (DictNoNone, app_dir, bz2_decompress,
                                      download, to_cstr, memoized, DATA_PATH)
 
@@ -34,14 +49,254 @@ from file_metadata.utilities import (DictNoNone, app_dir, bz2_decompress,
 # uses a uge amount of RAM. For example, a monochrome PNG file with 100kx100k
 # pixels. This tells PIL to make this warning into an error.
 warnings.simplefilter('error', Image.DecompressionBombWarning)
+# Newer versions of Pillow raise an error for images which have more than
+# twice the allowed number of pixels.
+DECOMPRESSION_BOMB_ERRORS = (Image.DecompressionBombWarning,
+                             getattr(Image, 'DecompressionBombError',
+                                     Image.DecompressionBombWarning))
+
+# zbar scanners are reused in every thread as creating and configuring a
+# scanner for every image is costly.
+_zbar_local = threading.local()
+
+
+def zbar_scanner():
+    """
+    The ``zbar.ImageScanner`` of the current thread with all symbologies
+    enabled.
+    """
+    scanner = getattr(_zbar_local, 'scanner', None)
+    if scanner is None:
+        scanner = _zbar_local.scanner = zbar.ImageScanner()
+        scanner.parse_config('enable')
+    return scanner
+
+
+_pantone_lab = []
+
+
+def _lab(color):
+    # The same conversion as the one done by ``PantonePaint.find_closest()``
+    lab = convert_color(sRGBColor(*color), LabColor, target_illuminant='D65')
+    return lab.get_value_tuple()
+
+
+def closest_pantone_colors(colors):
+    """
+    Find the closest colors in the Pantone color palette like
+    ``PantonePaint().find_closest()`` does for every color. The palette is
+    loaded and converted to the Lab color space only once.
+
+    :param colors: A list of (r, g, b) colors.
+    :return:       A list with a tuple of the name and the (r, g, b) value of
+                   the closest Pantone color for every color.
+    """
+    if not _pantone_lab:
+        palette = list(PantonePaint().items())
+        _pantone_lab.append(palette)
+        _pantone_lab.append(numpy.array([_lab(rgb) for _, rgb in palette]))
+    palette, palette_lab = _pantone_lab
+    closest = []
+    for color in colors:
+        # delta E (CIE 1976) is the euclidean distance in the Lab space
+        distance = ((palette_lab - _lab(color)) ** 2).sum(axis=1)
+        closest.append(palette[int(numpy.argmin(distance))])
+    return closest
+
+
+def _exif_ifd(tiff, offset, endian):
+    """
+    Read the single valued SHORT and LONG tags of an IFD in EXIF data.
+
+    :return: A tuple with a dict of the tags and the offset of the next IFD.
+    """
+    if offset < 8:
+        raise struct.error('Invalid IFD offset {0}'.format(offset))
+    count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+    tags = {}
+    for index in range(count):
+        start = offset + 2 + 12 * index
+        tag, _type, num, value = struct.unpack(endian + 'HHI4s',
+                                               tiff[start:start + 12])
+        if num == 1 and _type == 3:  # SHORT
+            tags[tag] = struct.unpack(endian + 'H', value[:2])[0]
+        elif num == 1 and _type == 4:  # LONG
+            tags[tag] = struct.unpack(endian + 'I', value)[0]
+    end = offset + 2 + 12 * count
+    return tags, struct.unpack(endian + 'I', tiff[end:end + 4])[0]
+
+
+def exif_thumbnail(exif):
+    """
+    Find the JPEG thumbnail embedded in the EXIF data of an image. The
+    thumbnail is given by the JPEGInterchangeFormat tags of IFD1.
+
+    :param exif: The raw EXIF data (Example: ``pillow_img.info['exif']``).
+    :return:     A tuple with the JPEG data of the thumbnail and a tuple with
+                 the Orientation tags of the image and the thumbnail (None if
+                 not given). None if there is no thumbnail.
+    """
+    if exif.startswith(b'Exif\x00\x00'):
+        exif = exif[6:]
+    endian = {b'II': '<', b'MM': '>'}.get(exif[:2])
+    if endian is None:
+        return None
+    try:
+        ifd0, offset = _exif_ifd(
+            exif, struct.unpack(endian + 'I', exif[4:8])[0], endian)
+        if offset == 0:
+            return None
+        ifd1, _ = _exif_ifd(exif, offset, endian)
+    except struct.error:
+        return None
+    start, length = ifd1.get(0x201), ifd1.get(0x202)
+    if not start or not length or start + length > len(exif):
+        return None
+    return exif[start:start + length], (ifd0.get(0x112), ifd1.get(0x112))
+
+
+def _analyze_method(args):
+    """
+    Run an analyzer of a file in an analyzer process of
+    ``ImageFile.analyze()``.
+
+    :param args: A tuple with the class, filename and options of the file and
+                 the name of the analyzer method.
+    :return:     The data found by the analyzer.
+    """
+    cls, filename, options, method = args
+    with cls(filename, **options) as uut:
+        return getattr(uut, method)()
 
 
 class ImageFile(GenericFile):
     mimetypes = ()
+    exiftool_used_tags = GenericFile.exiftool_used_tags + (
+        'EXIF:GPS*', 'XMP:GPS*')
+    # The decoded arrays used by the analyzers, which are shared with the
+    # processes of the ``analyze_processes`` config. Other analyzers do not
+    # need a decoded array.
+    analyzer_arrays = {
+        'analyze_perceptual_hash': ('ndarray',),
+        'analyze_color_calibration_target': ('ndarray', 'ndarray_grey'),
+        'analyze_stereo_card': ('ndarray_grey',),
+        'analyze_color_info': ('ndarray', 'ndarray_grey'),
+        'analyze_face_haarcascades': ('ndarray_luma',),
+        'analyze_facial_landmarks': ('ndarray',),
+        'analyze_barcode_zbar': ('ndarray_luma',),
+    }
+
+    def __init__(self, fname, **kwargs):
+        super(ImageFile, self).__init__(fname, **kwargs)
+        self.shared_arrays = {}  # The arrays shared by share_arrays()
+
+    def close(self):
+        super(ImageFile, self).close()
+        # The shared memory segments were removed, hence the arrays need to
+        # be shared again if the file is analyzed again.
+        self.shared_arrays.clear()
 
     def config(self, key, new_defaults=()):
         defaults = {
-            "max_decompressed_size": int(1024 ** 3 / 4 / 3)  # In bytes
+            "max_decompressed_size": int(1024 ** 3 / 4 / 3),  # In bytes
+            # The backends to try (in order) when decoding the image. Pillow
+            # is always used as the fallback.
+            "decode_backends": ('mmap', 'turbojpeg', 'pyvips', 'pillow'),
+            # The maximum number of pages (or frames) to analyze in multi
+            # page images.
+            "max_pages": 20,
+            # Run the detectors on very large images in overlapping tiles of
+            # this size (in pixels) using multiple threads. None to disable.
+            # The overlap should be larger than the objects to detect.
+            "zbar_tile_size": None,
+            "zbar_tile_overlap": 256,
+            "dlib_tile_size": None,
+            "dlib_tile_overlap": 512,
+            # The tiles of haarcascades are in the image downscaled for it.
+            "haar_tile_size": None,
+            "haar_tile_overlap": 128,
+            "tile_threads": None,  # None uses the number of CPUs
+            # Skip the barcode decoders if the barcode likelihood of the
+            # image (See ``barcode_likelihood()``) is lower than this.
+            # None to always run the decoders. About 0.2 skips most photos
+            # without barcodes (See ImageFileBarcodeLikelihoodReport).
+            "barcode_min_likelihood": None,
+            # Run zxing only if zbar found no barcodes and the barcode
+            # likelihood is at least ``barcode_zxing_min_likelihood``.
+            "barcode_cascade": False,
+            "barcode_zxing_min_likelihood": 0.3,
+            # Detect faces with dlib in a downscaled image with at most
+            # these many pixels. None to use the full image.
+            "face_detection_max_pixels": None,
+            # Predict the facial landmarks of faces found in a downscaled
+            # image using crops of the full resolution image.
+            "face_landmarks_full_resolution": True,
+            # The face detectors to run. One of:
+            #  - 'all' - Run both dlib and haarcascades.
+            #  - 'dlib_first' - Run haarcascades only if dlib needs to be
+            #    double checked (See ``face_detector_needed()``).
+            #  - 'haar_first' - Run dlib only if haarcascades needs to be
+            #    double checked.
+            "face_detection_strategy": 'all',
+            # dlib faces with a lower score need to be double checked.
+            "face_min_dlib_score": 0.045,
+            # Haarcascade faces with lesser features (eyes, ears, nose,
+            # mouth, glasses) need to be double checked.
+            "face_min_haar_features": 4,
+            # Images with lesser grey shades (like maps, diagrams and scans)
+            # are not double checked if no faces are found.
+            "face_photo_min_grey_shades": 64,
+            # Faces from the second detector which overlap a face from the
+            # first detector more than this (intersection over union) are
+            # dropped.
+            "face_max_overlap": 0.3,
+            # The number of processes to run the analyzers in. The decoded
+            # arrays are given to the processes using shared memory (Needs
+            # python 3.8+). None to run the analyzers serially.
+            "analyze_processes": None,
+            # The shared memory descriptors of the arrays decoded by the
+            # parent process. Used internally by the analyzer processes.
+            "attach_arrays": None,
+            # Images with a width and height of at most these many pixels are
+            # analyzed together in ``analyze_batch()``.
+            "batch_max_size": 100,
+            # The coarse analyzers which use the thumbnail embedded in the
+            # EXIF data (if it matches the image) instead of decoding the
+            # full image. Example: ('analyze_color_info',
+            # 'analyze_stereo_card'). Their data is only approximate.
+            "exif_thumbnail_analyzers": (),
+            # The maximum relative difference of the aspect ratio of the
+            # thumbnail and the image to use the thumbnail.
+            "exif_thumbnail_max_aspect_error": 0.02,
+            # Keep the pixels of bilevel (1 bit) images packed into bits
+            # (See ``bilevel.PackedImage``), which needs 8 times lesser
+            # memory. The color info and stereo card data are found from the
+            # packed bits, but the edge ratio and barcode likelihood use a
+            # box filtered downscale, hence differ slightly.
+            "bilevel_packed": False,
+            # The path of the ``HashIndex`` used to reuse the data of near
+            # duplicate images. None to analyze every image fully.
+            "duplicate_index": None,
+            # The maximum number of bits the perceptual hashes of near
+            # duplicates may differ in.
+            "duplicate_max_distance": 3,
+            # The (expensive) analyzers whose data is reused.
+            "duplicate_reuse": ('analyze_barcode_zbar',
+                                'analyze_barcode_zxing', 'analyze_color_info',
+                                'analyze_face_haarcascades',
+                                'analyze_facial_landmarks'),
+            # The analyzers giving positions, which are reused only if the
+            # near duplicate has the same size.
+            "duplicate_positional": ('analyze_barcode_zbar',
+                                     'analyze_barcode_zxing',
+                                     'analyze_face_haarcascades',
+                                     'analyze_facial_landmarks'),
+            # The analyzers giving colors, which are reused only if the mean
+            # colors of the near duplicates differ by at most
+            # ``duplicate_max_color_distance`` (0 - 255) in every channel.
+            # The perceptual hash is found from the grey image only.
+            "duplicate_colored": ('analyze_color_info',),
+            "duplicate_max_color_distance": 8,
         }
         defaults.update(dict(new_defaults))  # Update the defaults from child
         return super(ImageFile, self).config(key, new_defaults=defaults)
@@ -68,26 +323,31 @@ class ImageFile(GenericFile):
 
     def is_type(self, key):
         if key == 'alpha':
-            return self.fetch('pillow').mode in ('LA', 'RGBA')
+            header = self.fetch('image_header')
+            if header is None:
+                return False  # The file cannot be read (Decompression bomb).
+            mode = header['mode']
+            if mode == 'P':
+                # Palette images with transparency are decoded as RGBA.
+                return palette_mode(self.fetch('pillow')) == 'RGBA'
+            return mode in ('LA', 'RGBA')
         return super(ImageFile, self).is_type(key)
 
     @memoized
     def fetch(self, key=''):
+        if key in ('ndarray', 'ndarray_grey', 'ndarray_luma'):
+            attached = self.attached_array(key)
+            if attached is not None:
+                return attached
         if key == 'filename_raster':
             # A raster filename holds the file in a raster graphic format
             return self.fetch('filename')
         elif key == 'filename_zxing':
             return pathlib2.Path(self.fetch('filename_raster')).as_uri()
         elif key == 'ndarray':
-            Image.MAX_IMAGE_PIXELS = self.config('max_decompressed_size')
             try:
-                image_array = skimage.io.imread(self.fetch('filename_raster'))
-                if image_array.shape == (2,):
-                    # Assume this is related to
-                    # https://github.com/scikit-image/scikit-image/issues/2154
-                    return image_array[0]
-                return image_array
-            except Image.DecompressionBombWarning:
+                pillow_img = self.fetch('pillow')
+            except DECOMPRESSION_BOMB_ERRORS:
                 logging.warn('The file "{0}" contains a lot of pixels and '
                              'can take a lot of memory when decompressed. '
                              'To allow larger images, modify the '
@@ -95,11 +355,17 @@ class ImageFile(GenericFile):
                              .format(self.fetch('filename')))
                 # Use empty array as the file cannot be read.
                 return numpy.ndarray(0)
+            # The file is opened only once with Pillow (which reads only the
+            # header) and the pixels are decoded by the best backend.
+            return decode_image(self.fetch('filename_raster'), pillow_img,
+                                self.config('decode_backends'))
         elif key == 'ndarray_grey':
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                return skimage.img_as_ubyte(
-                    skimage.color.rgb2grey(self.fetch('ndarray')))
+            return self.rgb2grey(self.fetch('ndarray'))
+        elif key == 'ndarray_luma':
+            # A uint8 greyscale image for the analyzers which do not need
+            # the colors. Formats which can decode only the luma (like
+            # JPEG) give it without decoding the colors.
+            return self.fetch('ndarray_grey')
         elif key == 'ndarray_hsv':
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
@@ -109,12 +375,466 @@ class ImageFile(GenericFile):
             if self.is_type('alpha'):
                 return self.alpha_blend(self.fetch('ndarray'))
             return self.fetch('ndarray')
+        elif key == 'filename_png':
+            # A PNG file created from the decoded image. Meant only for tools
+            # which cannot read from memory (like zxing).
+            fd, name = tempfile.mkstemp(
+                suffix=os.path.split(self.fetch('filename'))[-1] + '.png',
+                prefix='tmp_file_metadata')
+            os.close(fd)
+            Image.fromarray(self.fetch('ndarray')).save(name, format='png')
+            self.temp_filenames.add(name)
+            return name
+        elif key == 'barcode_likelihood':
+            header = self.fetch('image_header')
+            if header is None:
+                return 0.0
+            if header['frames'] != 1:
+                return 1.0  # Every page would need to be checked.
+            packed = self.fetch('packed_bits')
+            if packed is not None:
+                # Downscale without expanding the whole image.
+                factor = int(math.ceil(max(packed.shape) / 1024))
+                return self.barcode_likelihood(
+                    packed.reduce(factor).astype(numpy.uint8))
+            return self.barcode_likelihood(self.fetch('ndarray_luma'))
+        elif key == 'packed_bits':
+            header = self.fetch('image_header')
+            if (not self.config('bilevel_packed') or header is None or
+                    header['mode'] != '1' or header['frames'] != 1):
+                return None
+            # The pixels of mode "1" images are decoded with a byte each,
+            # hence they are decoded in a separate Pillow image which is
+            # closed once the bits are packed.
+            pillow_img = Image.open(self.fetch('filename_raster'))
+            try:
+                return PackedImage.from_pillow(pillow_img)
+            finally:
+                pillow_img.close()
+        elif key == 'zbar_barcodes':
+            return self._zbar_barcodes()
+        elif key == 'exif_thumbnail':
+            return self._exif_thumbnail()
+        elif key == 'exif_thumbnail_grey':
+            thumbnail = self.fetch('exif_thumbnail')
+            return None if thumbnail is None else self.rgb2grey(thumbnail)
+        elif key == 'hash_ndarray':
+            # A tiny image is enough, which is cheap to get for JPEG files.
+            image_array, _ = self.reduced_ndarray(256 * 256)
+            if image_array.ndim not in (2, 3) or image_array.size == 0:
+                return None
+            return image_array
+        elif key == 'mean_rgb':
+            image_array = self.fetch('hash_ndarray')
+            if image_array is None:
+                return None
+            if image_array.ndim == 2:
+                return (float(image_array.mean()),) * 3
+            return tuple(float(val) for val in
+                         image_array[..., :3].reshape(-1, 3).mean(axis=0))
+        elif key == 'perceptual_hash':
+            image_array = self.fetch('hash_ndarray')
+            if image_array is None:
+                return None
+            grey_array = self.rgb2grey(image_array)
+            return dhash(grey_array), phash(grey_array)
+        elif key == 'image_header':
+            try:
+                pillow_img = self.fetch('pillow')
+            except DECOMPRESSION_BOMB_ERRORS:
+                return None
+            return self.pillow_header(pillow_img)
         elif key == 'pillow':
+            Image.MAX_IMAGE_PIXELS = self.config('max_decompressed_size')
             pillow_img = Image.open(self.fetch('filename_raster'))
             self.closables.append(pillow_img)
             return pillow_img
         return super(ImageFile, self).fetch(key)
 
+    def analyze_each(self, prefix='analyze_', suffix='', methods=None,
+                     precomputed=None):
+        """
+        Run the analysis methods like ``GenericFile.analyze_each()``.
+
+        If the ``duplicate_index`` config is set, the data of the expensive
+        analyzers of a near duplicate image found in the index is reused and
+        the data of this image is added to the index (See
+        ``analyze_with_duplicates()``).
+
+        If the ``analyze_processes`` config is set, every analyzer is run in
+        a process pool. The decoded arrays are placed in shared memory once
+        and the processes use them without copying or decoding the image
+        again.
+        """
+        if self.config('duplicate_index') is not None:
+            return self.analyze_with_duplicates(prefix, suffix, methods,
+                                                precomputed)
+        return self._analyze_in_processes(prefix, suffix, methods,
+                                          precomputed)
+
+    def analyze_with_duplicates(self, prefix='analyze_', suffix='',
+                                methods=None, precomputed=None):
+        """
+        Analyze the file reusing the data of near duplicate images (Like
+        re-uploads, resized copies or re-encoded copies) from the
+        ``HashIndex`` at the path in the ``duplicate_index`` config.
+
+        The data of the methods in the ``duplicate_reuse`` config is reused
+        from the nearest image whose perceptual hash is within
+        ``duplicate_max_distance`` bits. The methods giving positions (the
+        ``duplicate_positional`` config) are reused only if the near
+        duplicate has the same size, and the methods giving colors (the
+        ``duplicate_colored`` config) only if it has similar mean colors.
+        """
+        precomputed = dict(precomputed or {})
+        hashes = self.fetch('perceptual_hash')
+        header = self.fetch('image_header')
+        if hashes is None or header is None:
+            return self._analyze_in_processes(prefix, suffix, methods,
+                                              precomputed)
+
+        reuse = self.config('duplicate_reuse')
+        positional = self.config('duplicate_positional')
+        colored = self.config('duplicate_colored')
+        size = header['width'], header['height']
+        mean_rgb = self.fetch('mean_rgb')
+        index = HashIndex(self.config('duplicate_index'))
+        try:
+            for match in index.find(hashes[1],
+                                    self.config('duplicate_max_distance')):
+                same_size = (match['width'], match['height']) == size
+                match_rgb = match['data'].get('mean_rgb')
+                same_colors = match_rgb is not None and all(
+                    abs(val1 - val2) <=
+                    self.config('duplicate_max_color_distance')
+                    for val1, val2 in zip(mean_rgb, match_rgb))
+                for method, result in match['data'].items():
+                    if (method in reuse and
+                            (same_size or method not in positional) and
+                            (same_colors or method not in colored)):
+                        precomputed.setdefault(method, result)
+
+            results = self._analyze_in_processes(prefix, suffix, methods,
+                                                 precomputed)
+            analyzed = dict((method, results[method]) for method in reuse
+                            if method in results)
+            if any(method not in precomputed for method in analyzed):
+                index.add(hashes[1], self.fetch('filename'), size[0],
+                          size[1], dict(analyzed, mean_rgb=mean_rgb))
+        finally:
+            index.close()
+        return results
+
+    def _analyze_in_processes(self, prefix='analyze_', suffix='',
+                              methods=None, precomputed=None):
+        processes = self.config('analyze_processes')
+        if processes is None or processes == 1 or not is_available():
+            return super(ImageFile, self).analyze_each(prefix, suffix, methods,
+                                                       precomputed)
+
+        precomputed = precomputed or {}
+        methods = self.analyzers(prefix, suffix, methods)
+        keys = set(key for method in methods if method not in precomputed
+                   for key in self.analyzer_arrays.get(method, ()))
+        options = dict(self.options, analyze_processes=None,
+                       attach_arrays=self.share_arrays(sorted(keys)))
+        pool = multiprocessing.Pool(processes)
+        try:
+            computed = pool.map(
+                _analyze_method,
+                [(type(self), self.filename, options, method)
+                 for method in methods if method not in precomputed])
+        finally:
+            pool.close()
+            pool.join()
+
+        computed = iter(computed)
+        return OrderedDict(
+            (method, precomputed[method] if method in precomputed
+             else next(computed))
+            for method in methods)
+
+    def share_arrays(self, keys=('ndarray', 'ndarray_grey')):
+        """
+        Copy the decoded arrays into shared memory segments which are removed
+        when the file is closed. Every array is copied only once, even if it
+        is fetched with many keys or shared many times.
+
+        :param keys: The keys of the arrays to share.
+        :return:     A dict with the key of every array and the descriptor
+                     to attach to it with (See ``attached_array()``).
+        """
+        for key in keys:
+            if key in self.shared_arrays:
+                continue
+            array = self.fetch(key)
+            # Example: 'ndarray_luma' is the 'ndarray_grey' array unless the
+            # format can decode only the luma.
+            for other, shared in self.shared_arrays.items():
+                if self.fetch(other) is array:
+                    break
+            else:
+                shared = SharedArray.create(array)
+                self.closables.append(shared)
+            self.shared_arrays[key] = shared
+        return dict((key, self.shared_arrays[key].descriptor) for key in keys)
+
+    @memoized
+    def attached_array(self, key):
+        """
+        Get an array from the shared memory created by another process using
+        the ``attach_arrays`` config.
+
+        :param key: The key of the array.
+        :return:    A read-only numpy array or None if it wasn't shared.
+        """
+        descriptors = self.config('attach_arrays')
+        if not descriptors or key not in descriptors:
+            return None
+        shared = SharedArray.attach(descriptors[key])
+        self.closables.append(shared)
+        return shared.array
+
+    def iter_pages(self):
+        """
+        Iterate over the pages (or frames) of the image lazily. Only one page
+        is decoded and kept in memory at a time, hence large multi page
+        images can be analyzed with bounded memory.
+
+        :return: A generator giving the numpy array of every page, up to the
+                 ``max_pages`` config.
+        """
+        header = self.fetch('image_header')
+        if header is None:
+            return
+        if header['frames'] == 1:
+            yield self.fetch('ndarray')
+            return
+
+        pillow_img = self.fetch('pillow')
+        try:
+            for index in range(min(header['frames'],
+                                   self.config('max_pages'))):
+                pillow_img.seek(index)
+                yield pil_frame_to_ndarray(pillow_img)
+        finally:
+            pillow_img.seek(0)
+
+    def _exif_thumbnail(self):
+        """
+        Decode the thumbnail embedded in the EXIF data of the image. This is
+        used with ``fetch('exif_thumbnail')``. As editors often do not
+        update the thumbnail, it is used only if it has the same orientation
+        and aspect ratio as the image (Thumbnails with black bars to fit a
+        160x120 box are hence not used).
+
+        :return: The numpy array of the thumbnail, or None if there is no
+                 usable thumbnail.
+        """
+        header = self.fetch('image_header')
+        if header is None or header['frames'] != 1:
+            return None
+        exif = self.fetch('pillow').info.get('exif')
+        found = exif_thumbnail(exif) if exif else None
+        if found is None:
+            return None
+        data, (orientation, thumbnail_orientation) = found
+        if thumbnail_orientation not in (None, orientation or 1):
+            return None
+
+        try:
+            thumbnail = Image.open(io.BytesIO(data))
+            thumbnail.load()
+        except (IOError, SyntaxError, ValueError):
+            return None
+        width, height = header['width'], header['height']
+        if thumbnail.width * thumbnail.height >= width * height:
+            return None
+        aspect = width / height
+        aspect_error = abs(thumbnail.width / thumbnail.height - aspect)
+        if aspect_error > aspect * self.config(
+                'exif_thumbnail_max_aspect_error'):
+            return None
+        if thumbnail.mode not in ('L', 'RGB'):
+            thumbnail = thumbnail.convert('RGB')
+        return numpy.asarray(thumbnail)
+
+    def uses_exif_thumbnail(self, analyzer):
+        """
+        Check whether an analyzer uses the EXIF thumbnail instead of the
+        image (See ``coarse_ndarray()``).
+        """
+        return (analyzer in self.config('exif_thumbnail_analyzers') and
+                self.fetch('exif_thumbnail') is not None)
+
+    def coarse_ndarray(self, analyzer, key='ndarray'):
+        """
+        Fetch the image for a coarse analyzer. If the analyzer is in the
+        ``exif_thumbnail_analyzers`` config and the image has a usable EXIF
+        thumbnail, the thumbnail is given without decoding the image.
+
+        :param analyzer: The name of the analyzer method.
+        :param key:      The key to fetch otherwise. One of 'ndarray',
+                         'ndarray_noalpha', 'ndarray_grey' or
+                         'ndarray_luma'.
+        :return:         The numpy array.
+        """
+        if self.uses_exif_thumbnail(analyzer):
+            if key in ('ndarray_grey', 'ndarray_luma'):
+                return self.fetch('exif_thumbnail_grey')
+            return self.fetch('exif_thumbnail')
+        return self.fetch(key)
+
+    def reduced_ndarray(self, max_pixels=None):
+        """
+        Get the image (without the alpha channel) downscaled to have at most
+        ``max_pixels`` pixels, keeping the aspect ratio. Animated images are
+        not downscaled.
+
+        :param max_pixels: The maximum number of pixels. None to get the
+                           full image.
+        :return:           A tuple of the numpy array and the x and y scales
+                           to multiply the coordinates in the array with to
+                           get the coordinates in the full image. The sizes
+                           are rounded down separately, hence the scales can
+                           differ slightly.
+        """
+        image_array = self.fetch('ndarray_noalpha')
+        if max_pixels is None or image_array.ndim not in (2, 3):
+            return image_array, (1.0, 1.0)
+        height, width = image_array.shape[:2]
+        size = self.reduced_size(width, height, max_pixels)
+        if size == (width, height):
+            return image_array, (1.0, 1.0)
+        reduced = Image.fromarray(image_array).resize(size, Image.BILINEAR)
+        return numpy.asarray(reduced), (width / size[0], height / size[1])
+
+    @staticmethod
+    def reduced_size(width, height, max_pixels):
+        """
+        Find the size of an image downscaled to have at most ``max_pixels``
+        pixels, keeping the aspect ratio.
+
+        :return: A tuple with the width and height.
+        """
+        if width * height <= max_pixels:
+            return width, height
+        scale = math.sqrt(width * height / max_pixels)
+        return max(1, int(width / scale)), max(1, int(height / scale))
+
+    @staticmethod
+    def rgb2grey(image_array):
+        """
+        Convert an image to a uint8 greyscale image.
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return skimage.img_as_ubyte(skimage.color.rgb2grey(image_array))
+
+    @staticmethod
+    def barcode_likelihood(grey_array, max_size=1024, block_size=16,
+                           min_coherence=0.6, min_edge_density=0.25):
+        """
+        Find a cheap score of how likely it is that an image has a barcode.
+        The image is downscaled and split into blocks. A block looks like a
+        part of a barcode if a lot of its pixels are strong edges and the
+        edges are oriented along two perpendicular directions, as is the
+        case for the bars of a barcode and the modules of QR codes or data
+        matrices (In any rotation). Natural images rarely have many such
+        blocks next to each other.
+
+        :param grey_array:       The 2 dimensional uint8 image.
+        :param max_size:         The size to downscale the image to.
+        :param block_size:       The size of the blocks in the downscaled
+                                 image.
+        :param min_coherence:    The minimum orientation coherence (0 to 1)
+                                 of a barcode-like block.
+        :param min_edge_density: The minimum fraction of edge pixels in a
+                                 barcode-like block.
+        :return: The highest fraction of barcode-like blocks in a 3x3
+                 neighbourhood of blocks (0 to 1). Images which are too small
+                 to be checked give 1.
+        """
+        if grey_array.ndim != 2:
+            return 1.0
+        height, width = grey_array.shape
+        scale = max(height, width) / max_size
+        if scale > 1:
+            size = (max(1, int(width / scale)), max(1, int(height / scale)))
+            grey_array = numpy.asarray(
+                Image.fromarray(grey_array).resize(size, Image.BILINEAR))
+        height = grey_array.shape[0] // block_size * block_size
+        width = grey_array.shape[1] // block_size * block_size
+        if height < 3 * block_size or width < 3 * block_size:
+            return 1.0
+
+        grad_y, grad_x = numpy.gradient(
+            grey_array[:height, :width].astype(numpy.float32))
+        magnitude = numpy.hypot(grad_x, grad_y)
+        angle = 4 * numpy.arctan2(grad_y, grad_x)
+
+        def block_sum(arr):
+            return arr.reshape(height // block_size, block_size,
+                               width // block_size, block_size).sum(
+                                   axis=(1, 3))
+
+        # Multiplying the angles by 4 makes the directions 90 degrees apart
+        # add up instead of cancelling each other.
+        coherence = (numpy.hypot(block_sum(magnitude * numpy.cos(angle)),
+                                 block_sum(magnitude * numpy.sin(angle))) /
+                     (block_sum(magnitude) + 1e-6))
+        edge_density = block_sum(magnitude > 24) / block_size ** 2
+        candidates = numpy.pad(
+            ((coherence > min_coherence) &
+             (edge_density > min_edge_density)).astype(numpy.float32),
+            1, mode='constant')
+        rows, cols = coherence.shape
+        density = sum(candidates[i:i + rows, j:j + cols]
+                      for i in range(3) for j in range(3)) / 9
+        return float(density.max())
+
+    def has_barcode_likelihood(self, key='barcode_min_likelihood'):
+        """
+        Check whether the barcode likelihood of the image is at least the
+        value of the given config. The likelihood isn't computed if the
+        config is None.
+        """
+        min_likelihood = self.config(key)
+        return (min_likelihood is None or
+                self.fetch('barcode_likelihood') >= min_likelihood)
+
+    @staticmethod
+    def pillow_header(pillow_img):
+        """
+        Find the basic information about an image from a Pillow image. Pillow
+        reads only the header of the file when opening it, hence, this does
+        not decode the pixels of the image.
+
+        :param pillow_img: The Pillow image to read the information from.
+        :return: dict with the keys:
+
+             - width - The width of the image in pixels.
+             - height - The height of the image in pixels.
+             - mode - The Pillow mode of the image. Example: RGB, RGBA, P.
+             - bit_depth - The number of bits used for each channel.
+             - frames - The number of frames (or pages) in the image.
+             - palette - True if the image uses a color palette.
+        """
+        width, height = pillow_img.size
+        mode = pillow_img.mode
+        if mode == '1':
+            bit_depth = 1
+        elif mode in ('I', 'F'):
+            bit_depth = 32
+        elif mode.startswith('I;16'):
+            bit_depth = 16
+        else:
+            bit_depth = 8
+        return {'width': width, 'height': height, 'mode': mode,
+                'bit_depth': bit_depth,
+                'frames': getattr(pillow_img, 'n_frames', 1),
+                'palette': mode in ('P', 'PA')}
+
     @staticmethod
     def alpha_blend(img, background=255):
         """
@@ -135,6 +855,23 @@ class ImageFile(GenericFile):
                 a_min=0, a_max=255)
         return new_img
 
+    def analyze_perceptual_hash(self):
+        """
+        Find the perceptual hashes of the image. Near duplicates of the image
+        (Like resized or re-encoded copies) have hashes which differ in a few
+        bits only.
+
+        :return: dict with the keys:
+
+             - Hash:DHash - The difference hash as a hex string.
+             - Hash:PHash - The DCT based perceptual hash as a hex string.
+        """
+        hashes = self.fetch('perceptual_hash')
+        if hashes is None:
+            return {}
+        return {'Hash:DHash': '{0:016x}'.format(hashes[0]),
+                'Hash:PHash': '{0:016x}'.format(hashes[1])}
+
     def analyze_geolocation(self, use_nominatim=True):
         """
         Find the location where the photo was taken initially. This is
@@ -147,7 +884,7 @@ class ImageFile(GenericFile):
              - Composite:Country - The country the photo was taken.
              - Composite:City - The city the photo was taken.
         """
-        exif = self.exiftool()
+        exif = self.exiftool(tags=('EXIF:GPS*', 'XMP:GPS*'))
         data = {}
 
         def dms2dec(dms_str, sign=None):
@@ -218,8 +955,9 @@ class ImageFile(GenericFile):
         """
         Find whether there is a color calibration strip on top of the image.
         """
+        # The thresholds for the spikes are for the weights of rgb2grey,
+        # and the luma of JPEGs has different weights for strong colors.
         grey_array = self.fetch('ndarray_grey')
-        image_array = self.fetch('ndarray')
         if grey_array is None:
             return {}
 
@@ -251,6 +989,10 @@ class ImageFile(GenericFile):
         # Hence, we set a smaller threshold for peaks in bottom bars.
         bot_spikes = _merge_near((numpy.diff(botbar)) > -2.5).sum()
         top_spikes = _merge_near((numpy.diff(topbar)) < 3).sum()
+        if not (15 < top_spikes < 25 or 15 < bot_spikes < 25):
+            return {}
+
+        image_array = self.fetch('ndarray')
         top_grey_mse, bot_grey_mse = 0, 0
         if image_array.ndim == 3:
             for chan in range(image_array.shape[2]):
@@ -277,7 +1019,12 @@ class ImageFile(GenericFile):
         """
         Find whether the given image is a stereo card or not.
         """
-        image_array = self.fetch('ndarray_grey')
+        packed = self.fetch('packed_bits')
+        if (packed is not None and
+                not self.uses_exif_thumbnail('analyze_stereo_card')):
+            return self._bilevel_stereo_card(packed)
+        image_array = self.coarse_ndarray('analyze_stereo_card',
+                                          'ndarray_grey')
         if image_array is None:
             return {}
 
@@ -299,6 +1046,29 @@ class ImageFile(GenericFile):
         return {'Misc:StereoCardMSE': mean_square_err,
                 'Misc:StereoCardHistogramMSE': histogram_mse}
 
+    @staticmethod
+    def _bilevel_stereo_card(packed):
+        """
+        Find the same data as ``analyze_stereo_card()`` for a bilevel image
+        from its packed bits. In the uint8 arithmetic used there, the square
+        error of two pixels is 1 if they differ and 0 otherwise, so the mean
+        square error is the popcount of the XOR of the halves.
+        """
+        h, w = packed.shape
+        rows = slice(int(0.1 * h), int(0.9 * h))
+        start, stop = int(0.1 * w), int(0.9 * w)
+        width = max(0, stop - start)
+        left = packed.columns(start, start + width // 2, rows)
+        right = packed.columns(start + width // 2 + (width % 2), stop, rows)
+        size = numpy.float64(left.shape[0] * (width // 2))
+        mean_square_err = popcount(left ^ right) / size
+        # The histograms have only the black (0) and white (254 to 255)
+        # bins, which differ by the same amount.
+        white_diff = popcount(left) - popcount(right)
+        histogram_mse = 2 * white_diff ** 2 / 255 / size
+        return {'Misc:StereoCardMSE': mean_square_err,
+                'Misc:StereoCardHistogramMSE': histogram_mse}
+
     def analyze_color_info(self,
                            grey_shade_threshold=0.05,
                            freq_colors_threshold=0.1,
@@ -336,7 +1106,22 @@ class ImageFile(GenericFile):
              - Color:UsesAlpha - True if the alpha channel is present and being
                 used.
         """
-        image_array = self.fetch('ndarray_noalpha')
+        header = self.fetch('image_header')
+        if (header is not None and header['mode'] == 'P' and
+                header['frames'] == 1 and
+                not self.uses_exif_thumbnail('analyze_color_info')):
+            return self._palette_color_info(grey_shade_threshold,
+                                            freq_colors_threshold,
+                                            edge_ratio_gaussian_sigma)
+        packed = self.fetch('packed_bits')
+        if (packed is not None and
+                not self.uses_exif_thumbnail('analyze_color_info')):
+            return self._bilevel_color_info(packed, grey_shade_threshold,
+                                            freq_colors_threshold,
+                                            edge_ratio_gaussian_sigma)
+
+        image_array = self.coarse_ndarray('analyze_color_info',
+                                          'ndarray_noalpha')
         if image_array.ndim == 4:  # Animated images
             mean_color = image_array.mean(axis=(0, 1, 2))
         elif image_array.ndim == 3 and image_array.shape[2] == 3:  # Static
@@ -353,26 +1138,16 @@ class ImageFile(GenericFile):
             return {}
 
         # Find the mean color and the closest color in the known palette
-        closest_label, closest_color = PantonePaint().find_closest(mean_color)
+        closest_label, closest_color = closest_pantone_colors([mean_color])[0]
 
-        grey_array = self.fetch('ndarray_grey')
+        grey_array = self.coarse_ndarray('analyze_color_info', 'ndarray_grey')
 
         def _full_histogram(img):
             return numpy.histogram(img, bins=range(256))[0]
 
         if image_array.ndim == 3 or image_array.ndim == 2:
-            # Find the edge ratio by applying the canny filter and finding
-            # bright spots. Not applicable to animated images.
-            scale = max(1.0, numpy.average(image_array.shape[:2]) / 500.0)
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                img_shape = map(lambda x: int(x / scale), grey_array.shape[:2])
-                grey_img = skimage.transform.resize(grey_array,
-                                                    output_shape=img_shape,
-                                                    preserve_range=True)
-            edge_img = skimage.feature.canny(grey_img,
-                                             sigma=edge_ratio_gaussian_sigma)
-            edge_ratio = (edge_img > 0).mean()
+            # Not applicable to animated images.
+            edge_ratio = self.edge_ratio(grey_array, edge_ratio_gaussian_sigma)
 
             # Find the number of grey shades in the imag eusing the histogram.
             grey_hist = _full_histogram(grey_array)
@@ -416,10 +1191,10 @@ class ImageFile(GenericFile):
             blackwhite_mean_square_err /= image_array.shape[2]
 
         uses_alpha = None
-        nd_array = self.fetch('ndarray')
-        if (self.is_type('alpha') and nd_array.ndim == 3 and
-                nd_array.shape[2] == 4):
-            uses_alpha = (nd_array[:, :, 3] < 255).any()
+        if self.is_type('alpha'):
+            nd_array = self.fetch('ndarray')
+            if nd_array.ndim == 3 and nd_array.shape[2] == 4:
+                uses_alpha = (nd_array[:, :, 3] < 255).any()
 
         return DictNoNone({
             'Color:ClosestLabeledColorRGB': closest_color,
@@ -431,6 +1206,343 @@ class ImageFile(GenericFile):
             'Color:MeanSquareErrorFromGrey': blackwhite_mean_square_err,
             'Color:UsesAlpha': uses_alpha})
 
+    def _palette_color_info(self, grey_shade_threshold=0.05,
+                            freq_colors_threshold=0.1,
+                            edge_ratio_gaussian_sigma=1):
+        """
+        Find the same data as ``analyze_color_info()`` for a single frame
+        "P" mode image without converting it to RGB. The number of pixels
+        using every palette entry is counted once and the statistics are
+        found from the palette entries weighted by these counts. Only the
+        greyscale image needed for the edge ratio is created.
+        """
+        pillow_img = self.fetch('pillow')
+        indices = numpy.asarray(pillow_img)
+        counts = numpy.bincount(indices.ravel(), minlength=256)[:256]
+        num_pixels = indices.size
+
+        palette = palette_to_ndarray(pillow_img)
+        # The palette is converted like an image with one row of pixels, so
+        # that the arithmetic is the same as for the decoded image.
+        grey_palette = self.rgb2grey(palette[None])[0]
+        if palette.ndim == 2 and palette.shape[1] == 4:
+            colors = self.alpha_blend(palette)
+        else:
+            colors = palette
+
+        def _full_histogram(values):
+            # Same as numpy.histogram(img, bins=range(256)) of the image.
+            hist = numpy.bincount(values, weights=counts,
+                                  minlength=256).astype(numpy.int64)
+            hist[254] += hist[255]
+            return hist[:255]
+
+        if colors.ndim == 2:
+            mean_color = counts.dot(colors) / num_pixels
+            hist = numpy.concatenate([_full_histogram(colors[:, chan])
+                                      for chan in range(3)])
+            # The uint8 arithmetic is the same as in analyze_color_info()
+            blackwhite_mean_square_err = sum(
+                counts.dot((colors[:, chan] - grey_palette) ** 2)
+                for chan in range(3)) / num_pixels / 3
+        else:
+            avg = counts.dot(colors) / num_pixels
+            mean_color = (avg, avg, avg)
+            hist = _full_histogram(colors)
+            blackwhite_mean_square_err = 0
+
+        closest_label, closest_color = closest_pantone_colors([mean_color])[0]
+
+        grey_hist = _full_histogram(grey_palette)
+        num_grey_shades = (
+            grey_hist > grey_shade_threshold * grey_hist.max()).sum()
+        peaks_percent = (hist > freq_colors_threshold * hist.max()).mean()
+
+        uses_alpha = None
+        if palette.ndim == 2 and palette.shape[1] == 4:
+            uses_alpha = (counts[palette[:, 3] < 255] > 0).any()
+
+        return DictNoNone({
+            'Color:ClosestLabeledColorRGB': closest_color,
+            'Color:ClosestLabeledColor': closest_label,
+            'Color:AverageRGB': tuple(round(i, 3) for i in mean_color),
+            'Color:NumberOfGreyShades': num_grey_shades,
+            'Color:PercentFrequentColors': peaks_percent,
+            'Color:EdgeRatio': self.edge_ratio(grey_palette[indices],
+                                               edge_ratio_gaussian_sigma),
+            'Color:MeanSquareErrorFromGrey': blackwhite_mean_square_err,
+            'Color:UsesAlpha': uses_alpha})
+
+    @classmethod
+    def _bilevel_color_info(cls, packed, grey_shade_threshold=0.05,
+                            freq_colors_threshold=0.1,
+                            edge_ratio_gaussian_sigma=1):
+        """
+        Find the same data as ``analyze_color_info()`` for a bilevel image
+        from its packed bits. The image only has the greys 0 and 255, hence
+        all the histograms are found from the number of white pixels.
+        """
+        num_white = packed.count()
+        avg = 255.0 * num_white / packed.size
+        mean_color = (avg, avg, avg)
+        closest_label, closest_color = closest_pantone_colors([mean_color])[0]
+
+        # Same as numpy.histogram(img, bins=range(256)) of the image.
+        hist = numpy.zeros(255, dtype=numpy.int64)
+        hist[0], hist[254] = packed.size - num_white, num_white
+        num_grey_shades = (hist > grey_shade_threshold * hist.max()).sum()
+        peaks_percent = (hist > freq_colors_threshold * hist.max()).mean()
+
+        return DictNoNone({
+            'Color:ClosestLabeledColorRGB': closest_color,
+            'Color:ClosestLabeledColor': closest_label,
+            'Color:AverageRGB': tuple(round(i, 3) for i in mean_color),
+            'Color:NumberOfGreyShades': num_grey_shades,
+            'Color:PercentFrequentColors': peaks_percent,
+            'Color:EdgeRatio': cls.bilevel_edge_ratio(
+                packed, edge_ratio_gaussian_sigma),
+            'Color:MeanSquareErrorFromGrey': 0})
+
+    @classmethod
+    def bilevel_edge_ratio(cls, packed, sigma=1):
+        """
+        Find the edge ratio (See ``edge_ratio()``) of a ``PackedImage``. The
+        image is downscaled by averaging blocks of pixels, so that only a
+        few rows are expanded at a time.
+        """
+        factor = int(max(1.0, numpy.average(packed.shape) / 500.0))
+        if factor == 1:
+            return cls.edge_ratio(numpy.asarray(packed), sigma)
+        edge_img = skimage.feature.canny(packed.reduce(factor), sigma=sigma)
+        return (edge_img > 0).mean()
+
+    def face_detector_needed(self, detector):
+        """
+        Check whether a face detector needs to be run based on the
+        ``face_detection_strategy`` config. The first detector of the
+        strategy is always run. The second one is run only if:
+
+         - No faces were found and the image looks like a photograph (It has
+           many grey shades).
+         - A face found by dlib has a low score or looks like a profile
+           face (Found by the left or right looking sub detectors of dlib).
+         - A face found by haarcascades has a few facial features only.
+
+        :param detector: The detector - 'dlib' or 'haar'.
+        :return:         Boolean corresponding to whether the detector
+                         should be run.
+        """
+        strategy = self.config('face_detection_strategy')
+        if strategy == 'all' or strategy == detector + '_first':
+            return True
+
+        if detector == 'haar':
+            faces, orient_ids = self._dlib_faces(True, 0)
+            if (any(face['score'] < self.config('face_min_dlib_score')
+                    for face in faces) or
+                    any(orient in (1, 2) for orient in orient_ids)):
+                return True
+        else:
+            faces = self._haar_faces()
+            feats = ('eyes', 'ears', 'nose', 'mouth', 'glasses')
+            if any(sum(feat in face for feat in feats) <
+                   self.config('face_min_haar_features') for face in faces):
+                return True
+
+        if len(faces) == 0:
+            grey_hist = numpy.bincount(
+                self.fetch('ndarray_luma').ravel(), minlength=256)
+            num_grey_shades = (grey_hist > 0.05 * grey_hist.max()).sum()
+            return num_grey_shades >= self.config('face_photo_min_grey_shades')
+        return False
+
+    def _same_face(self, face1, face2):
+        """
+        Check whether two faces are the same using the ``face_max_overlap``
+        config.
+        """
+        return (box_overlap(face1['position'], face2['position']) >
+                self.config('face_max_overlap'))
+
+    def drop_duplicate_faces(self, detector, faces):
+        """
+        Drop the faces which were already found by the first detector of
+        the ``face_detection_strategy`` config.
+
+        :param detector: The detector which found the faces - 'dlib' or
+                         'haar'.
+        :param faces:    The list of faces found.
+        :return:         The list of faces which were not found by the
+                         first detector.
+        """
+        strategy = self.config('face_detection_strategy')
+        if strategy == 'all' or strategy == detector + '_first':
+            return faces
+        if detector == 'haar':
+            found, _ = self._dlib_faces(True, 0)
+        else:
+            found = self._haar_faces()
+
+        return [face for face in faces
+                if not any(self._same_face(face, other) for other in found)]
+
+    @staticmethod
+    def edge_ratio(grey_array, sigma=1):
+        """
+        Find the edge ratio by applying the canny filter and finding bright
+        spots. Large images are downscaled first.
+
+        :param grey_array: The 2 dimensional greyscale image.
+        :param sigma:      The sigma to use in gaussian blurring in Canny
+                           edge detection.
+        :return:           The ratio of pixels which are edges.
+        """
+        scale = max(1.0, numpy.average(grey_array.shape[:2]) / 500.0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            img_shape = map(lambda x: int(x / scale), grey_array.shape[:2])
+            grey_img = skimage.transform.resize(grey_array,
+                                                output_shape=img_shape,
+                                                preserve_range=True)
+        edge_img = skimage.feature.canny(grey_img, sigma=sigma)
+        return (edge_img > 0).mean()
+
+    @classmethod
+    def color_info_batch(cls, files,
+                         grey_shade_threshold=0.05,
+                         freq_colors_threshold=0.1,
+                         edge_ratio_gaussian_sigma=1):
+        """
+        Find the data of ``analyze_color_info()`` for many images at once. The
+        images are stacked into one array and the statistics are computed
+        for all of them together, which is much faster for tiny images.
+
+        :param files: A list of ``ImageFile`` objects having single frame
+                      uint8 greyscale or RGB images of the same shape (See
+                      ``batch_key()``).
+        :return:      A list with the data of ``analyze_color_info()`` for
+                      every file.
+        """
+        images = numpy.array([_file.fetch('ndarray_noalpha')
+                              for _file in files])
+        greys = numpy.array([_file.fetch('ndarray_grey') for _file in files])
+        num = len(files)
+
+        if images.ndim == 4:
+            mean_colors = images.mean(axis=(1, 2))
+        else:
+            mean_colors = numpy.repeat(images.mean(axis=(1, 2))[:, None],
+                                       3, axis=1)
+        closest = closest_pantone_colors(mean_colors)
+
+        def _full_histograms(imgs):
+            # Same as numpy.histogram(img, bins=range(256)) for every image,
+            # where the last bin has the values 254 and 255.
+            offsets = 256 * numpy.arange(num)[:, None]
+            counts = numpy.bincount(
+                (imgs.reshape((num, -1)) + offsets).ravel(),
+                minlength=256 * num).reshape((num, 256))
+            hists = counts[:, :255].copy()
+            hists[:, 254] += counts[:, 255]
+            return hists
+
+        grey_hists = _full_histograms(greys)
+        num_grey_shades = (grey_hists > grey_shade_threshold *
+                           grey_hists.max(axis=1)[:, None]).sum(axis=1)
+
+        if images.ndim == 4:
+            hists = numpy.concatenate([_full_histograms(images[..., chan])
+                                       for chan in range(3)], axis=1)
+            # The uint8 arithmetic is the same as in analyze_color_info()
+            square_err = (images - greys[..., None]) ** 2
+            blackwhite_mean_square_errs = square_err.reshape(
+                (num, -1, 3)).mean(axis=1).sum(axis=1) / 3
+        else:
+            hists = _full_histograms(images)
+            blackwhite_mean_square_errs = numpy.zeros(num)
+        peaks_percents = (hists > freq_colors_threshold *
+                          hists.max(axis=1)[:, None]).mean(axis=1)
+
+        data = []
+        for i, _file in enumerate(files):
+            uses_alpha = None
+            nd_array = _file.fetch('ndarray')
+            if (_file.is_type('alpha') and nd_array.ndim == 3 and
+                    nd_array.shape[2] == 4):
+                uses_alpha = (nd_array[:, :, 3] < 255).any()
+            data.append(DictNoNone({
+                'Color:ClosestLabeledColorRGB': closest[i][1],
+                'Color:ClosestLabeledColor': closest[i][0],
+                'Color:AverageRGB': tuple(round(val, 3)
+                                          for val in mean_colors[i]),
+                'Color:NumberOfGreyShades': num_grey_shades[i],
+                'Color:PercentFrequentColors': peaks_percents[i],
+                'Color:EdgeRatio': cls.edge_ratio(greys[i],
+                                                  edge_ratio_gaussian_sigma),
+                'Color:MeanSquareErrorFromGrey':
+                    blackwhite_mean_square_errs[i],
+                'Color:UsesAlpha': uses_alpha}))
+        return data
+
+    def batch_key(self):
+        """
+        The key used to group tiny images which can be analyzed together by
+        ``color_info_batch()``.
+
+        :return: The shape of the image or None if the image is not a tiny
+                 single frame uint8 greyscale or RGB image.
+        """
+        header = self.fetch('image_header')
+        max_size = self.config('batch_max_size')
+        if (header is None or header['frames'] != 1 or
+                max(header['width'], header['height']) > max_size):
+            return None
+        image_array = self.fetch('ndarray_noalpha')
+        if (image_array.dtype != numpy.uint8 or
+                self.fetch('ndarray_grey').dtype != numpy.uint8 or
+                not (image_array.ndim == 2 or (image_array.ndim == 3 and
+                                               image_array.shape[2] == 3))):
+            return None
+        return image_array.shape
+
+    @classmethod
+    def analyze_batch(cls, files, skip_errors=False):
+        """
+        Analyze a list of image files like ``GenericFile.analyze_batch()``.
+        The colors of tiny images of the same shape are analyzed together
+        with ``color_info_batch()``. With ``skip_errors``, the files of a
+        group whose colors cannot be analyzed together are analyzed alone.
+        """
+        groups = OrderedDict()
+        for _file in files:
+            try:
+                key = _file.batch_key()
+            except Exception as err:
+                if not skip_errors:
+                    raise
+                logging.exception(err)
+                key = None
+            if key is not None:
+                groups.setdefault(key, []).append(_file)
+
+        precomputed = {}
+        for group in groups.values():
+            if len(group) < 2:
+                continue
+            try:
+                colors = cls.color_info_batch(group)
+            except Exception as err:
+                if not skip_errors:
+                    raise
+                logging.exception(err)
+                continue
+            for _file, data in zip(group, colors):
+                precomputed[id(_file)] = {'analyze_color_info': data}
+
+        return [cls._analyze_and_close(_file, skip_errors,
+                                       precomputed.get(id(_file)))
+                for _file in files]
+
     @staticmethod
     def _haarcascade(image, filename, directory=None, **kwargs):
         """
@@ -474,6 +1586,24 @@ class ImageFile(GenericFile):
         """
         Use opencv's haar cascade filters to identify faces, right eye, left
         eye, upper body, etc..
+
+        This may be skipped depending on the ``face_detection_strategy``
+        config (See ``face_detector_needed()``).
+        """
+        if not self.face_detector_needed('haar'):
+            return {}
+        faces = self.drop_duplicate_faces('haar', self._haar_faces())
+        if len(faces) == 0:
+            return {}
+        return {'OpenCV:Faces': faces}
+
+    @memoized
+    def _haar_faces(self):
+        """
+        Find the faces with opencv's haar cascade filters. This is used by
+        ``analyze_face_haarcascades``.
+
+        :return: A list of faces.
         """
         try:
             import cv2  # noqa (unused import)
@@ -481,13 +1611,13 @@ class ImageFile(GenericFile):
         except ImportError:
             logging.warn('HAAR Cascade analysis requires the optional '
                          'dependency OpenCV 2.x to be installed.')
-            return {}
+            return []
 
-        image_array = self.fetch('ndarray_grey')
+        image_array = self.fetch('ndarray_luma')
         if image_array.ndim == 3:
             logging.warn('Faces cannot be detected in animated images '
                          'using haarcascades yet.')
-            return {}
+            return []
 
         # The "scale" given here is relevant for the detection rate.
         scale = max(1.0, numpy.average(image_array.shape) / 500.0)
@@ -543,12 +1673,28 @@ class ImageFile(GenericFile):
                 if i not in drop:
                     yield reg
 
-        frontal = haar(img, 'frontal_face')
-        profile = haar(img, 'profile_face')
+        def haar_tiled(key):
+            def detect(tile):
+                return [{'position': {'left': x, 'top': y,
+                                      'width': w, 'height': h}}
+                        for x, y, w, h in haar(
+                            numpy.ascontiguousarray(tile), key)]
+
+            found = detect_tiled(
+                img, detect, tile_size=self.config('haar_tile_size'),
+                overlap=self.config('haar_tile_overlap'),
+                threads=self.config('tile_threads'), box_key='position',
+                is_duplicate=self._same_face)
+            return [[face['position'][corner]
+                     for corner in ('left', 'top', 'width', 'height')]
+                    for face in found]
+
+        frontal = haar_tiled('frontal_face')
+        profile = haar_tiled('profile_face')
         faces = list(drop_overlapping_regions(frontal + profile))
 
         if len(faces) == 0:
-            return {}
+            return []
 
         data = []
         for face in faces:
@@ -608,7 +1754,7 @@ class ImageFile(GenericFile):
                 fdata['mouth'] = feat_mid(mouth_feats[0], 0, mouth_offy)
 
             data.append(fdata)
-        return {'OpenCV:Faces': data}
+        return data
 
     def analyze_facial_landmarks(self,
                                  with_landmarks=True,
@@ -618,6 +1764,10 @@ class ImageFile(GenericFile):
 
         Note: It works only for frontal faces, not for profile faces, etc.
 
+        The faces are detected in a downscaled image if the
+        ``face_detection_max_pixels`` config is set. The positions are
+        always given in the coordinates of the full image.
+
         :param with_landmarks:
             Whether to detect the facial landmarks or not. This also computes
             the location of the other facial features like the nose, mouth,
@@ -637,13 +1787,36 @@ class ImageFile(GenericFile):
                 - left eye - Location of the center of the left eye.
                 - right eye - Location of the center of the right eye.
                 - mouth - Location of the center of the mouth.
+
+        This may be skipped depending on the ``face_detection_strategy``
+        config (See ``face_detector_needed()``).
         """
-        image_array = self.fetch('ndarray_noalpha')
+        if not self.face_detector_needed('dlib'):
+            return {}
+        faces, _ = self._dlib_faces(with_landmarks,
+                                    detector_upsample_num_times)
+        faces = self.drop_duplicate_faces('dlib', faces)
+        if len(faces) == 0:
+            return {}
+        return {'dlib:Faces': faces}
+
+    @memoized
+    def _dlib_faces(self, with_landmarks=True, detector_upsample_num_times=0):
+        """
+        Find the faces with ``dlib``. This is used by
+        ``analyze_facial_landmarks``.
+
+        :return: A tuple with the list of faces and the list of the
+                 orientation (the sub detector of dlib which found the face)
+                 of every face.
+        """
+        image_array, (scalex, scaley) = self.reduced_ndarray(
+            self.config('face_detection_max_pixels'))
         if (image_array.ndim == 4 or
                 (image_array.ndim == 3 and image_array.shape[2] != 3)):
             logging.warn('Facial landmarks of animated images cannot be '
                          'detected yet.')
-            return {}
+            return [], []
 
         predictor_dat = 'shape_predictor_68_face_landmarks.dat'
         predictor_arch = predictor_dat + '.bz2'
@@ -658,38 +1831,81 @@ class ImageFile(GenericFile):
             download(url.format(predictor_arch), arch_path)
             bz2_decompress(arch_path, dat_path)
 
-        detector = dlib.get_frontal_face_detector()
-
-        # TODO: Get orientation data from ``orient_id`` and use it.
-        faces, scores, orient_id = detector.run(
-            image_array,
-            upsample_num_times=detector_upsample_num_times)
-
-        if len(faces) == 0:
-            return {}
-
+        def detect(tile):
+            # Every tile has its own detector as tiles run in parallel.
+            detector = dlib.get_frontal_face_detector()
+            rects, scores, orients = detector.run(
+                numpy.ascontiguousarray(tile),
+                upsample_num_times=detector_upsample_num_times)
+            return [{'position': {'left': rect.left(), 'top': rect.top(),
+                                  'width': rect.width(),
+                                  'height': rect.height()},
+                     'score': score, 'orient': orient}
+                    for rect, score, orient in zip(rects, scores, orients)]
+
+        found = detect_tiled(
+            image_array, detect,
+            tile_size=self.config('dlib_tile_size'),
+            overlap=self.config('dlib_tile_overlap'),
+            threads=self.config('tile_threads'), box_key='position',
+            is_duplicate=self._same_face, rank=lambda face: face['score'])
+        if len(found) == 0:
+            return [], []
+
+        faces = [dlib.rectangle(pos['left'], pos['top'],
+                                pos['left'] + pos['width'] - 1,
+                                pos['top'] + pos['height'] - 1)
+                 for pos in (face['position'] for face in found)]
+        scores = [face['score'] for face in found]
+        orient_ids = [face['orient'] for face in found]
+
+        full_resolution = (with_landmarks and (scalex, scaley) != (1, 1) and
+                           self.config('face_landmarks_full_resolution'))
         if with_landmarks:
             predictor = dlib.shape_predictor(to_cstr(dat_path))
+        if full_resolution:
+            full_array = self.fetch('ndarray_noalpha')
 
         data = []
         for face, score in zip(faces, scores):
+            left, top = face.left() * scalex, face.top() * scaley
+            right = (face.right() + 1) * scalex - 1
+            bottom = (face.bottom() + 1) * scaley - 1
             fdata = {
-                'position': {'left': face.left(),
-                             'top': face.top(),
-                             'width': face.right() - face.left() + 1,
-                             'height': face.bottom() - face.top() + 1},
+                'position': {'left': int(round(left)),
+                             'top': int(round(top)),
+                             'width': int(round(right - left + 1)),
+                             'height': int(round(bottom - top + 1))},
                 'score': score}
 
             # dlib's shape detector uses the ibug dataset to detect shape.
             # More info at: http://ibug.doc.ic.ac.uk/resources/300-W/
             if with_landmarks:
-                shape = predictor(image_array, face)
+                if full_resolution:
+                    # Use a crop around the face in the full image so that
+                    # the landmarks are as accurate as without downscaling.
+                    margin = int((right - left) / 4)
+                    offx = max(0, int(left) - margin)
+                    offy = max(0, int(top) - margin)
+                    crop = full_array[offy:int(bottom) + margin + 1,
+                                      offx:int(right) + margin + 1]
+                    shape = predictor(
+                        numpy.ascontiguousarray(crop),
+                        dlib.rectangle(int(left) - offx, int(top) - offy,
+                                       int(right) - offx, int(bottom) - offy))
+                    pscalex, pscaley = 1, 1
+                else:
+                    shape = predictor(image_array, face)
+                    offx, offy = 0, 0
+                    pscalex, pscaley = scalex, scaley
 
                 def tup(point):
-                    return point.x, point.y
+                    return (int(offx + point.x * pscalex),
+                            int(offy + point.y * pscaley))
 
                 def tup2(pt1, pt2):
-                    return int((pt1.x + pt2.x) / 2), int((pt1.y + pt2.y) / 2)
+                    return (int(offx + (pt1.x + pt2.x) / 2 * pscalex),
+                            int(offy + (pt1.y + pt2.y) / 2 * pscaley))
 
                 # Point 34 is the tip of the nose
                 fdata['nose'] = tup(shape.part(34))
@@ -701,7 +1917,7 @@ class ImageFile(GenericFile):
                 fdata['mouth'] = tup2(shape.part(49), shape.part(55))
             data.append(fdata)
 
-        return {'dlib:Faces': data}
+        return data, list(orient_ids)
 
     def analyze_barcode_zxing(self):
         """
@@ -719,17 +1935,22 @@ class ImageFile(GenericFile):
                 - points - The detection points of the barcode (4 points for
                     QR codes and Data matrices and 2 points for barcodes).
         """
-        image_array = self.fetch('ndarray')
-        if all(map(lambda x: x < 4, image_array.shape)):
+        header = self.fetch('image_header')
+        if header is None or (header['width'] < 4 and header['height'] < 4):
             # If the file is less than 4 pixels, it won't contain a barcode.
             # Small files cause zxing to crash so, we just return empty.
             return {}
-        if (image_array.ndim == 4 or
-                (image_array.ndim == 3 and
-                 image_array.shape[2] not in (3, 4))):
+        if header['frames'] != 1:
             logging.warn('Barcode analysis with zxing of animated images '
                          'or multi page images is not supported yet.')
             return {}
+        if not self.has_barcode_likelihood():
+            return {}
+        if self.config('barcode_cascade') and (
+                self.fetch('zbar_barcodes') or
+                not self.has_barcode_likelihood(
+                    'barcode_zxing_min_likelihood')):
+            return {}
 
         filename = self.fetch('filename_zxing')
         if filename is None:
@@ -803,18 +2024,91 @@ class ImageFile(GenericFile):
                 - bounding box - A dictionary with left, width, top, height.
                 - confidence - The quality of the barcode. The higher it is
                     the more accurate the detection is.
+                - page - The page the barcode was found in (Only for multi
+                    page images).
         """
-        image_array = self.fetch('ndarray_grey')
-        if image_array.ndim == 3:
-            logging.warn('Barcodes cannot be detected in animated images '
-                         'using zbar.')
+        barcodes = self.fetch('zbar_barcodes')
+        if not barcodes:
             return {}
+        return {'zbar:Barcodes': barcodes}
+
+    def _zbar_barcodes(self):
+        """
+        Find the barcodes of all pages of the image with ``zbar``. This is
+        used with ``fetch('zbar_barcodes')`` so that the result is shared
+        by ``analyze_barcode_zbar`` and the zbar-zxing cascade.
+
+        :return: A list of barcodes found.
+        """
+        header = self.fetch('image_header')
+        if header is None or not self.has_barcode_likelihood():
+            return []
+        packed = self.fetch('packed_bits')
+        if packed is not None:
+            # Only the tiles scanned are expanded to uint8 (See the
+            # ``zbar_tile_size`` config).
+            pages = [packed]
+        elif header['frames'] == 1:
+            pages = [self.fetch('ndarray_luma')]
+        else:
+            # Scan every page of multi page images (Like TIFF scans) one at
+            # a time to keep the memory usage bounded.
+            pages = (self.rgb2grey(page) for page in self.iter_pages())
+
+        barcodes = []
+        for index, image_array in enumerate(pages):
+            if image_array.ndim != 2:
+                logging.warn('Barcodes cannot be detected in animated images '
+                             'using zbar.')
+                return []
+            for barcode in self._zbar_scan_tiled(image_array):
+                if header['frames'] != 1:
+                    barcode['page'] = index
+                barcodes.append(barcode)
+        return barcodes
+
+    def _zbar_scan_tiled(self, image_array):
+        """
+        Scan a greyscale image for barcodes with ``zbar``. If the image is
+        larger than the ``zbar_tile_size`` config, it is split into
+        overlapping tiles which are scanned in parallel threads. Barcodes
+        found multiple times in the overlapping regions are merged.
+
+        :param image_array: The 2 dimensional uint8 image to scan.
+        :return:            A list of barcodes found.
+        """
+        def is_duplicate(bar1, bar2):
+            return (bar1['data'] == bar2['data'] and
+                    bar1['format'] == bar2['format'] and
+                    boxes_touch(bar1['bounding box'], bar2['bounding box']))
+
+        return detect_tiled(image_array, self._zbar_scan,
+                            tile_size=self.config('zbar_tile_size'),
+                            overlap=self.config('zbar_tile_overlap'),
+                            threads=self.config('tile_threads'),
+                            is_duplicate=is_duplicate,
+                            rank=lambda bar: bar['confidence'])
+
+    @staticmethod
+    def _zbar_scan(image_array):
+        """
+        Scan a greyscale image for barcodes with ``zbar``. The scanner of
+        the current thread is reused and the image's buffer is given to zbar
+        without copying it when possible.
+
+        :param image_array: The 2 dimensional uint8 image to scan.
+        :return:            A list of barcodes found.
+        """
         height, width = image_array.shape
-        zbar_img = zbar.Image(width, height, 'Y800', image_array.tobytes())
-        scanner = zbar.ImageScanner()
-        scanner.parse_config('enable')
-        if scanner.scan(zbar_img) == 0:
-            return {}
+        image_array = numpy.ascontiguousarray(image_array)
+        try:
+            zbar_img = zbar.Image(width, height, 'Y800',
+                                  memoryview(image_array))
+        except TypeError:  # Some versions of zbar accept only bytes
+            zbar_img = zbar.Image(width, height, 'Y800',
+                                  image_array.tobytes())
+        if zbar_scanner().scan(zbar_img) == 0:
+            return []
 
         barcodes = []
         for barcode in zbar_img:
@@ -826,4 +2120,4 @@ class ImageFile(GenericFile):
                              'bounding box': bbox,
                              'confidence': barcode.quality,
                              'format': str(barcode.type)})
-        return {'zbar:Barcodes': barcodes}
+        return barcodes
@@ -6,14 +6,27 @@ from __future__ import (division, absolute_import, unicode_literals,
 import os
 import tempfile
 
+import numpy
 import pathlib2
 import skimage.io
+from PIL import Image
 
 from file_metadata.image.image_file import ImageFile
 from file_metadata.utilities import memoized
 
 
+# The tags which tell whether a JPEG is CMYK encoded.
+CMYK_TAGS = ('APP14:ColorTransform', 'ICC_Profile:ColorSpaceData',
+             'XMP:ColorMode')
+
+
 class JPEGFile(ImageFile):
+    exiftool_used_tags = ImageFile.exiftool_used_tags + CMYK_TAGS
+    # The reduced image is decoded with DCT scaling by every process, which
+    # is cheaper than decoding the full image to share it.
+    analyzer_arrays = dict(ImageFile.analyzer_arrays,
+                           analyze_perceptual_hash=(),
+                           analyze_facial_landmarks=())
 
     @classmethod
     def create(cls, *args, **kwargs):
@@ -22,7 +35,7 @@ class JPEGFile(ImageFile):
     @memoized
     def fetch(self, key=''):
         if key == 'filename_zxing':
-            exif = self.exiftool()
+            exif = self.exiftool(tags=CMYK_TAGS)
             if (exif.get('APP14:ColorTransform') == 'Unknown (RGB or CMYK)' or
                     exif.get('ICC_Profile:ColorSpaceData') == 'CMYK' or
                     exif.get('XMP:ColorMode') == 'CMYK'):
@@ -35,5 +48,60 @@ class JPEGFile(ImageFile):
                 skimage.io.imsave(name, self.fetch('ndarray'))
                 self.temp_filenames.add(name)
                 return pathlib2.Path(name).as_uri()
+        elif key == 'ndarray_luma':
+            luma = self._decode_luma()
+            if luma is not None:
+                return luma
 
         return super(JPEGFile, self).fetch(key)
+
+    def _decode_luma(self):
+        """
+        Decode only the Y channel of a YCbCr encoded JPEG, which skips the
+        chroma upsampling and the color conversion. This is used with
+        ``fetch('ndarray_luma')``.
+
+        :return: The uint8 luma as a numpy array, or None if the image is not
+                 YCbCr encoded.
+        """
+        header = self.fetch('image_header')
+        if (self.config('attach_arrays') or header is None or
+                header['frames'] != 1 or header['mode'] != 'RGB' or
+                self.fetch('pillow').info.get('adobe_transform') == 0):
+            # Images shared by another process and RGB (or CMYK) encoded
+            # JPEGs need the decoded colors.
+            return None
+
+        # A new Pillow image is used as draft() modifies the image in place.
+        pillow_img = Image.open(self.fetch('filename_raster'))
+        try:
+            pillow_img.draft('L', (header['width'], header['height']))
+            if pillow_img.mode != 'L':
+                return None
+            return numpy.asarray(pillow_img)
+        finally:
+            pillow_img.close()
+
+    def reduced_ndarray(self, max_pixels=None):
+        """
+        Get the downscaled image using the DCT scaling of libjpeg, which
+        decodes only a fraction of the data for large reductions. Hence, the
+        full image is never decoded.
+        """
+        header = self.fetch('image_header')
+        if (max_pixels is None or header is None or header['frames'] != 1 or
+                header['mode'] not in ('L', 'RGB')):
+            return super(JPEGFile, self).reduced_ndarray(max_pixels)
+        width, height = header['width'], header['height']
+        size = self.reduced_size(width, height, max_pixels)
+        if size == (width, height):
+            return super(JPEGFile, self).reduced_ndarray(max_pixels)
+
+        # A new Pillow image is used as draft() modifies the image in place.
+        pillow_img = Image.open(self.fetch('filename_raster'))
+        try:
+            pillow_img.draft(pillow_img.mode, size)
+            reduced = pillow_img.resize(size, Image.BILINEAR)
+        finally:
+            pillow_img.close()
+        return numpy.asarray(reduced), (width / size[0], height / size[1])
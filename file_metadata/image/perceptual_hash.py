@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Perceptual hashes of images and an index to find near duplicates.
+
+A perceptual hash is a 64 bit number computed from a tiny downscaled image.
+Re-encoded, resized or slightly modified copies of an image have hashes
+which differ in a few bits only, hence near duplicates are found by
+searching for hashes with a small Hamming distance.
+
+The ``HashIndex`` uses multi-index hashing: The hash is split into 4
+chunks of 16 bits and every chunk is indexed separately in an sqlite
+database. If two hashes differ in at most ``r`` bits, at least one chunk
+differs in at most ``r // 4`` bits. So, only the rows matching one of the
+few chunk values near the query need to be checked. For ``r < 4`` the
+chunks need to match exactly, which keeps lookups well under a millisecond
+even with millions of hashes.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import itertools
+import sqlite3
+
+import numpy
+from PIL import Image
+from six.moves import cPickle as pickle
+
+HASH_BITS = 64
+CHUNK_BITS = 16
+NUM_CHUNKS = HASH_BITS // CHUNK_BITS
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in numpy.asarray(bits).ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def _resize(grey_array, size):
+    return numpy.asarray(Image.fromarray(grey_array).resize(
+        size, Image.BILINEAR), dtype=numpy.float64)
+
+
+def dhash(grey_array):
+    """
+    Find the difference hash of an image. Every bit tells whether a pixel of
+    the image downscaled to 9x8 is brighter than its left neighbour.
+
+    :param grey_array: The 2 dimensional uint8 image.
+    :return:           The 64 bit hash as an int.
+    """
+    pixels = _resize(grey_array, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(size):
+    index = numpy.arange(size)
+    return numpy.cos(numpy.pi * (2 * index[None, :] + 1) *
+                     index[:, None] / (2 * size))
+
+
+def phash(grey_array):
+    """
+    Find the DCT based perceptual hash of an image. The image is downscaled
+    to 32x32 and every bit tells whether one of the 8x8 lowest frequencies
+    of its discrete cosine transform is larger than their median.
+
+    :param grey_array: The 2 dimensional uint8 image.
+    :return:           The 64 bit hash as an int.
+    """
+    pixels = _resize(grey_array, (32, 32))
+    dct = _dct_matrix(32)
+    low = dct.dot(pixels).dot(dct.T)[:8, :8]
+    return _bits_to_int(low > numpy.median(low))
+
+
+def hamming(hash1, hash2):
+    """
+    Find the number of bits which differ in two hashes.
+    """
+    return bin(hash1 ^ hash2).count('1')
+
+
+def _signed(value):
+    # sqlite stores signed 64 bit integers
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def _chunks(value):
+    mask = (1 << CHUNK_BITS) - 1
+    return [(value >> (CHUNK_BITS * i)) & mask for i in range(NUM_CHUNKS)]
+
+
+def _chunk_neighbours(chunk, radius):
+    values = []
+    for num_bits in range(radius + 1):
+        for bits in itertools.combinations(range(CHUNK_BITS), num_bits):
+            value = chunk
+            for bit in bits:
+                value ^= 1 << bit
+            values.append(value)
+    return values
+
+
+class HashIndex(object):
+    """
+    A persistent index of perceptual hashes which can find the hashes near a
+    given hash. Every hash is stored with a key (Example: the filename), the
+    size of the image and arbitrary picklable data (Example: the analysis
+    results of the image).
+
+    :param path: The path of the sqlite database. ``:memory:`` for an index
+                 which is not persisted.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.connection = sqlite3.connect(path)
+        columns = ', '.join('c{0} INTEGER'.format(i)
+                            for i in range(NUM_CHUNKS))
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS hashes (id INTEGER PRIMARY KEY, '
+                'hash INTEGER, {0}, key TEXT, width INTEGER, height INTEGER, '
+                'data BLOB)'.format(columns))
+            for i in range(NUM_CHUNKS):
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS hashes_c{0} ON hashes '
+                    '(c{0}, hash)'.format(i))
+
+    def add(self, value, key, width=None, height=None, data=None):
+        """
+        Add a hash to the index.
+
+        :param value:  The 64 bit hash.
+        :param key:    A string to identify the image with.
+        :param width:  The width of the image.
+        :param height: The height of the image.
+        :param data:   Picklable data to store with the hash.
+        """
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO hashes (hash, {0}, key, width, height, data) '
+                'VALUES (?, {1}, ?, ?, ?, ?)'.format(
+                    ', '.join('c{0}'.format(i) for i in range(NUM_CHUNKS)),
+                    ', '.join('?' * NUM_CHUNKS)),
+                [_signed(value)] + _chunks(value) +
+                [key, width, height,
+                 sqlite3.Binary(pickle.dumps(data, protocol=2))])
+
+    def find(self, value, max_distance=3):
+        """
+        Find the hashes near the given hash.
+
+        :param value:        The 64 bit hash to search for.
+        :param max_distance: The maximum Hamming distance.
+        :return:             A list of dicts with the keys distance, key,
+                             width, height and data sorted by the distance.
+        """
+        radius = max_distance // NUM_CHUNKS
+        candidates = {}
+        for i, chunk in enumerate(_chunks(value)):
+            neighbours = _chunk_neighbours(chunk, radius)
+            # The index of the chunk has the hash too, so only the index is
+            # read to find the candidates.
+            cursor = self.connection.execute(
+                'SELECT id, hash FROM hashes WHERE c{0} IN ({1})'.format(
+                    i, ', '.join('?' * len(neighbours))), neighbours)
+            candidates.update(cursor)
+
+        found = []
+        for _id, _hash in candidates.items():
+            distance = hamming(value, _hash & ((1 << HASH_BITS) - 1))
+            if distance > max_distance:
+                continue
+            key, width, height, data = self.connection.execute(
+                'SELECT key, width, height, data FROM hashes WHERE id = ?',
+                (_id,)).fetchone()
+            found.append({'distance': distance, 'key': key,
+                          'width': width, 'height': height,
+                          'data': pickle.loads(bytes(data))})
+        return sorted(found, key=lambda item: item['distance'])
+
+    def __len__(self):
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM hashes').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
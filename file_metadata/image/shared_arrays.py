@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Numpy arrays which live in shared memory segments.
+
+A decoded image can be hundreds of MB, hence it is too costly to pickle it
+for every process which analyzes it. Instead, the array is copied once into
+a ``multiprocessing.shared_memory`` segment and other processes attach to
+the segment using a small picklable descriptor - without copying the data.
+
+Shared memory needs python 3.8 or later. ``is_available()`` can be used to
+check whether it can be used.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import numpy
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8
+    resource_tracker = shared_memory = None
+
+
+def is_available():
+    """
+    Check whether shared memory segments can be created.
+    """
+    return shared_memory is not None
+
+
+def _attach_untracked(name):
+    """
+    Attach to a shared memory segment without registering it with the
+    resource tracker, like ``track=False`` does in Python 3.13. Otherwise, a
+    process which only attached to the segment would remove it (or warn
+    about it leaking) when exiting. The segment is not unregistered after
+    attaching, as the processes of a pool share the resource tracker of the
+    process owning the segment.
+    """
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedArray(object):
+    """
+    A numpy array in a shared memory segment. The process which creates the
+    segment owns it and removes it when closing. Other processes attach to
+    it with ``SharedArray.attach()`` and only close their own mapping.
+
+    :ivar array:      The numpy array using the shared memory as its buffer.
+    :ivar descriptor: A picklable tuple with the name of the segment, and
+                      the shape and dtype of the array.
+    """
+
+    def __init__(self, shm, shape, dtype, owner):
+        self.shm = shm
+        self.owner = owner
+        self.descriptor = (shm.name, tuple(shape), numpy.dtype(dtype).str)
+        self.array = numpy.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, array):
+        """
+        Copy an array into a new shared memory segment.
+
+        :param array: The numpy array to share.
+        :return:      The ``SharedArray`` owning the segment.
+        """
+        shm = shared_memory.SharedMemory(create=True,
+                                         size=max(1, array.nbytes))
+        shared = cls(shm, array.shape, array.dtype, owner=True)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        Attach to a segment created by another process.
+
+        :param descriptor: The ``descriptor`` of the ``SharedArray`` which
+                           created the segment.
+        :return:           A ``SharedArray`` with a read-only array.
+        """
+        name, shape, dtype = descriptor
+        try:
+            # The segment is owned by the creator, so it should not be
+            # tracked (and removed) when this process exits.
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13
+            shm = _attach_untracked(name)
+        shared = cls(shm, shape, dtype, owner=False)
+        shared.array.flags.writeable = False
+        return shared
+
+    def close(self):
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views of the array are still referenced (Example: in the cache
+            # of ``fetch()``). The mapping is released when they are freed.
+            pass
+        if self.owner:
+            self.shm.unlink()
@@ -3,39 +3,135 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
-import os
-import tempfile
+import logging
+import math
+import sys
 
+import numpy
 import wand.image
+from PIL import Image
 
+from file_metadata.image.backends import reduce_channels, wand_to_ndarray
 from file_metadata.image.image_file import ImageFile
 from file_metadata.utilities import memoized
 
 
 class SVGFile(ImageFile):
 
+    def config(self, key, new_defaults=()):
+        defaults = {
+            # The maximum number of pixels in the rasterized image. Larger
+            # SVGs are scaled down keeping their aspect ratio.
+            "svg_max_pixels": 4096 * 4096,
+            # The renderers to try (in order) when rasterizing.
+            "svg_renderers": ('rsvg', 'wand'),
+        }
+        defaults.update(dict(new_defaults))  # Update the defaults from child
+        return super(SVGFile, self).config(key, new_defaults=defaults)
+
     @classmethod
     def create(cls, *args, **kwargs):
         return cls(*args, **kwargs)
 
     @memoized
     def fetch(self, key=''):
-        if key == 'filename_raster':
-            # SVG files are not raster graphics, hence we convert it to one
-            # and use that instead.
-            with wand.image.Image(filename=self.fetch('filename')) \
-                    as svg_image:
-                svg_image.format = 'png'
-                fd, name = tempfile.mkstemp(
-                    suffix=os.path.split(self.fetch('filename'))[-1] + '.png',
-                    prefix='tmp_file_metadata')
-                os.close(fd)
-                svg_image.save(filename=name)
-                self.temp_filenames.add(name)
-                return name
+        if key == 'ndarray' and self.attached_array(key) is not None:
+            return super(SVGFile, self).fetch(key)
+        elif key == 'ndarray':
+            # SVG files are not raster graphics, hence we rasterize it in
+            # memory and use that instead.
+            for renderer in self.config('svg_renderers'):
+                render = getattr(self, '_render_' + renderer, None)
+                if render is None:
+                    logging.warn('Unknown SVG renderer "{0}" was ignored.'
+                                 .format(renderer))
+                    continue
+                image_array = render()
+                if image_array is not None:
+                    return image_array
+            return numpy.ndarray(0)
+        elif key == 'pillow':
+            return Image.fromarray(self.fetch('ndarray'))
+        elif key == 'filename_raster':
+            return self.fetch('filename_png')
 
         return super(SVGFile, self).fetch(key)
 
+    def raster_scale(self, width, height):
+        """
+        The scale to rasterize the SVG with so that the raster has lesser
+        pixels than the ``svg_max_pixels`` config.
+
+        :param width:  The intrinsic width of the SVG.
+        :param height: The intrinsic height of the SVG.
+        :return:       The scale, which is never more than 1.
+        """
+        pixels = width * height
+        max_pixels = self.config('svg_max_pixels')
+        if pixels <= max_pixels:
+            return 1.0
+        return math.sqrt(max_pixels / pixels)
+
+    def _render_wand(self):
+        """
+        Rasterize the SVG with ImageMagick (using ``wand``). The SVG is pinged
+        first to find the intrinsic size without rasterizing it. None is
+        returned if the SVG is empty.
+        """
+        filename = self.fetch('filename')
+        with wand.image.Image.ping(filename=filename) as svg_image:
+            if svg_image.width == 0 or svg_image.height == 0:
+                return None
+            scale = self.raster_scale(svg_image.width, svg_image.height)
+        kwargs = {} if scale == 1 else {'resolution': 72 * scale}
+        with wand.image.Image(filename=filename, **kwargs) as svg_image:
+            return wand_to_ndarray(svg_image)
+
+    def _render_rsvg(self):
+        """
+        Rasterize the SVG with librsvg and cairo (using ``gi``). This is much
+        lighter than ImageMagick and renders directly into a memory buffer.
+        None is returned if librsvg is not available or the SVG is empty.
+        """
+        try:
+            import cairo
+            import gi
+            gi.require_version('Rsvg', '2.0')
+            from gi.repository import GLib, Rsvg
+        except (ImportError, ValueError):
+            return None
+
+        try:
+            handle = Rsvg.Handle.new_from_file(self.fetch('filename'))
+        except GLib.Error as err:
+            logging.warn('librsvg was unable to read "{0}": {1}'
+                         .format(self.fetch('filename'), err))
+            return None
+        dims = handle.get_dimensions()
+        if dims.width == 0 or dims.height == 0:
+            return None  # Cannot scale an empty SVG to the surface.
+        scale = self.raster_scale(dims.width, dims.height)
+        width = max(1, int(round(dims.width * scale)))
+        height = max(1, int(round(dims.height * scale)))
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        context = cairo.Context(surface)
+        context.scale(width / dims.width, height / dims.height)
+        handle.render_cairo(context)
+        surface.flush()
+
+        # Cairo stores pixels as native endian premultiplied ARGB.
+        pixels = numpy.ndarray(shape=(height, width, 4), dtype=numpy.uint8,
+                               buffer=surface.get_data(),
+                               strides=(surface.get_stride(), 4, 1))
+        order = [2, 1, 0, 3] if sys.byteorder == 'little' else [1, 2, 3, 0]
+        rgba = pixels[..., order].astype(numpy.float32)
+        alpha = rgba[..., 3:]
+        numpy.divide(rgba[..., :3] * 255, alpha, out=rgba[..., :3],
+                     where=alpha > 0)
+        return reduce_channels(
+            numpy.clip(rgba + 0.5, 0, 255).astype(numpy.uint8))
+
     def analyze_file_format(self):
         """
         Simply add a metadata mentioning this is a valid SVG file. This is
@@ -7,7 +7,6 @@ import os
 import tempfile
 
 import pathlib2
-import wand.image
 
 from file_metadata.image.image_file import ImageFile
 from file_metadata.utilities import memoized
@@ -22,19 +21,22 @@ class TIFFFile(ImageFile):
     @memoized
     def fetch(self, key=''):
         if key == 'filename_zxing':
-            pill = self.fetch('pillow')
-            if hasattr(pill, 'n_frames') and pill.n_frames != 1:
+            # ZXing reads only the first page of a file. Multi page images
+            # are scanned page by page with zbar instead.
+            if self.fetch('image_header')['frames'] != 1:
                 return None
-            # ZXing cannot handle most TIFF images, convert to PNG.
-            with wand.image.Image(filename=self.fetch('filename')) \
-                    as tiff_image:
-                tiff_image.format = 'png'
-                fd, name = tempfile.mkstemp(
-                    suffix=os.path.split(self.fetch('filename'))[-1] + '.png',
-                    prefix='tmp_file_metadata')
-                os.close(fd)
-                tiff_image.save(filename=name)
-                self.temp_filenames.add(name)
-                return pathlib2.Path(name).as_uri()
+            # ZXing cannot handle most TIFF images, convert to PNG. The
+            # image decoded by Pillow is reused for this.
+            pillow_img = self.fetch('pillow')
+            if pillow_img.mode not in ('1', 'L', 'LA', 'I', 'I;16', 'P',
+                                       'RGB', 'RGBA'):
+                pillow_img = pillow_img.convert('RGB')
+            fd, name = tempfile.mkstemp(
+                suffix=os.path.split(self.fetch('filename'))[-1] + '.png',
+                prefix='tmp_file_metadata')
+            os.close(fd)
+            pillow_img.save(name, format='png')
+            self.temp_filenames.add(name)
+            return pathlib2.Path(name).as_uri()
 
         return super(TIFFFile, self).fetch(key)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Run a detector over a large image in overlapping tiles.
+
+Detectors like zbar, dlib and OpenCV's haarcascades release the GIL while
+scanning an image, hence the tiles are scanned in parallel threads. The
+detections are moved to the coordinates of the full image and detections
+found multiple times in the overlapping regions of the tiles are merged.
+
+Every detection is expected to be a dict with a box (A dict with the keys
+left, top, width, height) which is used to move and merge the detections.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+from multiprocessing.pool import ThreadPool
+
+
+def tile_origins(height, width, tile_size, overlap=0):
+    """
+    Find the top left corner of the tiles needed to cover an image.
+
+    :param height:    The height of the image.
+    :param width:     The width of the image.
+    :param tile_size: The size of a (square) tile.
+    :param overlap:   The number of pixels adjacent tiles overlap.
+    :return:          A list of (top, left) tuples.
+    """
+    step = max(1, tile_size - overlap)
+    return [(top, left)
+            for top in range(0, max(1, height - overlap), step)
+            for left in range(0, max(1, width - overlap), step)]
+
+
+def box_overlap(box1, box2):
+    """
+    Find the intersection over union of two boxes.
+
+    :return: The ratio from 0 (disjoint) to 1 (the same box).
+    """
+    width = (min(box1['left'] + box1['width'], box2['left'] + box2['width']) -
+             max(box1['left'], box2['left']))
+    height = (min(box1['top'] + box1['height'], box2['top'] + box2['height']) -
+              max(box1['top'], box2['top']))
+    if width <= 0 or height <= 0:
+        return 0
+    intersection = width * height
+    return intersection / (box1['width'] * box1['height'] +
+                           box2['width'] * box2['height'] - intersection)
+
+
+def boxes_touch(box1, box2):
+    """
+    Check whether two boxes overlap or touch each other.
+    """
+    return (box1['left'] <= box2['left'] + box2['width'] and
+            box2['left'] <= box1['left'] + box1['width'] and
+            box1['top'] <= box2['top'] + box2['height'] and
+            box2['top'] <= box1['top'] + box1['height'])
+
+
+def offset_detection(detection, top, left, box_key, point_keys=()):
+    """
+    Move a detection found in a tile to the coordinates of the full image.
+
+    :param detection:  The detection to move (It is modified in place).
+    :param top:        The top of the tile in the full image.
+    :param left:       The left of the tile in the full image.
+    :param box_key:    The key of the box in the detection.
+    :param point_keys: The keys of (x, y) points or tuples of points in
+                       the detection.
+    :return:           The detection.
+    """
+    detection[box_key]['left'] += left
+    detection[box_key]['top'] += top
+    for key in point_keys:
+        value = detection.get(key)
+        if value is None:
+            continue
+        if isinstance(value[0], (tuple, list)):
+            detection[key] = tuple((x + left, y + top) for x, y in value)
+        else:
+            detection[key] = (value[0] + left, value[1] + top)
+    return detection
+
+
+def detect_tiled(image_array, detect, tile_size=None, overlap=0,
+                 threads=None, box_key='bounding box', point_keys=(),
+                 is_duplicate=None, rank=None):
+    """
+    Run a detector on an image. If the image is larger than ``tile_size``,
+    the detector is run on overlapping tiles in a thread pool.
+
+    :param image_array:  The image to run the detector on.
+    :param detect:       A callable which takes an image (or a tile of it)
+                         and gives a list of detections.
+    :param tile_size:    The size of the tiles. None to never use tiles.
+    :param overlap:      The number of pixels adjacent tiles overlap. This
+                         should be larger than the objects to detect.
+    :param threads:      The number of threads to use. None uses the number
+                         of CPUs.
+    :param box_key:      The key of the box in the detections.
+    :param point_keys:   The keys of other coordinates in the detections
+                         which need to be moved with the box.
+    :param is_duplicate: A callable which takes two detections and checks
+                         whether they are the same object. By default,
+                         detections with touching boxes are duplicates.
+    :param rank:         A callable giving a sort key for a detection. When
+                         there are duplicates, the one with the highest
+                         rank is kept. By default, the largest box is kept
+                         as the others are usually cut at a tile seam.
+    :return:             A list of detections.
+    """
+    height, width = image_array.shape[:2]
+    if tile_size is None or (height <= tile_size and width <= tile_size):
+        return list(detect(image_array))
+
+    def detect_tile(origin):
+        top, left = origin
+        found = detect(image_array[top:top + tile_size,
+                                   left:left + tile_size])
+        return [offset_detection(detection, top, left, box_key, point_keys)
+                for detection in found]
+
+    pool = ThreadPool(threads)
+    try:
+        results = pool.map(detect_tile,
+                           tile_origins(height, width, tile_size, overlap))
+    finally:
+        pool.close()
+
+    if is_duplicate is None:
+        def is_duplicate(det1, det2):
+            return boxes_touch(det1[box_key], det2[box_key])
+
+    if rank is None:
+        def rank(det):
+            return det[box_key]['width'] * det[box_key]['height']
+
+    detections = [det for found in results for det in found]
+    detections.sort(key=rank, reverse=True)
+    merged = []
+    for detection in detections:
+        if not any(is_duplicate(detection, det) for det in merged):
+            merged.append(detection)
+    return merged
@@ -3,11 +3,10 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
-import os
-import tempfile
-
 import wand.image
+from PIL import Image
 
+from file_metadata.image.backends import wand_to_ndarray
 from file_metadata.image.image_file import ImageFile
 from file_metadata.utilities import memoized
 
@@ -20,18 +19,20 @@ class XCFFile(ImageFile):
 
     @memoized
     def fetch(self, key=''):
-        if key == 'filename_raster':
-            # XCF files are not raste graphics, hence we convert it to one
-            # and use that instead.
+        if key == 'ndarray' and self.attached_array(key) is not None:
+            return super(XCFFile, self).fetch(key)
+        elif key == 'ndarray':
+            # XCF files are not raster graphics, hence we convert it to one
+            # in memory and use that instead. ImageMagick gives the merged
+            # image as the first image.
             with wand.image.Image(filename=self.fetch('filename')) \
                     as xcf_image:
-                xcf_image.format = 'png'
-                fd, name = tempfile.mkstemp(
-                    suffix=os.path.split(self.fetch('filename'))[-1] + '.png',
-                    prefix='tmp_file_metadata')
-                os.close(fd)
-                xcf_image.save(filename=name)
-                self.temp_filenames.add(name)
-                return name
+                with wand.image.Image(image=xcf_image.sequence[0]) \
+                        as merged_image:
+                    return wand_to_ndarray(merged_image)
+        elif key == 'pillow':
+            return Image.fromarray(self.fetch('ndarray'))
+        elif key == 'filename_raster':
+            return self.fetch('filename_png')
 
         return super(XCFFile, self).fetch(key)
@@ -13,6 +13,7 @@ import os
 import subprocess
 from xml.etree import cElementTree
 
+from file_metadata import containers
 from file_metadata.utilities import DictNoNone, memoized
 from file_metadata._compat import ffprobe_parser, which
 
@@ -24,8 +25,13 @@ class FFProbeMixin(object):
         """
         Read multimedia streams and give information about it using the
         ffmpeg utility ffprobe (or avprobe from libav-tools, a fork of
-        ffmpeg).
+        ffmpeg). The headers of WAV, FLAC, Ogg and Matroska files are parsed
+        in python instead, as that doesn't need a new process.
         """
+        data = containers.probe(self.fetch('filename'))
+        if data is not None:
+            return data
+
         executable = which('ffprobe') or which('avprobe')
         if executable is None:
             raise OSError('Neither avprobe nor ffprobe were found.')
@@ -88,7 +94,7 @@ class FFProbeMixin(object):
                 # 'AvgFrameRate': (None if strm('avg_frame_rate') == '0/0'
                 #                  else strm('avg_frame_rate')),
                 'Rate': rate,
-                'Duration': (None if strm('duration').lower() == 'n/a'
+                'Duration': (None if strm('duration', 'N/A').lower() == 'n/a'
                              else float(strm('duration')))}))
 
         data['FFProbe:Streams'] = streams or None
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Find the class to use for a file from the magic numbers at its start.
+
+``GenericFile.create()`` used libmagic, XML parsing and exiftool to choose a
+class, which needs a few subprocesses for every file. The formats handled
+here can be identified from a single read of the start of the file, and
+libmagic is needed only for other files.
+"""
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import importlib
+import re
+
+from file_metadata import containers
+
+# The magic numbers (as tuples of offset and bytes which all have to match)
+# and the class used for the files which have them. The first match is used.
+SIGNATURES = (
+    (((0, b'\xff\xd8\xff'),), 'file_metadata.image.jpeg_file.JPEGFile'),
+    (((0, b'\x89PNG\r\n\x1a\n'),), 'file_metadata.image.image_file.ImageFile'),
+    (((0, b'GIF87a'),), 'file_metadata.image.image_file.ImageFile'),
+    (((0, b'GIF89a'),), 'file_metadata.image.image_file.ImageFile'),
+    (((0, b'II*\x00'),), 'file_metadata.image.tiff_file.TIFFFile'),
+    (((0, b'MM\x00*'),), 'file_metadata.image.tiff_file.TIFFFile'),
+    (((0, b'II+\x00'),), 'file_metadata.image.tiff_file.TIFFFile'),
+    (((0, b'MM\x00+'),), 'file_metadata.image.tiff_file.TIFFFile'),
+    (((0, b'gimp xcf '),), 'file_metadata.image.xcf_file.XCFFile'),
+    (((0, b'RIFF'), (8, b'WEBP')), 'file_metadata.image.image_file.ImageFile'),
+    (((0, b'RIFF'), (8, b'WAVE')), 'file_metadata.audio.audio_file.AudioFile'),
+    (((0, b'RIFF'), (8, b'AVI ')), 'file_metadata.video.video_file.VideoFile'),
+    (((0, b'fLaC'),), 'file_metadata.audio.audio_file.AudioFile'),
+    (((0, b'\x1a\x45\xdf\xa3'),), 'file_metadata.video.video_file.VideoFile'),
+    (((0, b'%PDF-'),), 'file_metadata.application.document_file.DocumentFile'),
+    (((0, b'AT&TFORM'),),
+     'file_metadata.application.document_file.DocumentFile'),
+)
+
+# The classes of Ogg files, found from the codecs of the streams.
+OGG_CLASSES = {
+    'audio': 'file_metadata.audio.ogg_file.OGGFile',
+    'video': 'file_metadata.video.ogv_file.OGVFile',
+}
+
+SVG_CLASS = 'file_metadata.image.svg_file.SVGFile'
+
+# The XML declaration, processing instructions, comments and doctype which
+# can come before the root element.
+XML_PROLOG = re.compile(br'\s*(<\?.*?\?>|<!--.*?-->|'
+                        br'<!DOCTYPE[^\[>]*(\[.*?\])?\s*>)', re.DOTALL)
+SVG_ROOT = re.compile(br'\s*<(?:[\w.-]+:)?svg[\s/>]')
+
+
+def is_svg_head(head):
+    """
+    Check whether the root element of an XML document is the svg element
+    with the SVG namespace.
+
+    :param head: The data at the start of the file.
+    :return:     Boolean corresponding to whether the file is SVG.
+    """
+    if head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:]
+    pos = 0
+    match = XML_PROLOG.match(head, pos)
+    while match is not None:
+        pos = match.end()
+        match = XML_PROLOG.match(head, pos)
+    if SVG_ROOT.match(head, pos) is None:
+        return False
+    end = head.find(b'>', pos)
+    return b'http://www.w3.org/2000/svg' in head[pos:end]
+
+
+def match(head):
+    """
+    Find the class to use for a file.
+
+    :param head: The data at the start of the file.
+    :return:     The dotted path of the class, or None if the format is not
+                 known from the magic numbers.
+    """
+    for magic_numbers, path in SIGNATURES:
+        if all(head[offset:offset + len(magic)] == magic
+               for offset, magic in magic_numbers):
+            return path
+    media_type = containers.ogg_media_type(head)
+    if media_type is not None:
+        return OGG_CLASSES.get(media_type)
+    if head.lstrip()[:1] == b'<' or head.startswith(b'\xef\xbb\xbf<'):
+        return SVG_CLASS if is_svg_head(head) else None
+    return None
+
+
+def file_class(head):
+    """
+    Import the class to use for a file.
+
+    :param head: The data at the start of the file.
+    :return:     A class inheriting from GenericFile, or None if the format
+                 is not known from the magic numbers.
+    """
+    path = match(head)
+    if path is None:
+        return None
+    module, name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module), name)
@@ -3,13 +3,36 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
+import logging
+import subprocess
+
+import numpy
+
+from file_metadata._compat import which
 from file_metadata.generic_file import GenericFile
 from file_metadata.mixins import FFProbeMixin
+from file_metadata.utilities import memoized
 
 
 class VideoFile(FFProbeMixin, GenericFile):
     mimetypes = ()
 
+    def config(self, key, new_defaults=()):
+        defaults = {
+            # exiftool stops at the media data instead of reading the whole
+            # video.
+            "exiftool_fast": 1,
+            # The number of keyframes (spread evenly over the video) which
+            # are decoded and analyzed as images.
+            "video_sample_frames": 5,
+            # The ImageFile analyzers run on every sampled frame.
+            "video_frame_analyzers": ('analyze_color_info',
+                                      'analyze_face_haarcascades',
+                                      'analyze_barcode_zbar'),
+        }
+        defaults.update(dict(new_defaults))  # Update the defaults from child
+        return super(VideoFile, self).config(key, new_defaults=defaults)
+
     @classmethod
     def create(cls, *args, **kwargs):
         cls_file = cls(*args, **kwargs)
@@ -17,3 +40,114 @@ class VideoFile(FFProbeMixin, GenericFile):
             from file_metadata.video.ogv_file import OGVFile
             return OGVFile.create(*args, **kwargs)
         return cls(*args, **kwargs)
+
+    @memoized
+    def fetch(self, key=''):
+        if key == 'video_stream':
+            # The first video stream found by ffprobe.
+            for stream in self.ffprobe().get('streams', []):
+                if stream.get('codec_type') == 'video':
+                    return stream
+            return None
+        return super(VideoFile, self).fetch(key)
+
+    def sample_times(self, num_frames):
+        """
+        Find the times to sample frames at, spread evenly over the video.
+
+        :param num_frames: The number of frames to sample.
+        :return:           A list of times in seconds.
+        """
+        duration = self.ffprobe().get('format', {}).get('duration', 'N/A')
+        if duration.lower() == 'n/a':
+            return [0.0]
+        duration = float(duration)
+        return [duration * (index + 0.5) / num_frames
+                for index in range(num_frames)]
+
+    def iter_frames(self, times):
+        """
+        Decode the first keyframe at (or after) every given time as an RGB
+        image. ``ffmpeg`` seeks to every time and decodes only keyframes,
+        and the raw pixels are piped into numpy arrays, hence the cost
+        depends on the number of frames and not on the length of the video.
+
+        :param times: The times (in seconds) to sample the frames at.
+        :return:      A generator of tuples with the time and the uint8 array
+                      with the shape (height, width, 3) of every frame.
+        """
+        stream = self.fetch('video_stream')
+        if stream is None:
+            return
+        executable = which('ffmpeg')
+        if executable is None:
+            raise OSError('ffmpeg was not found.')
+
+        width, height = int(stream['width']), int(stream['height'])
+        for time in times:
+            proc = subprocess.Popen(
+                [executable, '-nostdin', '-v', '0', '-skip_frame', 'nokey',
+                 '-noautorotate', '-ss', '{0:.3f}'.format(time),
+                 '-i', self.fetch('filename'), '-an', '-sn',
+                 '-frames:v', '1', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                 '-'],
+                stdout=subprocess.PIPE)
+            data, _ = proc.communicate()
+            if len(data) != width * height * 3:
+                continue  # No keyframe after the time.
+            yield time, numpy.frombuffer(data, numpy.uint8).reshape(
+                height, width, 3)
+
+    def analyze_frames(self):
+        """
+        Run the image analyzers (the ``video_frame_analyzers`` config) on
+        keyframes sampled from the video. The frames are analyzed as
+        ``ArrayImageFile`` objects, without writing them to files.
+
+        :return: dict with the keys:
+
+                 - Video:SampledFrames - The number of frames analyzed.
+                 - Video:Frames - A list with the time and the data of the
+                   analyzers for every frame.
+                 - Video:ClosestLabeledColor - The closest labeled color of
+                   most of the frames.
+                 - Video:AverageRGB - The average color of the frames.
+                 - Video:MaxFaces - The largest number of faces found in a
+                   frame.
+                 - Video:Barcodes - The unique barcodes in the frames.
+        """
+        from file_metadata.image.array_file import ArrayImageFile
+
+        analyzers = self.config('video_frame_analyzers')
+        frames = []
+        try:
+            for time, array in self.iter_frames(
+                    self.sample_times(self.config('video_sample_frames'))):
+                with ArrayImageFile(self.fetch('filename'),
+                                    array=array) as frame:
+                    data = frame.analyze(methods=analyzers)
+                data['Time'] = time
+                frames.append(data)
+        except OSError as error:
+            logging.warn('Frames of the video cannot be analyzed: {0}'
+                         .format(error))
+            return {}
+        if not frames:
+            return {}
+        data = self.aggregate_frames(frames)
+        data['Video:SampledFrames'] = len(frames)
+        data['Video:Frames'] = frames
+        return data
+
+    @staticmethod
+    def aggregate_frames(frames):
+        """
+        Summarize the data of the image analyzers on the frames of a video
+        (See ``aggregate_image_data()``).
+
+        :param frames: A list with a dict of the data of every frame.
+        :return:       A dict with the aggregated ``Video:*`` keys.
+        """
+        from file_metadata.image.array_file import aggregate_image_data
+
+        return aggregate_image_data(frames, 'Video:')
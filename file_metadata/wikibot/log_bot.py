@@ -33,7 +33,6 @@ Arguments can be:
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
-import logging
 import os
 import re
 import sys
@@ -41,13 +40,11 @@ import tempfile
 from collections import Counter
 from datetime import datetime
 
-import numpy
 from six import string_types
 from six.moves.urllib.error import URLError
 
-from file_metadata.generic_file import GenericFile
-from file_metadata.wikibot.utilities import (pywikibot, download_page,
-                                             stringify)
+from file_metadata.wikibot.utilities import (pywikibot, analyze_pages,
+                                             download_page, stringify)
 
 from pywikibot import pagegenerators
 
@@ -103,36 +100,32 @@ def handle_bulk_pages(gen):
         "Ogv videos": {'ogv'},
         'WebM videos': {'video/webm'},
     }
-    for ipage, page in enumerate(gen):
-        if not (page.exists() and
-                not page.isRedirectPage() and
-                page.namespace() == "File" and
-                page.title() not in parsed_pages and
-                (page.latest_file_info['size'] / 1024 / 1024 <
-                 options.get('limitsize', float("inf"))) and
-                ipage % (options.get('skip', 0) + 1) == 0):
-            continue
-        parsed_pages.add(page.title())
-        try:
-            page_path = download_page(
-                page, timeout=15 * 60,
-                cache_dir=options.get('cachefiles', tempfile.gettempdir()))
-        except URLError:  # Download timed out
-            continue
-
-        pywikibot.output(str(count + 1) + '. Analyzing ' +
+    def downloaded_pages():
+        for ipage, page in enumerate(gen):
+            if not (page.exists() and
+                    not page.isRedirectPage() and
+                    page.namespace() == "File" and
+                    page.title() not in parsed_pages and
+                    (page.latest_file_info['size'] / 1024 / 1024 <
+                     options.get('limitsize', float("inf"))) and
+                    ipage % (options.get('skip', 0) + 1) == 0):
+                continue
+            parsed_pages.add(page.title())
+            try:
+                page_path = download_page(
+                    page, timeout=15 * 60,
+                    cache_dir=options.get('cachefiles', tempfile.gettempdir()))
+            except URLError:  # Download timed out
+                continue
+            yield page, page_path
+
+    for page, page_path, meta, header, duration in analyze_pages(
+            downloaded_pages()):
+        pywikibot.output(str(count + 1) + '. Analyzed ' +
                          page.title(underscore=False))
-
-        start_time = datetime.now()
-        _file = GenericFile.create(page_path)
-        try:
-            meta = _file.analyze()
-        except Exception as err:
-            logging.exception(err)
+        if meta is None:
             exception_count += 1
             continue
-        finally:
-            _file.close()
 
         info, cats, cat_buckets, img = [], set(), set(), []
         # info - Information analyzed from the file
@@ -429,9 +422,8 @@ def handle_bulk_pages(gen):
         #################################################################
         # Image analysis
         # Fill second column (image cell) for ImageFiles (Only 2 dim images)
-        if (isinstance(_file.fetch('ndarray'), numpy.ndarray) and
-                _file.fetch('ndarray').ndim in (2, 3)):
-            height, width = _file.fetch('ndarray').shape[:2]
+        if header is not None and header['frames'] == 1:
+            height, width = header['height'], header['width']
             max_dim = max(width, height)
             scale = min(200, max_dim) / max_dim
 
@@ -623,8 +615,7 @@ def handle_bulk_pages(gen):
         categories.append(cats)
         category_buckets.append(cat_buckets)
 
-        info.append("* '''Time taken''': {0} sec"
-                    .format((datetime.now() - start_time).total_seconds()))
+        info.append("* '''Time taken''': {0} sec".format(duration))
 
         count += 1
         log.append("\n==== {0} ====" .format(page.title(asLink=True,
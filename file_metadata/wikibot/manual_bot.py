@@ -22,17 +22,15 @@ Arguments can be:
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
-import logging
 import os
 import re
 import tempfile
 
-import numpy
 from six.moves.urllib.error import URLError
 
-from file_metadata.generic_file import GenericFile
-from file_metadata.wikibot.utilities import (pywikibot, download_page,
-                                             put_cats, stringify)
+from file_metadata.wikibot.utilities import (pywikibot, analyze_pages,
+                                             download_page, put_cats,
+                                             stringify)
 
 from pywikibot import pagegenerators
 
@@ -57,34 +55,31 @@ def handle_bulk_pages(gen):
         "Ogv videos": {'ogv'},
         'WebM videos': {'video/webm'},
     }
-    for ipage, page in enumerate(gen):
-        if not (page.exists() and
-                not page.isRedirectPage() and
-                page.namespace() == "File" and
-                page.title() not in parsed_pages and
-                (page.latest_file_info['size'] / 1024 / 1024 <
-                 options.get('limitsize', float("inf")))):
-            continue
-        parsed_pages.add(page.title())
-        try:
-            page_path = download_page(
-                page, timeout=15 * 60,
-                cache_dir=options.get('cachefiles', tempfile.gettempdir()))
-        except URLError:  # Download timed out
-            continue
-
-        pywikibot.output(str(count + 1) + '. Analyzing ' +
+    def downloaded_pages():
+        for ipage, page in enumerate(gen):
+            if not (page.exists() and
+                    not page.isRedirectPage() and
+                    page.namespace() == "File" and
+                    page.title() not in parsed_pages and
+                    (page.latest_file_info['size'] / 1024 / 1024 <
+                     options.get('limitsize', float("inf")))):
+                continue
+            parsed_pages.add(page.title())
+            try:
+                page_path = download_page(
+                    page, timeout=15 * 60,
+                    cache_dir=options.get('cachefiles', tempfile.gettempdir()))
+            except URLError:  # Download timed out
+                continue
+            yield page, page_path
+
+    for page, page_path, meta, header, duration in analyze_pages(
+            downloaded_pages()):
+        pywikibot.output(str(count + 1) + '. Analyzed ' +
                          page.title(underscore=False))
-
-        _file = GenericFile.create(page_path)
-        try:
-            meta = _file.analyze()
-        except Exception as err:
-            logging.exception(err)
+        if meta is None:
             exception_count += 1
             continue
-        finally:
-            _file.close()
 
         # cats - The suggested categories to add to the file
         cats = set()
@@ -329,9 +324,8 @@ def handle_bulk_pages(gen):
         #################################################################
         # Image analysis
         # Fill second column (image cell) for ImageFiles (Only 2 dim images)
-        if (isinstance(_file.fetch('ndarray'), numpy.ndarray) and
-                _file.fetch('ndarray').ndim in (2, 3)):
-            height, width = _file.fetch('ndarray').shape[:2]
+        if header is not None and header['frames'] == 1:
+            height, width = header['height'], header['width']
 
             #################################################################
             # Analysis for very specific images: Icons, Football kits, etc
@@ -12,9 +12,11 @@ import logging
 import os
 import sys
 import tempfile
+import time
 
 from six import string_types
 
+from file_metadata.generic_file import GenericFile
 from file_metadata.utilities import download, retry
 
 try:
@@ -54,6 +56,46 @@ def download_page(page, timeout=None, cache_dir=tempfile.gettempdir()):
     return fpath
 
 
+def analyze_pages(pages, batch_size=16, **kwargs):
+    """
+    Analyze the downloaded files of pages with ``GenericFile.analyze_files()``
+    so that similar files (Like small images) are analyzed together. A file
+    whose analysis fails does not affect the other files of its batch.
+
+    :param pages:      An iterable giving tuples of the page and the path of
+                       the downloaded file.
+    :param batch_size: The number of files analyzed together.
+    :param kwargs:     The kwargs to create the files with.
+    :return:           A generator giving tuples of the page, the path, the
+                       metadata (None if the analysis failed), the header
+                       of the image (See ``ImageFile.pillow_header()``, None
+                       if the file is not an image) and the time taken to
+                       analyze the file in seconds (The average of its
+                       batch).
+    """
+    batch = []
+    for page, path in pages:
+        batch.append((page, path))
+        if len(batch) == batch_size:
+            for item in _analyze_page_batch(batch, **kwargs):
+                yield item
+            batch = []
+    for item in _analyze_page_batch(batch, **kwargs):
+        yield item
+
+
+def _analyze_page_batch(batch, **kwargs):
+    if not batch:
+        return []
+    start_time = time.time()
+    results = list(GenericFile.analyze_files(
+        [path for _, path in batch], batch_size=len(batch),
+        fetch_keys=('image_header',), skip_errors=True, **kwargs))
+    duration = (time.time() - start_time) / len(batch)
+    return [(page, path, meta, fetched['image_header'], duration)
+            for (page, _), (path, meta, fetched) in zip(batch, results)]
+
+
 def put_cats(page, new_cats, summary=None, always=False):
     line_sep = pywikibot.config.line_separator
     if not summary:
@@ -38,6 +38,7 @@ install_deps = [
     setupdeps.JavaJRE(),
     setupdeps.ZXing(),
     setupdeps.PyColorName(),
+    setupdeps.ColorMath(),
     # Audio video deps
     setupdeps.FFProbe(),
 ]
@@ -473,6 +473,16 @@ class PyColorName(SetupPackage):
         return ['pycolorname']
 
 
+class ColorMath(SetupPackage):
+    name = 'colormath'
+
+    def check(self):
+        return 'Will be installed with pip.'
+
+    def get_install_requires(self):
+        return ['colormath']
+
+
 class LibZBar(SetupPackage):
     name = 'libzbar'
     pkg_names = {
@@ -11,6 +11,9 @@ import string
 import struct
 import wave
 
+import numpy
+from PIL import Image
+
 try:
     import unittest
 except ImportError:
@@ -158,6 +161,12 @@ def fetch_file(name, overwrite=False):
             value = struct.pack('h', random.randint(-32767, 32767))
             wav_file.writeframes(value)
         wav_file.close()
+    # Image files
+    elif name == 'multipage.tiff':
+        pages = [Image.fromarray(numpy.full((60, 80), 50 * i, numpy.uint8))
+                 for i in range(5)]
+        pages[0].save(filepath, format='tiff', save_all=True,
+                      append_images=pages[1:])
     elif name in file_download_links:
         download(file_download_links[name], filepath)
     else:
@@ -174,6 +183,41 @@ def which_sideeffect(unavailable_executables):
     return wrapper
 
 
+def ogg_page(header_type, granule, serial, body):
+    return (b'OggS' + struct.pack('<BBqIIIB', 0, header_type, granule,
+                                  serial, 0, 0, 1) +
+            struct.pack('B', len(body)) + body)
+
+
+def theora_header(width, height, rate, shift=6):
+    return (b'\x80theora\x03\x02\x01' +
+            struct.pack('>HH', (width + 15) // 16, (height + 15) // 16) +
+            struct.pack('>I', width)[1:] + struct.pack('>I', height)[1:] +
+            struct.pack('>BBII', 0, 0, rate, 1) + b'\x00' * 10 +
+            struct.pack('>H', shift << 5))
+
+
+def write_melody(filepath, seed, duration=10, sample_rate=44100, channels=1,
+                 gain=0.5, noise=0.0, start=0.0):
+    """
+    Write a WAV file with a melody of random tones (4 per second) and some
+    white noise. The same seed gives the same melody, so files with the
+    same seed are conversions of the same recording.
+    """
+    rand = numpy.random.RandomState(seed)
+    freqs = rand.uniform(200, 3000, size=int((start + duration) * 4) + 1)
+    time = start + numpy.arange(int(duration * sample_rate)) / sample_rate
+    tones = freqs[(time * 4).astype(int)]
+    samples = numpy.sin(2 * numpy.pi * numpy.cumsum(tones) / sample_rate)
+    samples = gain * samples + noise * rand.randn(len(samples))
+    samples = numpy.clip(samples * 32767, -32768, 32767).astype('<i2')
+    wav_file = wave.open(filepath, 'w')
+    wav_file.setparams((channels, 2, sample_rate, 0, 'NONE',
+                        'not compressed'))
+    wav_file.writeframes(numpy.repeat(samples, channels).tobytes())
+    wav_file.close()
+
+
 def is_toolserver():
     return os.environ.get('INSTANCEPROJECT', None) == 'tools'
 
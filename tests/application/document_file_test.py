@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import io
+import os
+import tempfile
+
+import numpy
+from PIL import Image
+
+from file_metadata.application.document_file import DocumentFile
+from file_metadata.generic_file import GenericFile
+from tests import mock, unittest
+
+
+def ppm(array):
+    data = io.BytesIO()
+    Image.fromarray(array).save(data, format='ppm')
+    return data.getvalue()
+
+
+class DocumentFileTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.pdf')
+        os.write(fd, b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    @mock.patch.object(GenericFile, 'mime')
+    def test_create(self, mock_mime):
+        with GenericFile.create(self.filename) as uut:
+            self.assertIsInstance(uut, DocumentFile)
+            self.assertEqual(uut.fetch('document_type'), 'pdf')
+        self.assertFalse(mock_mime.called)
+
+    def test_sample_pages(self):
+        self.assertEqual(DocumentFile.sample_pages(1, 3), [1])
+        self.assertEqual(DocumentFile.sample_pages(4, 3), [1, 2, 3, 4])
+        self.assertEqual(DocumentFile.sample_pages(1000, 3),
+                         [1, 251, 500, 750, 1000])
+
+    @mock.patch('file_metadata.application.document_file.which',
+                side_effect=lambda cmd: '/usr/bin/' + cmd)
+    @mock.patch('file_metadata.application.document_file.subprocess')
+    def test_num_pages_render_page(self, mock_subprocess, mock_which):
+        mock_subprocess.check_output.return_value = (
+            b'Producer:       test\nPages:          120\n')
+        page = numpy.zeros((11, 8, 3), numpy.uint8)
+        proc = mock_subprocess.Popen.return_value
+        proc.communicate.return_value = (ppm(page), b'')
+        proc.returncode = 0
+        with DocumentFile(self.filename, document_dpi=50) as uut:
+            self.assertEqual(uut.fetch('num_pages'), 120)
+            self.assertEqual(uut.render_page(7).shape, (11, 8, 3))
+        self.assertEqual(mock_subprocess.Popen.call_args[0][0],
+                         ['/usr/bin/pdftoppm', '-f', '7', '-l', '7', '-r',
+                          '50', self.filename])
+
+    @mock.patch('file_metadata.application.document_file.which',
+                side_effect=lambda cmd: '/usr/bin/' + cmd)
+    @mock.patch('file_metadata.application.document_file.subprocess')
+    def test_render_large_page(self, mock_subprocess, mock_which):
+        mock_subprocess.check_output.return_value = (
+            b'Page    7 size: 7200 x 3600 pts\n')
+        page = numpy.zeros((5, 10, 3), numpy.uint8)
+        proc = mock_subprocess.Popen.return_value
+        proc.communicate.return_value = (ppm(page), b'')
+        proc.returncode = 0
+        with DocumentFile(self.filename, document_dpi=100,
+                          document_max_pixels=200 * 100) as uut:
+            self.assertEqual(uut.page_size(7), (100, 50))
+            self.assertEqual(uut.render_page(7).shape, (5, 10, 3))
+        self.assertEqual(mock_subprocess.Popen.call_args[0][0],
+                         ['/usr/bin/pdftoppm', '-f', '7', '-l', '7',
+                          '-scale-to', '200', self.filename])
+
+    def test_iter_pages_window(self):
+        rendered = []
+
+        def render_page(page):
+            rendered.append(page)
+            return numpy.zeros((4, 4, 3), numpy.uint8)
+
+        with DocumentFile(self.filename, document_render_processes=2) as uut:
+            with mock.patch.object(DocumentFile, 'render_page',
+                                   side_effect=render_page):
+                pages = uut.iter_pages(range(1, 101))
+                self.assertEqual(next(pages)[0], 1)
+                self.assertEqual(next(pages)[0], 2)
+                pages.close()
+        # Only the pages taken and the pages in the pool were rendered.
+        self.assertLessEqual(len(rendered), 4)
+
+    @mock.patch('file_metadata.application.document_file.which',
+                return_value=None)
+    def test_no_tools(self, mock_which):
+        with DocumentFile(self.filename) as uut:
+            self.assertEqual(uut.analyze_pages(), {})
+
+    def test_analyze_pages(self):
+        pages = {1: numpy.full((40, 30, 3), 255, numpy.uint8),
+                 50: numpy.zeros((40, 30, 3), numpy.uint8),
+                 100: numpy.full((40, 30, 3), 255, numpy.uint8)}
+        with DocumentFile(self.filename, document_sample_pages=1,
+                          document_page_analyzers=('analyze_color_info',)
+                          ) as uut:
+            with mock.patch.object(DocumentFile, '_num_pages',
+                                   return_value=100), \
+                    mock.patch.object(DocumentFile, 'render_page',
+                                      side_effect=pages.get) as mock_render:
+                data = uut.analyze_pages()
+        self.assertEqual(sorted(call[0][0] for call in
+                                mock_render.call_args_list), [1, 50, 100])
+        self.assertEqual(data['Document:NumPages'], 100)
+        self.assertEqual(data['Document:SampledPages'], 3)
+        self.assertEqual([page['Page'] for page in data['Document:Pages']],
+                         [1, 50, 100])
+        first_page = data['Document:Pages'][0]
+        self.assertEqual(data['Document:ClosestLabeledColor'],
+                         first_page['Color:ClosestLabeledColor'])
@@ -2,3 +2,96 @@
 
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
+
+import os
+import tempfile
+import wave
+
+import numpy
+
+from file_metadata.audio.audio_file import AudioFile
+from file_metadata.audio.features import AudioFeatures
+from tests import fetch_file, mock, unittest
+
+
+def write_wav(filename, samples, sample_rate=8000):
+    wav = wave.open(filename, 'wb')
+    wav.setparams((samples.shape[1], 2, sample_rate, 0, 'NONE',
+                   'not compressed'))
+    wav.writeframes(samples.astype('<i2').tobytes())
+    wav.close()
+
+
+class AudioFeaturesTest(unittest.TestCase):
+
+    def test_chunks(self):
+        random = numpy.random.RandomState(0)
+        samples = (random.randn(50000, 2) * 3000).astype(numpy.int16)
+        samples[:10000] = 0
+        whole = AudioFeatures(8000)
+        whole.update(samples)
+        chunked = AudioFeatures(8000)
+        for start in range(0, len(samples), 999):
+            chunked.update(samples[start:start + 999])
+        whole, chunked = whole.result(), chunked.result()
+        self.assertEqual(sorted(whole), sorted(chunked))
+        for key in whole:
+            self.assertAlmostEqual(whole[key], chunked[key], places=6)
+        self.assertAlmostEqual(whole['Audio:SilenceRatio'], 0.2, places=1)
+
+    def test_silence(self):
+        features = AudioFeatures(8000)
+        features.update(numpy.zeros((8192, 1), numpy.int16))
+        self.assertEqual(features.result(), {'Audio:ClippingRatio': 0,
+                                             'Audio:SilenceRatio': 1})
+        self.assertEqual(AudioFeatures(8000).result(), {})
+
+
+class AudioFileFeaturesTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_tone(self):
+        time = numpy.arange(8000 * 5) / 8000
+        write_wav(self.filename,
+                  numpy.sin(2 * numpy.pi * 1000 * time)[:, None] * 16384)
+        with AudioFile(self.filename) as uut:
+            data = uut.analyze_audio_features()
+        self.assertAlmostEqual(data['Audio:SpectralCentroidMean'], 1000,
+                               delta=50)
+        self.assertAlmostEqual(data['Audio:PeakLevel'], -6, delta=0.1)
+        self.assertAlmostEqual(data['Audio:Loudness'], -9, delta=0.1)
+        self.assertEqual(data['Audio:ClippingRatio'], 0)
+        self.assertEqual(data['Audio:SilenceRatio'], 0)
+
+    def test_clipping(self):
+        time = numpy.arange(8000 * 5) / 8000
+        tone = numpy.sin(2 * numpy.pi * 1000 * time) * 40000
+        write_wav(self.filename, numpy.clip(tone, -32768, 32767)[:, None])
+        with AudioFile(self.filename) as uut:
+            data = uut.analyze_audio_features()
+        self.assertAlmostEqual(data['Audio:PeakLevel'], 0, places=3)
+        self.assertGreater(data['Audio:ClippingRatio'], 0.2)
+
+    def test_max_duration(self):
+        write_wav(self.filename, numpy.ones((8000 * 5, 2)))
+        with AudioFile(self.filename, audio_max_duration=2) as uut:
+            chunks = list(uut.iter_pcm(8000, 2, max_duration=2,
+                                       chunk_frames=3000))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 16000)
+        self.assertEqual(max(len(chunk) for chunk in chunks), 3000)
+        self.assertEqual(chunks[0].shape[1], 2)
+
+    def test_noise(self):
+        with AudioFile(fetch_file('noise.wav')) as uut:
+            with mock.patch('file_metadata.audio.audio_file.subprocess'
+                            ) as mock_subprocess:
+                data = uut.analyze_audio_features()
+            self.assertFalse(mock_subprocess.Popen.called)
+        self.assertAlmostEqual(data['Audio:Loudness'], -4.8, delta=0.5)
+        self.assertEqual(data['Audio:SilenceRatio'], 0)
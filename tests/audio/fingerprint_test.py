@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import os
+import shutil
+import tempfile
+import timeit
+
+import numpy
+
+from file_metadata.audio.audio_file import AudioFile
+from file_metadata.audio.fingerprint import FingerprintIndex
+from tests import mock, unittest, write_melody
+
+
+class FingerprintTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.files = {}
+        for name, kwargs in (
+                ('original', {'seed': 1, 'channels': 2}),
+                ('converted', {'seed': 1, 'sample_rate': 22050, 'gain': 0.2,
+                               'noise': 0.05}),
+                ('trimmed', {'seed': 1, 'sample_rate': 48000, 'start': 3,
+                             'duration': 5}),
+                ('other', {'seed': 2})):
+            cls.files[name] = os.path.join(cls.directory, name + '.wav')
+            write_melody(cls.files[name], **kwargs)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def fingerprint(self, name):
+        with AudioFile(self.files[name]) as uut:
+            return uut.fetch('fingerprint')
+
+    def test_find(self):
+        index = FingerprintIndex()
+        index.add(self.fingerprint('original'), 'original', {'seed': 1})
+        index.add(self.fingerprint('other'), 'other', {'seed': 2})
+
+        found = index.find(self.fingerprint('converted'))
+        self.assertEqual([item['key'] for item in found], ['original'])
+        self.assertEqual(found[0]['data'], {'seed': 1})
+        self.assertAlmostEqual(found[0]['offset'], 0, delta=0.1)
+
+        found = index.find(self.fingerprint('trimmed'))
+        self.assertEqual([item['key'] for item in found], ['original'])
+        self.assertAlmostEqual(found[0]['offset'], 3, delta=0.1)
+        index.close()
+
+    def test_silence(self):
+        landmarks = FingerprintIndex().find(numpy.zeros((0, 2)))
+        self.assertEqual(landmarks, [])
+
+    def test_low_sample_rate(self):
+        for sample_rate in (4000, 8000):
+            path = os.path.join(self.directory, 'low.wav')
+            write_melody(path, seed=1, duration=5, sample_rate=sample_rate)
+            with AudioFile(path) as uut:
+                landmarks = uut.fetch('fingerprint')
+            self.assertGreater(len(landmarks), 0)
+            os.remove(path)
+
+    def test_analyze_with_duplicates(self):
+        path = os.path.join(self.directory, 'index.sqlite')
+        with AudioFile(self.files['original'], duplicate_index=path) as uut:
+            original = uut.analyze(methods=['analyze_audio_features'])
+        with AudioFile(self.files['converted'], duplicate_index=path) as uut:
+            with mock.patch.object(AudioFile, 'analyze_audio_features'
+                                   ) as mock_features:
+                data = uut.analyze(methods=['analyze_audio_features'])
+            self.assertFalse(mock_features.called)
+        self.assertEqual(data, original)
+        os.remove(path)
+
+    def test_find_speed(self):
+        landmarks = self.fingerprint('original')
+        index = FingerprintIndex()
+        rand = numpy.random.RandomState(0)
+        for i in range(200):
+            # Other recordings with as many (unrelated) landmarks.
+            index.add(numpy.stack((rand.randint(0, 1 << 24, len(landmarks)),
+                                   landmarks[:, 1]), axis=1),
+                      'file{0}'.format(i))
+        index.add(landmarks, 'original')
+
+        query = self.fingerprint('converted')
+        duration = min(timeit.repeat(lambda: index.find(query),
+                                     repeat=3, number=5)) / 5
+        print('FingerprintIndex.find with {0} recordings ({1} landmarks '
+              'each): {2:.6f}s'.format(len(index), len(landmarks), duration))
+        self.assertEqual(index.find(query)[0]['key'], 'original')
+        index.close()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import os
+import struct
+import tempfile
+import wave
+
+from file_metadata import containers
+from tests import fetch_file, ogg_page, theora_header, unittest
+
+
+def ebml(element_id, payload):
+    return element_id + b'\x01' + struct.pack('>Q', len(payload))[1:] + \
+        payload
+
+
+class ProbeTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def probe(self, data):
+        with open(self.filename, 'wb') as _file:
+            _file.write(data)
+        return containers.probe(self.filename)
+
+    def test_unknown(self):
+        self.assertIsNone(containers.probe(fetch_file('file.bin')))
+        self.assertIsNone(self.probe(b''))
+        self.assertIsNone(self.probe(b'OggS\x00'))
+
+    def test_wav(self):
+        wav = wave.open(self.filename, 'wb')
+        wav.setparams((2, 2, 22050, 0, 'NONE', 'not compressed'))
+        wav.writeframes(b'\x00' * 22050 * 2 * 2 * 3)
+        wav.close()
+        data = containers.probe(self.filename)
+        self.assertEqual(data['format'], {'format_name': 'wav',
+                                          'duration': '3.000000',
+                                          'nb_streams': '1'})
+        self.assertEqual(data['streams'][0]['codec_name'], 'pcm_s16le')
+        self.assertEqual(data['streams'][0]['channels'], 2)
+        self.assertEqual(data['streams'][0]['sample_rate'], '22050')
+
+    def test_wav_list_chunk(self):
+        fmt = struct.pack('<HHIIHH', 1, 1, 8000, 8000, 1, 8)
+        list_chunk = b'INFOISFT\x05\x00\x00\x00test\x00\x00'
+        data = self.probe(
+            b'RIFF\x00\x00\x00\x00WAVE' +
+            b'fmt ' + struct.pack('<I', len(fmt)) + fmt +
+            b'LIST' + struct.pack('<I', len(list_chunk) - 1) + list_chunk +
+            b'data' + struct.pack('<I', 4000) + b'\x80' * 4000)
+        self.assertEqual(data['format']['duration'], '0.500000')
+        self.assertEqual(data['streams'][0]['codec_name'], 'pcm_u8')
+        self.assertEqual(data['streams'][0]['sample_fmt'], 'u8')
+
+    def test_flac(self):
+        info = (b'\x00' * 10 +
+                struct.pack('>Q', (44100 << 44) | (1 << 41) | (23 << 36) |
+                            (44100 * 5)) + b'\x00' * 16)
+        flac = b'fLaC\x80\x00\x00\x22' + info
+        data = self.probe(b'ID3\x03\x00\x00\x00\x00\x00\x02\x00\x00' + flac)
+        self.assertEqual(data['format']['format_name'], 'flac')
+        self.assertEqual(data['format']['duration'], '5.000000')
+        self.assertEqual(data['streams'][0]['channels'], 2)
+        self.assertEqual(data['streams'][0]['sample_fmt'], 's32')
+
+    def test_ogg_vorbis(self):
+        vorbis = (b'\x01vorbis' + struct.pack('<IBI', 0, 1, 44100) +
+                  b'\x00' * 14)
+        data = self.probe(ogg_page(2, 0, 7, vorbis) +
+                          ogg_page(0, 44100, 7, b'\x00' * 100) +
+                          ogg_page(4, 88200, 7, b'\x00' * 100))
+        self.assertEqual(data['format']['format_name'], 'ogg')
+        self.assertEqual(data['format']['duration'], '2.000000')
+        self.assertEqual(data['streams'][0]['codec_name'], 'vorbis')
+        self.assertEqual(data['streams'][0]['sample_fmt'], 'fltp')
+
+    def test_ogg_opus(self):
+        opus = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 16000, 0, 0)
+        data = self.probe(ogg_page(2, 0, 1, opus) +
+                          ogg_page(4, 48000 + 312, 1, b'\x00' * 10))
+        self.assertEqual(data['format']['duration'], '1.000000')
+        self.assertEqual(data['streams'][0]['sample_rate'], '48000')
+
+    def test_ogg_skeleton_theora(self):
+        data = self.probe(ogg_page(2, 0, 1, b'fishead\x00' + b'\x00' * 56) +
+                          ogg_page(2, 0, 2, theora_header(320, 240, 25)) +
+                          ogg_page(4, 0, 1, b'') +
+                          ogg_page(4, (49 << 6) + 1, 2, b'\x00' * 10))
+        self.assertEqual(data['format']['nb_streams'], '2')
+        self.assertEqual(data['format']['duration'], '2.040000')
+        self.assertEqual(data['streams'][0]['codec_type'], 'data')
+        video = data['streams'][1]
+        self.assertEqual((video['codec_name'], video['width'],
+                          video['height'], video['avg_frame_rate']),
+                         ('theora', 320, 240, '25/1'))
+
+    def test_ogg_zero_rate(self):
+        vorbis = (b'\x01vorbis' + struct.pack('<IBI', 0, 1, 0) +
+                  b'\x00' * 14)
+        self.assertIsNone(self.probe(ogg_page(2, 0, 7, vorbis) +
+                                     ogg_page(4, 88200, 7, b'\x00' * 100)))
+        self.assertIsNone(self.probe(
+            ogg_page(2, 0, 1, theora_header(320, 240, 0)) +
+            ogg_page(4, (49 << 6) + 1, 1, b'\x00' * 10)))
+
+    def test_ogg_unknown_codec(self):
+        self.assertIsNone(self.probe(ogg_page(2, 0, 1, b'Speex   ' +
+                                              b'\x00' * 72)))
+
+    def test_matroska(self):
+        header = ebml(b'\x1a\x45\xdf\xa3', ebml(b'\x42\x82', b'webm'))
+        info = ebml(b'\x15\x49\xa9\x66',
+                    ebml(b'\x2a\xd7\xb1', struct.pack('>I', 1000000)) +
+                    ebml(b'\x44\x89', struct.pack('>d', 1500.0)))
+        video = ebml(b'\xae', ebml(b'\x83', b'\x01') +
+                     ebml(b'\x86', b'V_VP9') +
+                     ebml(b'\x23\xe3\x83', struct.pack('>I', 41708333)) +
+                     ebml(b'\xe0', ebml(b'\xb0', b'\x02\x80') +
+                          ebml(b'\xba', b'\x01\xe0')))
+        audio = ebml(b'\xae', ebml(b'\x83', b'\x02') +
+                     ebml(b'\x86', b'A_OPUS') +
+                     ebml(b'\xe1', ebml(b'\xb5', struct.pack('>f', 48000)) +
+                          ebml(b'\x9f', b'\x02')))
+        tracks = ebml(b'\x16\x54\xae\x6b', video + audio)
+        cluster = ebml(b'\x1f\x43\xb6\x75', b'\x00' * 100)
+        # A live stream with a Segment of unknown size.
+        data = self.probe(header + b'\x18\x53\x80\x67\x01' + b'\xff' * 7 +
+                          info + tracks + cluster)
+        self.assertEqual(data['format'], {'format_name': 'matroska,webm',
+                                          'duration': '1.500000',
+                                          'nb_streams': '2'})
+        video, audio = data['streams']
+        self.assertEqual((video['codec_name'], video['width'],
+                          video['height'], video['avg_frame_rate']),
+                         ('vp9', 640, 480, '24000/1001'))
+        self.assertEqual((audio['codec_name'], audio['channels'],
+                          audio['sample_rate']), ('opus', 2, '48000'))
+
+    def matroska(self, info, tracks):
+        header = ebml(b'\x1a\x45\xdf\xa3', ebml(b'\x42\x82', b'webm'))
+        return self.probe(header + ebml(b'\x18\x53\x80\x67', info + tracks))
+
+    def test_matroska_no_video_size(self):
+        info = ebml(b'\x15\x49\xa9\x66',
+                    ebml(b'\x44\x89', struct.pack('>d', 1500.0)))
+        video = ebml(b'\xae', ebml(b'\x83', b'\x01') +
+                     ebml(b'\x86', b'V_VP9') +
+                     ebml(b'\xe0', ebml(b'\xb0', b'\x02\x80')))
+        # ffprobe is used to find the height.
+        self.assertIsNone(self.matroska(info,
+                                        ebml(b'\x16\x54\xae\x6b', video)))
+
+    def test_matroska_unknown_size(self):
+        audio = ebml(b'\xae', ebml(b'\x83', b'\x02') +
+                     ebml(b'\x86', b'A_OPUS'))
+        info = ebml(b'\x15\x49\xa9\x66',
+                    ebml(b'\x44\x89', struct.pack('>d', 1500.0)))
+        tracks = ebml(b'\x16\x54\xae\x6b', audio)
+        unknown = b'\x01' + b'\xff' * 7
+        self.assertIsNotNone(self.matroska(info, tracks))
+        self.assertIsNone(self.matroska(b'\x15\x49\xa9\x66' + unknown +
+                                        info[12:], tracks))
+        self.assertIsNone(self.matroska(info, b'\x16\x54\xae\x6b' +
+                                        unknown + audio))
+
+
+class OggMediaTypeTest(unittest.TestCase):
+
+    def test_ogg_media_type(self):
+        vorbis = b'\x01vorbis' + b'\x00' * 23
+        skeleton = ogg_page(2, 0, 1, b'fishead\x00' + b'\x00' * 56)
+        self.assertIsNone(containers.ogg_media_type(b'RIFF'))
+        self.assertEqual(containers.ogg_media_type(
+            ogg_page(2, 0, 1, vorbis)), 'audio')
+        self.assertEqual(containers.ogg_media_type(
+            skeleton + ogg_page(2, 0, 2, vorbis) +
+            ogg_page(2, 0, 3, theora_header(64, 48, 25))), 'video')
+        self.assertEqual(containers.ogg_media_type(skeleton), 'unknown')
+        self.assertEqual(containers.ogg_media_type(
+            skeleton + ogg_page(2, 0, 2, vorbis)), 'audio')
+        # An unknown codec (VP8 here) may be a video.
+        self.assertEqual(containers.ogg_media_type(
+            ogg_page(2, 0, 1, vorbis) +
+            ogg_page(2, 0, 2, b'OVP80\x01\x01\x00' + b'\x00' * 18)),
+            'unknown')
@@ -3,11 +3,14 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
+import json
 import os
 import tempfile
 
-from file_metadata.generic_file import GenericFile, magic
-from tests import fetch_file, mock, unittest, which_sideeffect
+from file_metadata.generic_file import (GenericFile, exiftool_tag_pattern,
+                                        magic)
+from tests import (fetch_file, mock, ogg_page, theora_header, unittest,
+                   which_sideeffect)
 
 
 class DerivedFile(GenericFile):
@@ -25,6 +28,27 @@ class GenericFileTest(unittest.TestCase):
         uut = DerivedFile(fetch_file('ascii.txt'))
         self.assertEqual(uut.analyze(), {'test1': 'test1'})
 
+    def test_analyzers(self):
+        uut = GenericFile(fetch_file('ascii.txt'))
+        self.assertEqual(uut.analyzers(), ['analyze_exifdata',
+                                           'analyze_mimetype',
+                                           'analyze_os_stat'])
+        self.assertEqual(uut.analyzers(methods=['analyze_each',
+                                                'analyze_os_stat']),
+                         ['analyze_os_stat'])
+
+    def test_analyze_precomputed(self):
+        uut = DerivedFile(fetch_file('ascii.txt'))
+        data = GenericFile.analyze(
+            uut, prefix='analyze_test',
+            precomputed={'analyze_test1': {'test1': 'cached'}})
+        self.assertEqual(data, {'test1': 'cached'})
+
+    def test_analyze_each(self):
+        uut = DerivedFile(fetch_file('ascii.txt'))
+        self.assertEqual(uut.analyze_each(prefix='analyze_test'),
+                         {'analyze_test1': {'test1': 'test1'}})
+
     def test_file_close(self):
         uut = GenericFile(fetch_file('ascii.txt'))
         fd, name = tempfile.mkstemp(
@@ -127,6 +151,133 @@ class GenericFileExiftoolTest(unittest.TestCase):
         self.assertIn('Éclipse', data['XMP:Description'])
 
 
+class GenericFileSelectiveExiftoolTest(unittest.TestCase):
+
+    EXIF = {'SourceFile': 'ascii.txt', 'File:FileType': 'TXT',
+            'EXIF:Model': 'Camera', 'EXIF:GPSLatitude': '34 deg',
+            'XMP:GPSLongitude': '135 deg', 'ICC_Profile:ProfileCMMType': 'x'}
+
+    def setUp(self):
+        patcher = mock.patch('file_metadata.generic_file.subprocess')
+        self.mock_subprocess = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_subprocess.check_output.side_effect = self.check_output
+        patcher = mock.patch('file_metadata.generic_file.which',
+                             return_value='exiftool')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check_output(self, command):
+        tags = [arg[1:] for arg in command[3:-1]
+                if not arg.startswith('-fast')]
+        pattern = exiftool_tag_pattern(tags)
+        data = dict((key, val) for key, val in self.EXIF.items()
+                    if key == 'SourceFile' or not tags or pattern.match(key))
+        return json.dumps([data]).encode('utf-8')
+
+    def commands(self):
+        return [args[0][1:-1] for args, _ in
+                self.mock_subprocess.check_output.call_args_list]
+
+    def test_tag_pattern(self):
+        pattern = exiftool_tag_pattern(('EXIF:GPS*', 'model', 'XMP:all'))
+        self.assertTrue(pattern.match('EXIF:GPSLatitude'))
+        self.assertTrue(pattern.match('EXIF:Model'))
+        self.assertTrue(pattern.match('XMP:Description'))
+        self.assertFalse(pattern.match('XMP-exif:GPSLatitude'))
+        self.assertFalse(pattern.match('Composite:GPSLatitude'))
+        self.assertFalse(pattern.match('EXIF:ModelName'))
+
+    def test_subset_runs_all_tags(self):
+        uut = GenericFile(fetch_file('ascii.txt'))
+        data = uut.exiftool(tags=('EXIF:GPS*', 'XMP:GPS*'))
+        self.assertEqual(data, {'EXIF:GPSLatitude': '34 deg',
+                                'XMP:GPSLongitude': '135 deg'})
+        # Without the exiftool_tags config, all the tags are fetched at once
+        # to be used for the later calls.
+        self.assertEqual(uut.exiftool(), self.EXIF)
+        self.assertEqual(uut.exiftool(tags=('Model', 'File:all')),
+                         {'EXIF:Model': 'Camera', 'File:FileType': 'TXT'})
+        self.assertEqual(self.commands(), [['-G', '-j']])
+
+    def test_profile(self):
+        uut = GenericFile(fetch_file('ascii.txt'),
+                          exiftool_tags=('EXIF:Model',))
+        self.assertEqual(uut.exiftool(tags=('EXIF:GPS*',)),
+                         {'EXIF:GPSLatitude': '34 deg'})
+        self.assertEqual(uut.analyze_exifdata(), {'EXIF:Model': 'Camera'})
+        self.assertEqual(self.commands(), [
+            ['-G', '-j', '-EXIF:GPS*', '-EXIF:Model', '-File:FileType',
+             '-File:MIMEType']])
+
+    def test_profile_not_used_for_all_tags(self):
+        uut = GenericFile(fetch_file('ascii.txt'),
+                          exiftool_tags=('EXIF:Model',))
+        uut.exiftool()
+        uut.options['exiftool_tags'] = None
+        self.assertEqual(uut.exiftool(), self.EXIF)
+        self.assertEqual(self.commands()[-1], ['-G', '-j'])
+
+    def test_config(self):
+        uut = GenericFile(fetch_file('ascii.txt'), exiftool_fast=2,
+                          exiftool_tags=('EXIF:Model',))
+        self.assertEqual(uut.analyze_exifdata(), {'EXIF:Model': 'Camera'})
+        self.assertEqual(self.commands(), [
+            ['-G', '-j', '-fast2', '-EXIF:Model', '-File:FileType',
+             '-File:MIMEType']])
+
+    def test_fast(self):
+        uut = GenericFile(fetch_file('ascii.txt'), exiftool_fast=1)
+        self.assertEqual(uut.exiftool(), self.EXIF)
+        self.assertEqual(self.commands(), [['-G', '-j', '-fast']])
+        uut.options['exiftool_fast'] = 2
+        uut.exiftool()
+        self.assertEqual(len(self.commands()), 1)
+        # Data read with -fast may not have the tags at the end of the file.
+        uut.options['exiftool_fast'] = 0
+        uut.exiftool()
+        self.assertEqual(self.commands()[-1], ['-G', '-j'])
+
+
+class GenericFileOggTypeTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.ogg')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def write(self, *packets):
+        with open(self.filename, 'wb') as _file:
+            for serial, packet in enumerate(packets):
+                _file.write(ogg_page(2, 0, serial, packet))
+
+    @mock.patch.object(GenericFile, 'exiftool')
+    def test_is_type_ogg(self, mock_exiftool):
+        self.write(b'OpusHead' + b'\x00' * 11)
+        uut = GenericFile(self.filename)
+        self.assertTrue(uut.is_type('ogg'))
+        self.assertFalse(uut.is_type('ogv'))
+        self.assertFalse(mock_exiftool.called)
+
+    @mock.patch.object(GenericFile, 'exiftool')
+    def test_is_type_ogv(self, mock_exiftool):
+        self.write(b'\x01vorbis' + b'\x00' * 23,
+                   theora_header(64, 48, 25))
+        uut = GenericFile(self.filename)
+        self.assertFalse(uut.is_type('ogg'))
+        self.assertTrue(uut.is_type('ogv'))
+        self.assertFalse(mock_exiftool.called)
+
+    @mock.patch.object(GenericFile, 'exiftool')
+    def test_is_type_not_ogg(self, mock_exiftool):
+        uut = GenericFile(fetch_file('ascii.txt'))
+        self.assertFalse(uut.is_type('ogg'))
+        self.assertFalse(uut.is_type('ogv'))
+        self.assertFalse(mock_exiftool.called)
+
+
 class GenericFileCreateTest(unittest.TestCase):
 
     def test_create_enter_exit(self):
@@ -139,6 +290,13 @@ class GenericFileCreateTest(unittest.TestCase):
             self.assertTrue(os.path.exists(name))
         self.assertFalse(os.path.exists(name))
 
+    @mock.patch.object(GenericFile, 'mime')
+    def test_create_magic_numbers(self, mock_mime):
+        from file_metadata.audio.audio_file import AudioFile
+        uut = GenericFile.create(fetch_file('noise.wav'))
+        self.assertIs(type(uut), AudioFile)
+        self.assertFalse(mock_mime.called)
+
     def test_create_image_file(self):
         from file_metadata.image.image_file import ImageFile
         for fname in ['red.png']:
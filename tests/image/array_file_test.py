@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import os
+import tempfile
+
+import numpy
+from PIL import Image
+
+from file_metadata.image.array_file import ArrayImageFile
+from file_metadata.image.image_file import ImageFile
+from tests import unittest
+
+
+class ArrayImageFileTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.image = (random.rand(60, 80, 3) * 255).astype(numpy.uint8)
+        fd, self.filename = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        Image.fromarray(self.image).save(self.filename)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_color_info(self):
+        with ImageFile(self.filename) as uut:
+            expected = uut.analyze_color_info()
+        with ArrayImageFile('frame', array=self.image) as uut:
+            self.assertIs(uut.fetch('ndarray'), self.image)
+            self.assertEqual(uut.fetch('image_header')['width'], 80)
+            self.assertEqual(uut.analyze_color_info(), expected)
+
+    def test_filename_raster(self):
+        with ArrayImageFile('frame', array=self.image) as uut:
+            name = uut.fetch('filename_raster')
+            self.assertTrue(numpy.array_equal(
+                numpy.asarray(Image.open(name)), self.image))
+        self.assertFalse(os.path.exists(name))
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import os
+import tempfile
+import timeit
+
+import numpy
+from PIL import Image
+
+from file_metadata.image.backends import (BACKENDS, decode_image,
+                                          pil_frame_to_ndarray)
+from file_metadata.image.image_file import ImageFile
+from tests import fetch_file, mock, unittest
+
+
+class DecodeImageTest(unittest.TestCase):
+
+    def test_pillow_backend(self):
+        with ImageFile(fetch_file('ball.png'),
+                       decode_backends=('pillow',)) as uut:
+            self.assertEqual(uut.fetch('ndarray').shape, (226, 226, 4))
+
+    def test_animated_image(self):
+        with ImageFile(fetch_file('animated.gif')) as uut:
+            self.assertEqual(uut.fetch('ndarray').ndim, 4)
+
+    def test_unknown_backend(self):
+        with ImageFile(fetch_file('ball.png')) as uut:
+            array = decode_image(uut.fetch('filename'), uut.fetch('pillow'),
+                                 ('unknown_backend',))
+            self.assertEqual(array.shape, (226, 226, 4))
+
+    def test_single_open(self):
+        with ImageFile(fetch_file('ball.png')) as uut:
+            uut.fetch('ndarray')
+            self.assertTrue(uut.is_type('alpha'))
+            self.assertEqual(len(uut.closables), 1)
+
+    def test_pillow_backend_not_loaded(self):
+        random = numpy.random.RandomState(0)
+        fd, name = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        self.addCleanup(os.remove, name)
+        Image.fromarray((random.rand(20, 30, 3) * 255).astype(
+            numpy.uint8)).quantize(16).save(name)
+
+        pillow_img = Image.open(name)
+        try:
+            with mock.patch.object(pillow_img, 'load',
+                                   wraps=pillow_img.load) as mock_load:
+                array = BACKENDS['pillow'].decode(name, pillow_img)
+            # Pillow does not keep a decoded copy of the pixels.
+            self.assertFalse(mock_load.called)
+        finally:
+            pillow_img.close()
+        self.assertEqual(array.shape, (20, 30, 3))
+
+
+class MemmapBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.pillow_img = Image.fromarray(
+            (random.rand(30, 41, 4) * 255).astype(numpy.uint8))
+        self.filenames = []
+
+    def tearDown(self):
+        for name in self.filenames:
+            os.remove(name)
+
+    def save(self, pillow_img, suffix, **kwargs):
+        fd, name = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        pillow_img.save(name, **kwargs)
+        self.filenames.append(name)
+        return name
+
+    def test_uncompressed(self):
+        backend = BACKENDS['mmap']
+        for mode, suffix, kwargs in (('RGB', '.bmp', {}),
+                                     ('RGBA', '.bmp', {}),
+                                     ('L', '.bmp', {}),
+                                     ('RGB', '.ppm', {}),
+                                     ('L', '.pgm', {}),
+                                     ('RGB', '.tif', {}),
+                                     ('RGBA', '.tif', {}),
+                                     # Multiple strips of 8 rows
+                                     ('L', '.tif', {'tiffinfo': {278: 8}})):
+            name = self.save(self.pillow_img.convert(mode), suffix, **kwargs)
+            with ImageFile(name, decode_backends=('mmap',)) as uut:
+                self.assertTrue(backend.can_decode(uut.fetch('pillow')))
+                array = uut.fetch('ndarray')
+                self.assertFalse(array.flags.owndata)
+                self.assertFalse(array.flags.writeable)
+                numpy.testing.assert_array_equal(
+                    array, pil_frame_to_ndarray(Image.open(name)))
+
+    def test_compressed(self):
+        backend = BACKENDS['mmap']
+        for mode, suffix, kwargs in (('RGB', '.tif',
+                                      {'compression': 'tiff_lzw'}),
+                                     ('RGB', '.png', {}),
+                                     ('P', '.tif', {})):
+            name = self.save(self.pillow_img.convert(mode), suffix, **kwargs)
+            self.assertFalse(backend.can_decode(Image.open(name)))
+
+
+class DecodeBackendBenchmark(unittest.TestCase):
+    """
+    Compare the available backends with Pillow. The time taken by every
+    backend is printed (Use ``pytest -s`` to see it).
+    """
+
+    def benchmark(self, filename, repeat=3):
+        with ImageFile(fetch_file(filename)) as uut:
+            reference = decode_image(uut.fetch('filename'),
+                                     uut.fetch('pillow'), ('pillow',))
+        for name, backend in BACKENDS.items():
+            with ImageFile(fetch_file(filename),
+                           decode_backends=(name,)) as uut:
+                pillow_img = uut.fetch('pillow')
+                if not (backend.is_available() and
+                        backend.can_decode(pillow_img)):
+                    continue
+                array = decode_image(uut.fetch('filename'), pillow_img,
+                                     (name,))
+                duration = min(timeit.repeat(
+                    lambda: decode_image(uut.fetch('filename'), pillow_img,
+                                         (name,)),
+                    repeat=repeat, number=1))
+            print('{0} - {1}: {2:.4f}s'.format(filename, name, duration))
+
+            self.assertEqual(array.shape, reference.shape)
+            self.assertEqual(array.dtype, reference.dtype)
+            # Different versions of libjpeg can round slightly differently.
+            self.assertLess(numpy.abs(array.astype(float) - reference).mean(),
+                            1)
+
+    def test_benchmark_jpeg(self):
+        self.benchmark('mona_lisa.jpg')
+
+    def test_benchmark_png(self):
+        self.benchmark('wikimedia_logo.png')
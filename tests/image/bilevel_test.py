@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import os
+import tempfile
+
+import numpy
+from PIL import Image
+
+from file_metadata.image.bilevel import PackedImage, popcount
+from file_metadata.image.image_file import ImageFile
+from file_metadata.image.tiling import detect_tiled
+from tests import mock, unittest
+
+
+def random_bilevel(height, width, seed=0):
+    random = numpy.random.RandomState(seed)
+    return Image.fromarray(
+        (random.rand(height, width) > 0.3).astype(numpy.uint8) * 255
+    ).convert('1')
+
+
+class PackedImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pillow_img = random_bilevel(37, 53)
+        self.packed = PackedImage.from_pillow(self.pillow_img)
+        self.pixels = numpy.asarray(self.pillow_img.convert('L'))
+
+    def test_expand(self):
+        self.assertEqual(self.packed.shape, (37, 53))
+        numpy.testing.assert_array_equal(numpy.asarray(self.packed),
+                                         self.pixels)
+        self.assertEqual(self.packed.count(), (self.pixels == 255).sum())
+
+    def test_slices(self):
+        for rows, cols in ((slice(3, 20), slice(5, 40)),
+                           (slice(0, 10), slice(13, 14)),
+                           (slice(5, None), slice(17, 53)),
+                           (slice(2, 9), slice(8, 16)),
+                           (slice(0, 5), slice(50, 60))):
+            numpy.testing.assert_array_equal(self.packed[rows, cols],
+                                             self.pixels[rows, cols])
+
+    def test_columns(self):
+        bits = self.packed.columns(3, 30)
+        self.assertEqual(bits.shape, (37, 4))
+        self.assertEqual(popcount(bits),
+                         (self.pixels[:, 3:30] == 255).sum())
+
+    def test_reduce(self):
+        numpy.testing.assert_allclose(
+            self.packed.reduce(4),
+            self.pixels[:36, :52].reshape(9, 4, 13, 4).mean(axis=(1, 3)))
+
+    def test_detect_tiled(self):
+        def detect(tile):
+            # Tiles are expanded to uint8 arrays.
+            self.assertIsInstance(tile, numpy.ndarray)
+            height, width = tile.shape
+            return [{'bounding box': {'left': 0, 'top': 0, 'width': width,
+                                      'height': height}}]
+
+        found = detect_tiled(self.packed, detect, tile_size=16,
+                             is_duplicate=lambda det1, det2: False)
+        self.assertEqual(len(found), 12)
+
+
+class ImageFileBilevelTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.tif')
+        os.close(fd)
+        random_bilevel(120, 150).save(self.filename, compression='group4')
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_packed_bits(self):
+        with ImageFile(self.filename) as uut:
+            self.assertIsNone(uut.fetch('packed_bits'))
+        with ImageFile(self.filename, bilevel_packed=True) as uut:
+            with mock.patch.object(PackedImage, 'from_pillow',
+                                   wraps=PackedImage.from_pillow) as mock_pack:
+                self.assertEqual(uut.fetch('packed_bits').shape, (120, 150))
+            # The cached Pillow image does not keep the decoded pixels.
+            self.assertIsNot(mock_pack.call_args[0][0], uut.fetch('pillow'))
+
+    def test_bilevel_analyzers(self):
+        with ImageFile(self.filename) as uut:
+            expected = uut.analyze_color_info()
+            expected.update(uut.analyze_stereo_card())
+        with ImageFile(self.filename, bilevel_packed=True) as uut:
+            with mock.patch('file_metadata.image.image_file.decode_image'
+                            ) as mock_decode:
+                data = uut.analyze_color_info()
+                data.update(uut.analyze_stereo_card())
+            self.assertFalse(mock_decode.called)
+        self.assertEqual(sorted(data), sorted(expected))
+        for key, value in expected.items():
+            if isinstance(value, tuple):
+                numpy.testing.assert_allclose(data[key], value)
+            elif isinstance(value, float):
+                self.assertAlmostEqual(data[key], value)
+            else:
+                self.assertEqual(data[key], value)
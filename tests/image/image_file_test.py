@@ -3,14 +3,28 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
+import os
+import tempfile
+import timeit
+
+import numpy
 import pytest
+from PIL import Image
 
+from file_metadata.generic_file import GenericFile
 from file_metadata.image.image_file import ImageFile
-from tests import fetch_file, unittest
+from tests import fetch_file, mock, unittest
 
 
 class ImageFileTest(unittest.TestCase):
 
+    def test_analyzers(self):
+        analyzers = ImageFile('image.png').analyzers()
+        self.assertIn('analyze_color_info', analyzers)
+        for helper in ('analyze_batch', 'analyze_each', 'analyze_files',
+                       'analyze_with_duplicates'):
+            self.assertNotIn(helper, analyzers)
+
     def test_ndarray_read(self):
         _file = ImageFile(fetch_file('ball.png'))
         self.assertEqual(_file.fetch('ndarray').shape, (226, 226, 4))
@@ -19,6 +33,30 @@ class ImageFileTest(unittest.TestCase):
         _file = ImageFile(fetch_file('huge.png'))
         self.assertEqual(_file.fetch('ndarray').shape, (0,))
 
+    def test_image_header(self):
+        with ImageFile(fetch_file('ball.png')) as uut:
+            header = uut.fetch('image_header')
+            self.assertEqual((header['width'], header['height']), (226, 226))
+            self.assertEqual(header['mode'], 'RGBA')
+            self.assertEqual(header['bit_depth'], 8)
+            self.assertEqual(header['frames'], 1)
+            self.assertFalse(header['palette'])
+            self.assertTrue(uut.is_type('alpha'))
+
+    def test_image_header_none(self):
+        # Decompression bombs have no header.
+        with ImageFile('image.png') as uut:
+            with mock.patch.object(ImageFile, 'fetch', return_value=None) \
+                    as mock_fetch:
+                self.assertFalse(uut.is_type('alpha'))
+            mock_fetch.assert_called_once_with('image_header')
+
+    def test_image_header_animated(self):
+        with ImageFile(fetch_file('animated.gif')) as uut:
+            header = uut.fetch('image_header')
+            self.assertGreater(header['frames'], 1)
+            self.assertTrue(header['palette'])
+
 
 class ImageFileGeoLocation(unittest.TestCase):
 
@@ -175,6 +213,134 @@ class ImageFileColorInfoTest(unittest.TestCase):
             self.assertEqual(int(data['Color:MeanSquareErrorFromGrey']), 83)
 
 
+class ImageFileBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.filenames = []
+        for i in range(6):
+            image = (random.rand(24, 32, 3) * 255).astype(numpy.uint8)
+            image[:8] = 10 * i
+            if i % 2:
+                image = image[..., 1]  # Greyscale icons
+            fd, name = tempfile.mkstemp(suffix='.png')
+            os.close(fd)
+            Image.fromarray(image).save(name)
+            self.filenames.append(name)
+
+    def tearDown(self):
+        for name in self.filenames:
+            os.remove(name)
+
+    def test_color_info_batch(self):
+        for names in (self.filenames[::2], self.filenames[1::2]):
+            files = [ImageFile(name) for name in names]
+            expected = [_file.analyze_color_info() for _file in files]
+            data = ImageFile.color_info_batch(files)
+            for _file in files:
+                _file.close()
+            self.assertEqual(len(data), len(expected))
+            for info, expected_info in zip(data, expected):
+                self.assertEqual(sorted(info), sorted(expected_info))
+                for key, value in expected_info.items():
+                    if isinstance(value, float):
+                        self.assertAlmostEqual(info[key], value)
+                    else:
+                        self.assertEqual(info[key], value)
+
+    def test_batch_key(self):
+        with ImageFile(self.filenames[0]) as uut:
+            self.assertEqual(uut.batch_key(), (24, 32, 3))
+        with ImageFile(self.filenames[0], batch_max_size=16) as uut:
+            self.assertIsNone(uut.batch_key())
+
+    def test_analyze_files(self):
+        results = list(GenericFile.analyze_files(self.filenames,
+                                                 batch_size=4))
+        self.assertEqual([name for name, _ in results], self.filenames)
+        for name, data in results:
+            with ImageFile(name) as uut:
+                self.assertEqual(data['Color:AverageRGB'],
+                                 uut.analyze_color_info()['Color:AverageRGB'])
+
+
+    def test_analyze_files_skip_errors(self):
+        analyze = ImageFile.analyze
+
+        def analyze_or_fail(_file, **kwargs):
+            if _file.filename == self.filenames[2]:
+                raise ValueError('Broken file')
+            return analyze(_file, methods=['analyze_color_info'], **kwargs)
+
+        with mock.patch.object(ImageFile, 'analyze', autospec=True,
+                               side_effect=analyze_or_fail):
+            results = list(GenericFile.analyze_files(
+                self.filenames, batch_size=4, fetch_keys=('image_header',),
+                skip_errors=True))
+            with self.assertRaises(ValueError):
+                list(GenericFile.analyze_files(self.filenames))
+
+        self.assertEqual([name for name, _, _ in results], self.filenames)
+        for name, data, fetched in results:
+            self.assertEqual(fetched['image_header']['width'], 32)
+            if name == self.filenames[2]:
+                self.assertIsNone(data)
+            else:
+                self.assertIn('Color:AverageRGB', data)
+
+class ImageFilePaletteColorInfoTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        rgb = Image.fromarray((random.rand(40, 50, 3) * 255).astype(
+            numpy.uint8))
+        grey = Image.fromarray(numpy.asarray(rgb)[..., 0])
+        self.filenames = []
+        for pillow_img, suffix, kwargs in (
+                (rgb.quantize(64), '.gif', {}),
+                (rgb.quantize(64), '.gif', {'transparency': 3}),
+                (rgb.quantize(64), '.png',
+                 {'transparency': b'\x00\x80' + b'\xff' * 10}),
+                (grey.convert('P'), '.png', {})):
+            fd, name = tempfile.mkstemp(suffix=suffix)
+            os.close(fd)
+            pillow_img.save(name, **kwargs)
+            self.filenames.append(name)
+
+    def tearDown(self):
+        for name in self.filenames:
+            os.remove(name)
+
+    def test_palette_color_info(self):
+        fd, decoded_name = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        try:
+            for name in self.filenames:
+                with ImageFile(name) as uut:
+                    self.assertEqual(uut.fetch('image_header')['mode'], 'P')
+                    data = uut.analyze_color_info()
+                    Image.fromarray(uut.fetch('ndarray')).save(decoded_name)
+                with ImageFile(decoded_name) as uut:
+                    expected = uut.analyze_color_info()
+                self.assertEqual(sorted(data), sorted(expected))
+                for key, value in expected.items():
+                    if isinstance(value, tuple):
+                        numpy.testing.assert_allclose(data[key], value)
+                    elif isinstance(value, float):
+                        self.assertAlmostEqual(data[key], value)
+                    else:
+                        self.assertEqual(data[key], value)
+        finally:
+            os.remove(decoded_name)
+
+    def test_palette_alpha(self):
+        with ImageFile(self.filenames[1]) as uut:
+            self.assertFalse(uut.is_type('alpha'))  # GIF transparency
+        with ImageFile(self.filenames[2]) as uut:
+            self.assertTrue(uut.is_type('alpha'))
+            self.assertTrue(uut.analyze_color_info()['Color:UsesAlpha'])
+
+
 class ImageFileFaceHAARCascadesTest(unittest.TestCase):
 
     def test_face_haarcascade_charlie_chaplin(self):
@@ -241,6 +407,65 @@ class ImageFileFaceLandmarksTest(unittest.TestCase):
         self.assertEqual(face['nose'], (325, 318))
         self.assertEqual(face['mouth'], (321, 338))
 
+    def test_facial_landmarks_reduced(self):
+        with ImageFile(fetch_file('mona_lisa.jpg'),
+                       face_detection_max_pixels=300 * 300) as uut:
+            data = uut.analyze_facial_landmarks(with_landmarks=True)
+        self.assertIn('dlib:Faces', data)
+        self.assertEqual(len(data['dlib:Faces']), 1)
+        face = data['dlib:Faces'][0]
+
+        # The landmarks are found in the full image.
+        self.assertEqual(len(face['eyes']), 2)
+        left_eye, right_eye = sorted(face['eyes'])
+        self.assertLess(numpy.abs(numpy.subtract(left_eye, (288, 252))).max(),
+                        5)
+        self.assertLess(
+            numpy.abs(numpy.subtract(right_eye, (361, 251))).max(), 5)
+        self.assertLess(
+            numpy.abs(numpy.subtract(face['nose'], (325, 318))).max(), 5)
+
+    def test_facial_landmarks_reduced_aspect_ratio(self):
+        # 1000x45 is reduced to 141x6, where the x and y scales differ.
+        fd, filename = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+        Image.new('RGB', (1000, 45)).save(filename)
+
+        class Rectangle(object):
+            def __init__(self, left, top, right, bottom):
+                self._box = left, top, right, bottom
+
+            def left(self):
+                return self._box[0]
+
+            def top(self):
+                return self._box[1]
+
+            def right(self):
+                return self._box[2]
+
+            def bottom(self):
+                return self._box[3]
+
+            def width(self):
+                return self._box[2] - self._box[0] + 1
+
+            def height(self):
+                return self._box[3] - self._box[1] + 1
+
+        with mock.patch('file_metadata.image.image_file.dlib') as mock_dlib:
+            mock_dlib.rectangle = Rectangle
+            mock_dlib.get_frontal_face_detector().run.return_value = (
+                [Rectangle(10, 1, 19, 4)], [1.0], [0])
+            with ImageFile(filename,
+                           face_detection_max_pixels=30 * 30) as uut:
+                _, scales = uut.reduced_ndarray(30 * 30)
+                data = uut.analyze_facial_landmarks(with_landmarks=False)
+        self.assertEqual(scales, (1000 / 141, 45 / 6))
+        self.assertEqual(data['dlib:Faces'][0]['position'],
+                         {'left': 71, 'top': 8, 'width': 71, 'height': 30})
+
     def test_facial_landmarks_baby_face(self):
         _file = ImageFile(fetch_file('baby_face.jpg'))
         data = _file.analyze_facial_landmarks(with_landmarks=False)
@@ -259,6 +484,36 @@ class ImageFileFaceLandmarksTest(unittest.TestCase):
         self.assertEqual(data, {})
 
 
+class ImageFileFaceDetectionStrategyTest(unittest.TestCase):
+
+    def test_strategy_all(self):
+        with ImageFile(fetch_file('red.png')) as uut:
+            self.assertTrue(uut.face_detector_needed('dlib'))
+            self.assertTrue(uut.face_detector_needed('haar'))
+
+    def test_strategy_dlib_first_no_photo(self):
+        with ImageFile(fetch_file('red.png'),
+                       face_detection_strategy='dlib_first') as uut:
+            self.assertTrue(uut.face_detector_needed('dlib'))
+            self.assertFalse(uut.face_detector_needed('haar'))
+            self.assertEqual(uut.analyze_face_haarcascades(), {})
+
+    def test_strategy_haar_first_no_photo(self):
+        with ImageFile(fetch_file('barcode.png'),
+                       face_detection_strategy='haar_first') as uut:
+            self.assertFalse(uut.face_detector_needed('dlib'))
+            self.assertEqual(uut.analyze_facial_landmarks(), {})
+
+    def test_strategy_dlib_first_face(self):
+        with ImageFile(fetch_file('mona_lisa.jpg'),
+                       face_detection_strategy='dlib_first') as uut:
+            data = uut.analyze(methods=['analyze_face_haarcascades',
+                                        'analyze_facial_landmarks'])
+            self.assertEqual(len(data['dlib:Faces']), 1)
+            # The face found by dlib is not repeated by haarcascades.
+            self.assertEqual(data.get('OpenCV:Faces', []), [])
+
+
 class ImageFileBarcodeZXingTest(unittest.TestCase):
 
     def test_barcode_zxing_mona_lisa(self):
@@ -341,3 +596,65 @@ class ImageFileBarcodeZBarTest(unittest.TestCase):
                          'http://www.wikipedia.com')
         self.assertEqual(data['zbar:Barcodes'][0]['bounding box'],
                          {'width': 350, 'top': 9, 'height': 350, 'left': 7})
+
+    def test_barcode_zbar_tiled(self):
+        with ImageFile(fetch_file('qrcode.jpg')) as uut:
+            grey = uut.fetch('ndarray_grey')
+            height, width = grey.shape
+            # A large image with the QR code in the top left tile only
+            large = numpy.pad(grey, ((0, 3 * height), (0, 3 * width)),
+                              mode='constant', constant_values=255)
+            uut.options.update(zbar_tile_size=max(height, width) + 20,
+                               zbar_tile_overlap=max(height, width) // 2)
+            barcodes = uut._zbar_scan_tiled(large)
+            self.assertEqual(len(barcodes), 1)
+            self.assertEqual(barcodes[0]['data'], 'http://www.wikipedia.com')
+            self.assertEqual(barcodes[0]['bounding box'],
+                             {'width': 350, 'top': 9, 'height': 350,
+                              'left': 7})
+
+
+class ImageFileBarcodeLikelihoodReport(unittest.TestCase):
+    """
+    Report the barcode likelihood and the time taken to compute it for the
+    test files with and without barcodes (Use ``pytest -s`` to see it). This
+    is meant to help tune the ``barcode_min_likelihood`` config.
+    """
+    min_likelihood = 0.2
+    barcode_files = ('qrcode.jpg', 'barcode.png', 'datamatrix.png',
+                     'multibarcodes.png', 'vertical_barcode.jpg')
+    other_files = ('mona_lisa.jpg', 'baby_face.jpg', 'charlie_chaplin.jpg',
+                   'monkey_face.jpg', 'red.png', 'ball.png')
+
+    def likelihood(self, filename):
+        with ImageFile(fetch_file(filename)) as uut:
+            grey = uut.fetch('ndarray_grey')
+            duration = min(timeit.repeat(
+                lambda: uut.barcode_likelihood(grey), repeat=3, number=1))
+            score = uut.fetch('barcode_likelihood')
+        print('{0}: {1:.3f} in {2:.4f}s'.format(filename, score, duration))
+        return score >= self.min_likelihood
+
+    def test_report(self):
+        recall = [self.likelihood(name) for name in self.barcode_files]
+        skipped = [not self.likelihood(name) for name in self.other_files]
+        print('Recall: {0}/{1}, Skipped: {2}/{3}'.format(
+            sum(recall), len(recall), sum(skipped), len(skipped)))
+        self.assertTrue(all(recall))
+
+    def test_barcode_cascade(self):
+        with ImageFile(fetch_file('qrcode.jpg'), barcode_cascade=True) as uut:
+            self.assertIn('zbar:Barcodes', uut.analyze_barcode_zbar())
+            # zxing is skipped as zbar already found the barcode.
+            self.assertEqual(uut.analyze_barcode_zxing(), {})
+
+    def test_barcode_min_likelihood_default(self):
+        with ImageFile(fetch_file('qrcode.jpg')) as uut:
+            self.assertIsNone(uut.config('barcode_min_likelihood'))
+            self.assertTrue(uut.has_barcode_likelihood())
+
+    def test_barcode_min_likelihood(self):
+        with ImageFile(fetch_file('qrcode.jpg'),
+                       barcode_min_likelihood=1.1) as uut:
+            self.assertEqual(uut.analyze_barcode_zbar(), {})
+            self.assertEqual(uut.analyze_barcode_zxing(), {})
@@ -3,10 +3,17 @@
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
+import io
 import os
+import struct
+import tempfile
 
-from file_metadata.image.jpeg_file import JPEGFile
-from tests import fetch_file, unittest
+import numpy
+from PIL import Image
+
+from file_metadata.image.image_file import ImageFile
+from file_metadata.image.jpeg_file import CMYK_TAGS, JPEGFile
+from tests import fetch_file, mock, unittest
 
 
 class JPEGFileTest(unittest.TestCase):
@@ -22,6 +29,216 @@ class JPEGFileTest(unittest.TestCase):
         self.assertFalse(os.path.exists(name))
 
 
+    @mock.patch.object(JPEGFile, '_run_exiftool',
+                       return_value={'File:FileType': 'JPEG',
+                                     'XMP:ColorMode': 'RGB'})
+    def test_exiftool_single_run(self, mock_run):
+        with JPEGFile('image.jpg') as uut:
+            # The CMYK check of zxing runs before analyze_exifdata.
+            self.assertEqual(uut.exiftool(tags=CMYK_TAGS),
+                             {'XMP:ColorMode': 'RGB'})
+            self.assertIn('File:FileType', uut.analyze_exifdata())
+        with JPEGFile('image.jpg', exiftool_tags=('EXIF:Model',)) as uut:
+            uut.analyze_exifdata()
+            uut.exiftool(tags=CMYK_TAGS)
+            uut.exiftool(tags=('EXIF:GPS*',))
+        self.assertEqual(mock_run.call_count, 2)
+
+
+class JPEGFileReducedTest(unittest.TestCase):
+
+    def test_reduced_ndarray(self):
+        with JPEGFile(fetch_file('mona_lisa.jpg')) as uut:
+            full = uut.fetch('ndarray')
+            reduced, (scalex, scaley) = uut.reduced_ndarray(100 * 100)
+            self.assertLessEqual(reduced.shape[0] * reduced.shape[1],
+                                 100 * 100)
+            self.assertEqual(reduced.shape[2], 3)
+            self.assertAlmostEqual(full.shape[1] / reduced.shape[1], scalex)
+            self.assertAlmostEqual(full.shape[0] / reduced.shape[0], scaley)
+
+    def test_reduced_ndarray_none(self):
+        with JPEGFile(fetch_file('mona_lisa.jpg')) as uut:
+            reduced, scales = uut.reduced_ndarray(None)
+            self.assertIs(reduced, uut.fetch('ndarray'))
+            self.assertEqual(scales, (1, 1))
+
+    def test_reduced_ndarray_aspect_ratio(self):
+        fd, filename = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+        Image.new('RGB', (1000, 45)).save(filename)
+        with JPEGFile(filename) as uut:
+            reduced, scales = uut.reduced_ndarray(30 * 30)
+        self.assertEqual(reduced.shape[:2], (6, 141))
+        self.assertEqual(scales, (1000 / 141, 45 / 6))
+
+
+class JPEGFileLumaTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.image = (random.rand(60, 80, 3) * 255).astype(numpy.uint8)
+        fd, self.filename = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_ndarray_luma(self):
+        Image.fromarray(self.image).save(self.filename)
+        with JPEGFile(self.filename) as uut:
+            with mock.patch('file_metadata.image.image_file.decode_image'
+                            ) as mock_decode:
+                luma = uut.fetch('ndarray_luma')
+            self.assertFalse(mock_decode.called)
+            self.assertEqual(luma.shape, (60, 80))
+            self.assertEqual(luma.dtype, numpy.uint8)
+            grey = uut.fetch('ndarray_grey').astype(int)
+            self.assertLess(numpy.abs(grey - luma).mean(), 10)
+
+    def test_ndarray_luma_rgb_encoded(self):
+        Image.fromarray(self.image).save(self.filename, keep_rgb=True)
+        with JPEGFile(self.filename) as uut:
+            if uut.fetch('pillow').info.get('adobe_transform') != 0:
+                self.skipTest('Pillow cannot write RGB encoded JPEGs.')
+            self.assertIs(uut.fetch('ndarray_luma'),
+                          uut.fetch('ndarray_grey'))
+
+
+class JPEGFileGreyAnalyzersTest(unittest.TestCase):
+    """
+    The analyzers should give the same data for JPEGs with JPEGFile (Which
+    can decode only the luma) as with ImageFile.
+    """
+
+    def setUp(self):
+        # Saturated color patches, where the luma and rgb2grey differ most.
+        colors = numpy.array([(255, 0, 0), (0, 255, 0), (0, 0, 255),
+                              (255, 255, 0), (255, 0, 255), (0, 255, 255)],
+                             dtype=numpy.uint8)
+        patches = numpy.repeat(numpy.arange(24) % 6, 16)
+        image = numpy.zeros((200, 384, 3), dtype=numpy.uint8)
+        image[:40] = colors[patches]
+        image[-40:] = colors[patches[::-1]]
+        image[40:-40] = 128
+        fd, self.filename = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+        Image.fromarray(image).save(self.filename, quality=95)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def compare(self, analyzer):
+        with ImageFile(self.filename) as image_file:
+            expected = getattr(image_file, analyzer)()
+        with JPEGFile(self.filename) as uut:
+            luma = uut.fetch('ndarray_luma').astype(int)
+            grey = uut.fetch('ndarray_grey').astype(int)
+            self.assertGreater(numpy.abs(luma - grey).max(), 10)
+            self.assertEqual(getattr(uut, analyzer)(), expected)
+
+    def test_color_calibration_target(self):
+        self.compare('analyze_color_calibration_target')
+
+    def test_stereo_card(self):
+        self.compare('analyze_stereo_card')
+
+    def test_color_it8_target_bottom_bar(self):
+        with JPEGFile(fetch_file('it8_bottom_bar.jpg')) as uut:
+            self.assertIn('Color:IT8BottomBar',
+                          uut.analyze_color_calibration_target())
+
+    def test_color_it8_target_top_bar(self):
+        with JPEGFile(fetch_file('it8_top_bar.jpg')) as uut:
+            self.assertIn('Color:IT8TopBar',
+                          uut.analyze_color_calibration_target())
+
+    def test_face_haarcascades(self):
+        for name in ('charlie_chaplin.jpg', 'mona_lisa.jpg',
+                     'baby_face.jpg'):
+            with ImageFile(fetch_file(name)) as image_file:
+                expected = image_file.analyze_face_haarcascades()
+            with JPEGFile(fetch_file(name)) as uut:
+                data = uut.analyze_face_haarcascades()
+            self.assertEqual(len(data['OpenCV:Faces']),
+                             len(expected['OpenCV:Faces']))
+            for face, expected_face in zip(data['OpenCV:Faces'],
+                                           expected['OpenCV:Faces']):
+                for key in ('nose', 'mouth'):
+                    if key in expected_face:
+                        numpy.testing.assert_allclose(
+                            face[key], expected_face[key], atol=10)
+
+
+def exif_with_thumbnail(thumbnail, orientation=1, thumbnail_orientation=1):
+    # An IFD0 with only the Orientation and an IFD1 with the thumbnail.
+    ifd0 = struct.pack('<HHHIHHI', 1, 0x112, 3, 1, orientation, 0, 26)
+    ifd1 = struct.pack('<HHHIIHHIIHHIHHI', 3, 0x112, 3, 1,
+                       thumbnail_orientation, 0x201, 4, 1, 68,
+                       0x202, 4, 1, len(thumbnail), 0, 0)
+    return (b'Exif\x00\x00' + b'II*\x00' + struct.pack('<I', 8) + ifd0 +
+            ifd1 + thumbnail)
+
+
+class JPEGFileExifThumbnailTest(unittest.TestCase):
+
+    def setUp(self):
+        # A red stereo card with the same gradient on both halves.
+        image = numpy.zeros((480, 640, 3), dtype=numpy.uint8)
+        image[..., 0] = 200
+        image[:, :320, 1] = numpy.linspace(0, 100, 320)
+        image[:, 320:, 1] = image[:, :320, 1]
+        fd, self.filename = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+        self.save(image, (160, 120))
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def save(self, image, thumbnail_size, **kwargs):
+        pillow_img = Image.fromarray(image)
+        thumbnail = io.BytesIO()
+        pillow_img.resize(thumbnail_size).save(thumbnail, format='jpeg')
+        pillow_img.save(self.filename, exif=exif_with_thumbnail(
+            thumbnail.getvalue(), **kwargs))
+
+    def test_exif_thumbnail(self):
+        with JPEGFile(self.filename) as uut:
+            self.assertEqual(uut.fetch('exif_thumbnail').shape,
+                             (120, 160, 3))
+            self.assertEqual(uut.fetch('exif_thumbnail_grey').shape,
+                             (120, 160))
+
+    def test_exif_thumbnail_mismatch(self):
+        image = numpy.zeros((400, 640, 3), dtype=numpy.uint8)
+        self.save(image, (160, 120))  # Letterboxed thumbnail
+        with JPEGFile(self.filename) as uut:
+            self.assertIsNone(uut.fetch('exif_thumbnail'))
+        self.save(image, (160, 100), thumbnail_orientation=6)
+        with JPEGFile(self.filename) as uut:
+            self.assertIsNone(uut.fetch('exif_thumbnail'))
+        self.save(image, (160, 100), orientation=6, thumbnail_orientation=6)
+        with JPEGFile(self.filename) as uut:
+            self.assertEqual(uut.fetch('exif_thumbnail').shape,
+                             (100, 160, 3))
+
+    def test_coarse_analyzers(self):
+        with JPEGFile(self.filename) as uut:
+            full = uut.analyze_color_info()
+        analyzers = ('analyze_color_info', 'analyze_stereo_card')
+        with JPEGFile(self.filename,
+                      exif_thumbnail_analyzers=analyzers) as uut:
+            with mock.patch('file_metadata.image.image_file.decode_image'
+                            ) as mock_decode:
+                data = uut.analyze_color_info()
+                data.update(uut.analyze_stereo_card())
+            self.assertFalse(mock_decode.called)
+        self.assertEqual(data['Color:ClosestLabeledColor'],
+                         full['Color:ClosestLabeledColor'])
+        self.assertIn('Misc:StereoCardMSE', data)
+
+
 class JPEGFileBarcodeZXingTest(unittest.TestCase):
 
     def test_jpeg_qrcode(self):
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import os
+import random
+import tempfile
+import timeit
+
+import numpy
+from PIL import Image
+
+from file_metadata.image.image_file import ImageFile
+from file_metadata.image.perceptual_hash import (HashIndex, dhash, hamming,
+                                                 phash)
+from tests import fetch_file, unittest
+
+
+class PerceptualHashTest(unittest.TestCase):
+
+    def setUp(self):
+        with ImageFile(fetch_file('mona_lisa.jpg')) as uut:
+            self.grey = uut.fetch('ndarray_grey')
+        height, width = self.grey.shape
+        self.resized = numpy.asarray(Image.fromarray(self.grey).resize(
+            (width // 3, height // 3), Image.BILINEAR))
+        with ImageFile(fetch_file('baby_face.jpg')) as uut:
+            self.other = uut.fetch('ndarray_grey')
+
+    def test_dhash(self):
+        self.assertLessEqual(hamming(dhash(self.grey), dhash(self.resized)),
+                             3)
+        self.assertGreater(hamming(dhash(self.grey), dhash(self.other)), 10)
+
+    def test_phash(self):
+        self.assertLessEqual(hamming(phash(self.grey), phash(self.resized)),
+                             3)
+        self.assertGreater(hamming(phash(self.grey), phash(self.other)), 10)
+
+    def test_analyze_perceptual_hash(self):
+        with ImageFile(fetch_file('mona_lisa.jpg')) as uut:
+            data = uut.analyze_perceptual_hash()
+        self.assertEqual(int(data['Hash:PHash'], 16), phash(self.grey))
+        self.assertEqual(len(data['Hash:DHash']), 16)
+
+
+class HashIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(42)
+        self.hashes = [rand.getrandbits(64) for _ in range(20000)]
+        self.index = HashIndex()
+        for i, value in enumerate(self.hashes):
+            self.index.add(value, 'file{0}'.format(i), data={'index': i})
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_find(self):
+        query = self.hashes[123] ^ 0b1001
+        found = self.index.find(query, max_distance=3)
+        self.assertEqual(len(found), 1)
+        self.assertEqual(found[0]['key'], 'file123')
+        self.assertEqual(found[0]['distance'], 2)
+        self.assertEqual(found[0]['data'], {'index': 123})
+
+    def test_find_large_distance(self):
+        query = self.hashes[7] ^ 0b1111111
+        expected = sorted(i for i, value in enumerate(self.hashes)
+                          if hamming(value, query) <= 8)
+        found = self.index.find(query, max_distance=8)
+        self.assertEqual(sorted(item['data']['index'] for item in found),
+                         expected)
+        self.assertIn(7, expected)
+
+    def test_find_speed(self):
+        duration = min(timeit.repeat(lambda: self.index.find(self.hashes[0]),
+                                     repeat=3, number=100)) / 100
+        print('HashIndex.find with {0} hashes: {1:.6f}s'.format(
+            len(self.index), duration))
+        self.assertLess(duration, 0.01)
+
+
+class ImageFileDuplicateTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.index_path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        fd, self.resized_path = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        with ImageFile(fetch_file('mona_lisa.jpg')) as uut:
+            pillow_img = uut.fetch('pillow')
+            pillow_img.resize((pillow_img.width // 2,
+                               pillow_img.height // 2)).save(
+                self.resized_path)
+
+    def tearDown(self):
+        os.remove(self.index_path)
+        os.remove(self.resized_path)
+
+    def test_reuse_duplicate(self):
+        methods = ['analyze_color_info', 'analyze_stereo_card']
+        with ImageFile(fetch_file('mona_lisa.jpg'),
+                       duplicate_index=self.index_path) as uut:
+            data = uut.analyze_each(methods=methods)
+
+        with ImageFile(self.resized_path,
+                       duplicate_index=self.index_path) as uut:
+            uut.analyze_color_info = None  # Fails if it is called
+            resized_data = uut.analyze_each(methods=methods)
+        self.assertEqual(resized_data['analyze_color_info'],
+                         data['analyze_color_info'])
+        self.assertNotEqual(resized_data['analyze_stereo_card'],
+                            data['analyze_stereo_card'])
+
+
+class ImageFileDuplicateColorTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.index_path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.index_path)
+
+    def test_reuse_duplicate_other_colors(self):
+        paths = []
+        for color in ((255, 0, 0), (0, 128, 0)):
+            fd, path = tempfile.mkstemp(suffix='.png')
+            os.close(fd)
+            self.addCleanup(os.remove, path)
+            Image.new('RGB', (64, 48), color).save(path)
+            paths.append(path)
+
+        methods = ['analyze_color_info', 'analyze_perceptual_hash']
+        with ImageFile(paths[0], duplicate_index=self.index_path) as uut:
+            red_data = uut.analyze_each(methods=methods)
+        with ImageFile(paths[1], duplicate_index=self.index_path) as uut:
+            green_data = uut.analyze_each(methods=methods)
+        self.assertLessEqual(hamming(
+            int(red_data['analyze_perceptual_hash']['Hash:PHash'], 16),
+            int(green_data['analyze_perceptual_hash']['Hash:PHash'], 16)), 3)
+        self.assertEqual(red_data['analyze_color_info']['Color:AverageRGB'],
+                         (255, 0, 0))
+        self.assertEqual(
+            green_data['analyze_color_info']['Color:AverageRGB'],
+            (0, 128, 0))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import numpy
+
+from file_metadata.image.image_file import ImageFile
+from file_metadata.image.shared_arrays import (SharedArray, is_available,
+                                               resource_tracker)
+from tests import fetch_file, mock, unittest
+
+
+@unittest.skipIf(not is_available(), 'Shared memory is not available.')
+class SharedArrayTest(unittest.TestCase):
+
+    def test_attach(self):
+        array = numpy.arange(24, dtype=numpy.uint8).reshape((2, 3, 4))
+        shared = SharedArray.create(array)
+        attached = SharedArray.attach(shared.descriptor)
+        try:
+            numpy.testing.assert_array_equal(attached.array, array)
+            self.assertFalse(attached.array.flags.writeable)
+        finally:
+            attached.close()
+            shared.close()
+
+    def test_attach_untracked(self):
+        shared = SharedArray.create(numpy.zeros((2, 3), numpy.uint8))
+        try:
+            with mock.patch.object(resource_tracker,
+                                   'register') as mock_register:
+                SharedArray.attach(shared.descriptor).close()
+            self.assertFalse(mock_register.called)
+        finally:
+            shared.close()
+
+    def test_share_arrays(self):
+        with ImageFile(fetch_file('ball.png')) as uut:
+            descriptors = uut.share_arrays()
+            with ImageFile(fetch_file('ball.png'),
+                           attach_arrays=descriptors) as other:
+                numpy.testing.assert_array_equal(other.fetch('ndarray'),
+                                                 uut.fetch('ndarray'))
+                numpy.testing.assert_array_equal(
+                    other.fetch('ndarray_grey'), uut.fetch('ndarray_grey'))
+
+    def test_analyze_processes(self):
+        methods = ['analyze_color_info', 'analyze_stereo_card']
+        with ImageFile(fetch_file('ball.png')) as uut:
+            expected = uut.analyze(methods=methods)
+        with ImageFile(fetch_file('ball.png'), analyze_processes=2) as uut:
+            self.assertEqual(uut.analyze(methods=methods), expected)
+
+    def test_share_arrays_once(self):
+        with ImageFile(fetch_file('ball.png')) as uut:
+            descriptors = uut.share_arrays(('ndarray_grey', 'ndarray_luma'))
+            self.assertEqual(descriptors['ndarray_grey'],
+                             descriptors['ndarray_luma'])
+            self.assertEqual(uut.share_arrays(('ndarray_grey',)),
+                             {'ndarray_grey': descriptors['ndarray_grey']})
+            self.assertEqual(len([closable for closable in uut.closables
+                                  if isinstance(closable, SharedArray)]), 1)
+
+    def test_analyze_processes_shared_keys(self):
+        with ImageFile(fetch_file('ball.png'), analyze_processes=2) as uut:
+            uut.analyze(methods=['analyze_stereo_card', 'analyze_os_stat'])
+            self.assertEqual(set(uut.shared_arrays), {'ndarray_grey'})
+
+    def test_analyze_processes_after_close(self):
+        methods = ['analyze_color_info', 'analyze_stereo_card']
+        uut = ImageFile(fetch_file('ball.png'), analyze_processes=2)
+        try:
+            expected = uut.analyze(methods=methods)
+            uut.close()
+            self.assertEqual(uut.shared_arrays, {})
+            self.assertEqual(uut.analyze(methods=methods), expected)
+        finally:
+            uut.close()
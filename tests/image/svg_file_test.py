@@ -4,9 +4,12 @@ from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
 
 import os
+import tempfile
+
+import numpy
 
 from file_metadata.image.svg_file import SVGFile
-from tests import fetch_file, unittest
+from tests import fetch_file, mock, unittest
 
 
 class SVGFileTest(unittest.TestCase):
@@ -25,6 +28,15 @@ class SVGFileTest(unittest.TestCase):
         with SVGFile(fetch_file('application_xml.svg')) as uut:
             self.assertEqual(uut.fetch('ndarray').shape, (369, 445, 4))
 
+    def test_fetch_svg_ndarray_max_pixels(self):
+        with SVGFile(fetch_file('application_xml.svg'),
+                     svg_max_pixels=100 * 100) as uut:
+            height, width = uut.fetch('ndarray').shape[:2]
+            self.assertLessEqual(height * width, 101 * 101)
+            self.assertAlmostEqual(width / height, 445 / 369, places=1)
+            # The raster is created in memory, no temp file is needed.
+            self.assertEqual(len(uut.temp_filenames), 0)
+
     def test_fetch_svg_ndarray(self):
         with SVGFile(fetch_file('image_svg_xml.svg')) as uut:
             self.assertEqual(uut.fetch('ndarray').shape, (100, 100))
@@ -37,6 +49,26 @@ class SVGFileTest(unittest.TestCase):
         with SVGFile(fetch_file('text_plain.svg')) as uut:
             self.assertEqual(uut.fetch('ndarray').shape, (300, 300, 3))
 
+    def test_fetch_svg_ndarray_unknown_renderer(self):
+        with SVGFile(fetch_file('image_svg_xml.svg'),
+                     svg_renderers=('unknown', 'wand')) as uut, \
+                mock.patch.object(SVGFile, '_render_wand',
+                                  return_value=numpy.zeros((2, 3))):
+            self.assertEqual(uut.fetch('ndarray').shape, (2, 3))
+
+    def test_fetch_svg_ndarray_empty(self):
+        fd, name = tempfile.mkstemp(suffix='.svg')
+        os.close(fd)
+        self.addCleanup(os.remove, name)
+        with open(name, 'w') as _file:
+            _file.write('<svg xmlns="http://www.w3.org/2000/svg" '
+                        'width="0" height="0"></svg>')
+        with SVGFile(name) as uut:
+            self.assertIsNone(uut._render_rsvg())
+            with mock.patch.object(SVGFile, '_render_wand',
+                                   return_value=None):
+                self.assertEqual(uut.fetch('ndarray').size, 0)
+
     def test_file_format(self):
         with SVGFile(fetch_file('text_plain.svg')) as uut:
             data = uut.analyze_file_format()
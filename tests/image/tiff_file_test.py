@@ -21,6 +21,19 @@ class TIFFFileTest(unittest.TestCase):
         uut.close()
         self.assertFalse(os.path.exists(name))
 
+    def test_iter_pages(self):
+        with TIFFFile(fetch_file('multipage.tiff')) as uut:
+            self.assertEqual(uut.fetch('image_header')['frames'], 5)
+            pages = list(uut.iter_pages())
+            self.assertEqual(len(pages), 5)
+            self.assertEqual(pages[0].shape, (60, 80))
+            self.assertEqual(pages[3].mean(), 150)
+            self.assertEqual(uut.fetch('filename_zxing'), None)
+
+    def test_iter_pages_max_pages(self):
+        with TIFFFile(fetch_file('multipage.tiff'), max_pages=2) as uut:
+            self.assertEqual(len(list(uut.iter_pages())), 2)
+
 
 class TIFFFileBarcodeZXingTest(unittest.TestCase):
 
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+import numpy
+
+from file_metadata.image.tiling import (box_overlap, detect_tiled,
+                                        tile_origins)
+from tests import unittest
+
+
+def detect_bright(tile):
+    """
+    A detector which finds the bounding box of the bright pixels.
+    """
+    rows, cols = numpy.nonzero(tile > 128)
+    if len(rows) == 0:
+        return []
+    return [{'bounding box': {'left': int(cols.min()), 'top': int(rows.min()),
+                              'width': int(cols.max() - cols.min() + 1),
+                              'height': int(rows.max() - rows.min() + 1)},
+             'center': (int(cols.mean()), int(rows.mean()))}]
+
+
+class TilingTest(unittest.TestCase):
+
+    def test_tile_origins(self):
+        self.assertEqual(tile_origins(100, 150, 100, 50),
+                         [(0, 0), (0, 50)])
+        self.assertEqual(tile_origins(10, 10, 100, 50), [(0, 0)])
+
+    def test_box_overlap(self):
+        box = {'left': 0, 'top': 0, 'width': 10, 'height': 10}
+        self.assertEqual(box_overlap(box, box), 1)
+        self.assertEqual(box_overlap(box, {'left': 10, 'top': 0,
+                                           'width': 10, 'height': 10}), 0)
+        self.assertAlmostEqual(box_overlap(box, {'left': 5, 'top': 0,
+                                                 'width': 10, 'height': 10}),
+                               1 / 3)
+
+    def test_detect_tiled(self):
+        image = numpy.zeros((400, 300), dtype=numpy.uint8)
+        image[220:240, 180:210] = 255
+        expected = detect_bright(image)
+        found = detect_tiled(image, detect_bright, tile_size=100, overlap=50,
+                             threads=2, point_keys=('center',))
+        self.assertEqual(found, expected)
+
+    def test_detect_tiled_small_image(self):
+        image = numpy.zeros((40, 30), dtype=numpy.uint8)
+        image[20:30, 10:20] = 255
+        self.assertEqual(detect_tiled(image, detect_bright, tile_size=100),
+                         detect_bright(image))
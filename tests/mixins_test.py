@@ -104,9 +104,17 @@ class FFProbeMixinWithAVProbeTest(FFProbeMixinTest):
 @mock.patch('file_metadata.mixins.which',
             side_effect=which_sideeffect(['ffprobe', 'avprobe']))
 class FFProbeMixinWithoutBackendsTest(unittest.TestCase):
+    def test_bin(self, mock_check_output, mock_system=None):
+        _file = FFProbeTestFile(fetch_file('file.bin'))
+        self.assertRaises(OSError, _file.analyze_ffprobe)
+
     def test_wav(self, mock_check_output, mock_system=None):
+        # The header of WAV files is parsed without ffprobe.
         _file = FFProbeTestFile(fetch_file('noise.wav'))
-        self.assertRaises(OSError, _file.analyze_ffprobe)
+        data = _file.analyze_ffprobe()
+        self.assertEqual(data['FFProbe:Format'], 'wav')
+        self.assertEqual(data['FFProbe:Streams'][0]['Format'],
+                         'audio/pcm_s16le')
 
 
 class IsSvgTest(unittest.TestCase):
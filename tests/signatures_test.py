@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (division, absolute_import, unicode_literals,
+                        print_function)
+
+from file_metadata import signatures
+from tests import ogg_page, theora_header, unittest
+
+
+class MatchTest(unittest.TestCase):
+
+    def test_magic_numbers(self):
+        self.assertEqual(signatures.match(b'\xff\xd8\xff\xe0\x00\x10JFIF'),
+                         'file_metadata.image.jpeg_file.JPEGFile')
+        self.assertEqual(signatures.match(b'MM\x00*\x00\x00\x00\x08'),
+                         'file_metadata.image.tiff_file.TIFFFile')
+        self.assertEqual(signatures.match(b'RIFF\x24\x00\x00\x00WAVEfmt '),
+                         'file_metadata.audio.audio_file.AudioFile')
+        self.assertEqual(signatures.match(b'RIFF\x24\x00\x00\x00WEBPVP8 '),
+                         'file_metadata.image.image_file.ImageFile')
+        self.assertEqual(signatures.match(b'AT&TFORM\x00\x00\x00\x00DJVU'),
+                         'file_metadata.application.document_file.'
+                         'DocumentFile')
+
+    def test_unknown(self):
+        self.assertIsNone(signatures.match(b''))
+        self.assertIsNone(signatures.match(b'RIFF\x24\x00\x00\x00RMID'))
+        self.assertIsNone(signatures.match(b'Hello world'))
+        self.assertIsNone(signatures.file_class(b'Hello world'))
+
+    def test_ogg(self):
+        self.assertEqual(signatures.match(ogg_page(2, 0, 1, b'OpusHead')),
+                         'file_metadata.audio.ogg_file.OGGFile')
+        self.assertEqual(
+            signatures.match(ogg_page(2, 0, 1, theora_header(64, 48, 25))),
+            'file_metadata.video.ogv_file.OGVFile')
+        self.assertIsNone(signatures.match(ogg_page(2, 0, 1, b'unknown')))
+
+    def test_svg(self):
+        svg = (b'\xef\xbb\xbf<?xml version="1.0" encoding="UTF-8"?>\n'
+               b'<!-- Created with Inkscape -->\n'
+               b'<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" '
+               b'"http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd" [\n'
+               b'  <!ENTITY ns "http://www.w3.org/2000/svg">\n]>\n'
+               b'<svg width="10" xmlns="http://www.w3.org/2000/svg">')
+        self.assertEqual(signatures.match(svg),
+                         'file_metadata.image.svg_file.SVGFile')
+        self.assertIsNone(signatures.match(
+            b'<svg:svg xmlns:svg="http://example.com">'))
+        self.assertIsNone(signatures.match(
+            b'<html><svg xmlns="http://www.w3.org/2000/svg">'))
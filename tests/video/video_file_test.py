@@ -2,3 +2,62 @@
 
 from __future__ import (division, absolute_import, unicode_literals,
                         print_function)
+
+import numpy
+
+from file_metadata.video.video_file import VideoFile
+from tests import fetch_file, mock, unittest
+
+FFPROBE = {'format': {'format_name': 'matroska,webm', 'duration': '10.0',
+                      'nb_streams': '1'},
+           'streams': [{'codec_type': 'video', 'codec_name': 'vp8',
+                        'width': 4, 'height': 2}]}
+
+
+@mock.patch.object(VideoFile, 'ffprobe', return_value=FFPROBE)
+class VideoFileFramesTest(unittest.TestCase):
+
+    def test_sample_times(self, mock_ffprobe):
+        with VideoFile(fetch_file('ascii.txt')) as uut:
+            self.assertEqual(uut.sample_times(4), [1.25, 3.75, 6.25, 8.75])
+
+    @mock.patch('file_metadata.video.video_file.which',
+                return_value='ffmpeg')
+    @mock.patch('file_metadata.video.video_file.subprocess')
+    def test_iter_frames(self, mock_subprocess, mock_which, mock_ffprobe):
+        proc = mock_subprocess.Popen.return_value
+        proc.communicate.side_effect = [(bytes(bytearray(range(24))), b''),
+                                        (b'', b'')]
+        with VideoFile(fetch_file('ascii.txt')) as uut:
+            frames = list(uut.iter_frames([1.5, 9.9]))
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0][0], 1.5)
+        self.assertEqual(frames[0][1].shape, (2, 4, 3))
+        self.assertEqual(frames[0][1][1, 3].tolist(), [21, 22, 23])
+        args = mock_subprocess.Popen.call_args_list[0][0][0]
+        self.assertIn('-ss', args)
+        self.assertEqual(args[args.index('-ss') + 1], '1.500')
+
+    def test_analyze_frames(self, mock_ffprobe):
+        red = numpy.zeros((40, 60, 3), numpy.uint8)
+        red[..., 0] = 255
+        frames = [(1.0, red), (3.0, red), (5.0, red[..., ::-1].copy())]
+        with VideoFile(fetch_file('ascii.txt'),
+                       video_frame_analyzers=('analyze_color_info',)) as uut:
+            with mock.patch.object(VideoFile, 'iter_frames',
+                                   return_value=iter(frames)):
+                data = uut.analyze_frames()
+        self.assertEqual(data['Video:SampledFrames'], 3)
+        self.assertEqual(data['Video:Frames'][2]['Time'], 5.0)
+        self.assertEqual(data['Video:ClosestLabeledColor'],
+                         data['Video:Frames'][0]['Color:ClosestLabeledColor'])
+        self.assertEqual(data['Video:MaxFaces'], 0)
+        self.assertNotIn('Video:Barcodes', data)
+
+    def test_aggregate_frames(self, mock_ffprobe):
+        barcode = {'format': 'QRCODE', 'data': 'text'}
+        data = VideoFile.aggregate_frames([
+            {'OpenCV:Faces': [{}, {}], 'zbar:Barcodes': [barcode]},
+            {'OpenCV:Faces': [{}], 'zbar:Barcodes': [barcode]}])
+        self.assertEqual(data, {'Video:MaxFaces': 2,
+                                'Video:Barcodes': [barcode]})